@@ -0,0 +1,394 @@
+"""
+Web-facing output files: compact streamed JSON, pre-compressed variants and publishing to public/
+
+Scripts write their outputs through ArtifactFile, a text file that hashes (sha256) and
+optionally compresses (.gz, plus .br when the brotli package is installed) everything as it is
+written, so no output is ever held in memory as one string. write_json / write_json_array
+encode with compact separators and can round floats to a fixed number of decimals.
+
+publish_artifacts copies outputs into public/ for the web app, re-encoded compactly and with
+.gz/.br variants for static hosts that serve pre-compressed files. public/artifacts.json
+records each published file's size, content hash and a cache-busting URL. A file whose source
+hash and publish settings match the manifest is skipped without being rewritten.
+
+Run directly to publish the default outputs (intervals, locations, buildings) to public/.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from json_stream import JsonArrayWriter, iter_json_array
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+
+try:
+    import brotli
+except ImportError:  # Optional: only needed for .br variants
+    brotli = None
+
+MANIFEST_NAME = 'artifacts.json'
+MANIFEST_VERSION = 1
+COPY_CHUNK = 1 << 20
+# Maximum quality is slow (about 0.3 MB/s), but files are only recompressed when they change,
+# and at 9 or below .br is barely smaller than .gz
+BROTLI_QUALITY = 11
+# Small writes are collected and handed to the hash, file and compressors in blocks this large
+WRITE_BUFFER = 1 << 16
+
+def available_encodings() -> List[str]:
+    """Compressed variants this installation can write ('br' needs the brotli package)"""
+    return ['gz', 'br'] if brotli is not None else ['gz']
+
+def _compressor(encoding: str):
+    if encoding == 'gz':
+        # wbits 31 = gzip container; the header has no timestamp, so equal input gives equal bytes
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+    if encoding == 'br':
+        if brotli is None:
+            raise ValueError("Writing .br files needs the brotli package (pip install brotli)")
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return compressor.process, compressor.finish
+    raise ValueError(f"Unknown encoding '{encoding}' (expected gz or br)")
+
+def round_floats(value: Any, precision: Optional[int]) -> Any:
+    """Copy of a JSON value with every float rounded to precision decimals (None: unchanged)"""
+    if precision is None:
+        return value
+    if isinstance(value, float):
+        return round(value, precision)
+    if isinstance(value, dict):
+        return {key: round_floats(item, precision) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [round_floats(item, precision) for item in value]
+    return value
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactFile:
+    """
+    Write-only file that is hashed and compressed while it is written
+
+    Everything goes to temporary files first; close() moves them into place, so readers
+    never see a partial output. As a context manager, an exception discards the output.
+    """
+    def __init__(self, path: str, encodings: Sequence[str] = ()):
+        self.path = path
+        self.encodings = list(encodings)
+        self.size = 0
+        self.info: Optional[Dict] = None
+        self._sha256 = hashlib.sha256()
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._compressors = {encoding: _compressor(encoding) for encoding in self.encodings}
+        self._files = {'': open(path + '.tmp', 'wb')}
+        for encoding in self.encodings:
+            self._files[encoding] = open(f"{path}.{encoding}.tmp", 'wb')
+
+    def write(self, text: str) -> int:
+        return self.write_bytes(text.encode('utf-8'))
+
+    def write_bytes(self, data: bytes) -> int:
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= WRITE_BUFFER:
+            self._flush()
+        return len(data)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        block = b''.join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        self.size += len(block)
+        self._sha256.update(block)
+        self._files[''].write(block)
+        for encoding, (compress, _) in self._compressors.items():
+            self._files[encoding].write(compress(block))
+
+    def close(self) -> Dict:
+        """
+        Finish all variants and move them into place
+
+        Returns:
+            Dict with 'bytes', 'sha256' and the byte size of each variant ('gz', 'br')
+        """
+        if self.info is not None:
+            return self.info
+        self._flush()
+        info = {'bytes': self.size, 'sha256': self._sha256.hexdigest()}
+        for encoding, (_, finish) in self._compressors.items():
+            self._files[encoding].write(finish())
+        for encoding, f in self._files.items():
+            f.close()
+            target = f"{self.path}.{encoding}" if encoding else self.path
+            os.replace(target + '.tmp', target)
+            if encoding:
+                info[encoding] = os.path.getsize(target)
+        self.info = info
+        return info
+
+    def abort(self):
+        for encoding, f in self._files.items():
+            f.close()
+            temp = (f"{self.path}.{encoding}" if encoding else self.path) + '.tmp'
+            if os.path.exists(temp):
+                os.remove(temp)
+
+    def __enter__(self) -> 'ArtifactFile':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+_compact_encoder = json.JSONEncoder(separators=(',', ':'))
+
+def write_json(path: str, value: Any, precision: Optional[int] = None, encodings: Sequence[str] = ()) -> Dict:
+    """
+    Write a JSON value compactly without building the whole text in memory
+
+    Returns:
+        ArtifactFile info (size, sha256, compressed sizes)
+    """
+    if isinstance(value, list):
+        # Encoding element by element keeps json's one-shot C encoder; iterencode yields
+        # every token separately
+        return write_json_array(path, value, precision, encodings)
+    with ArtifactFile(path, encodings) as out:
+        chunks = []
+        for chunk in _compact_encoder.iterencode(round_floats(value, precision)):
+            chunks.append(chunk)
+            if len(chunks) >= 4096:
+                out.write(''.join(chunks))
+                chunks.clear()
+        out.write(''.join(chunks))
+    return out.info
+
+def write_json_array(path: str, items: Iterable[Any], precision: Optional[int] = None,
+                     encodings: Sequence[str] = (), key: Optional[str] = None,
+                     header: Optional[Dict] = None) -> Dict:
+    """
+    Stream items into a compact JSON array, one element at a time
+
+    Args:
+        key: If given, the array is written as this member of a top-level object, after the
+             members in header (e.g. key='features', header={'type': 'FeatureCollection'})
+
+    Returns:
+        ArtifactFile info plus 'count', the number of items written
+    """
+    with ArtifactFile(path, encodings) as out:
+        if key is not None:
+            members = dict(header or {})
+            opening = _compact_encoder.encode(members)[:-1]
+            out.write(opening + (',' if members else '') + _compact_encoder.encode(key) + ':')
+        writer = JsonArrayWriter(out, indent=None)
+        for item in items:
+            writer.write_json(_compact_encoder.encode(round_floats(item, precision)))
+        writer.close()
+        if key is not None:
+            out.write('}')
+    info = dict(out.info)
+    info['count'] = writer.count
+    return info
+
+def _minify(source: str, target: str, precision: Optional[int], encodings: Sequence[str]) -> Dict:
+    """Re-encode a JSON file compactly; arrays and GeoJSON feature collections are streamed"""
+    with open(source, 'r', encoding='utf-8') as f:
+        first = f.read(64).lstrip()[:1]
+    if first == '[':
+        return write_json_array(target, iter_json_array(source), precision, encodings)
+    if source.endswith('.geojson'):
+        # Only "type" and "features" are kept, which covers everything the pipeline writes
+        return write_json_array(target, iter_json_array(source, key='features'), precision, encodings,
+                                key='features', header={'type': 'FeatureCollection'})
+    with open(source, 'r', encoding='utf-8') as f:
+        value = json.load(f)
+    return write_json(target, value, precision, encodings)
+
+def _copy(source: str, target: str, encodings: Sequence[str]) -> Dict:
+    with ArtifactFile(target, encodings) as out, open(source, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK), b''):
+            out.write_bytes(chunk)
+    return out.info
+
+def directory_files(directory: str, prefix: str) -> List[Tuple[str, str]]:
+    """(path, prefix/relative path) for every JSON/GeoJSON file under directory, in sorted order"""
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))  # Skips work dirs like .spill
+        for name in sorted(names):
+            if name.endswith(('.json', '.geojson')):
+                path = os.path.join(root, name)
+                files.append((path, '/'.join([prefix] + os.path.relpath(path, directory).split(os.sep))))
+    return files
+
+def default_artifacts(data_dir: str, buildings: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    Web-facing outputs of the pipeline scripts that exist in data_dir, as (source, public name)
+
+    intervals.json, locations.json and the buildings file are always published; per-building
+    sentiment, the rollup cube and heatmap levels only once their scripts have been run.
+    """
+    files = [(os.path.join(data_dir, 'intervals.json'), 'intervals.json'),
+             (os.path.join(data_dir, 'locations.json'), 'locations.json')]
+    buildings = buildings or next(
+        (path for path in (os.path.join(data_dir, 'buildings_usc_filtered.geojson'),
+                           os.path.join(data_dir, 'buildings_usc.geojson')) if os.path.exists(path)), None)
+    if buildings:
+        files.append((buildings, 'buildings_usc.geojson'))
+    else:
+        print("No buildings GeoJSON in data/, leaving public/buildings_usc.geojson as it is")
+    for name in ('building_sentiment.json', 'rollup.json'):
+        if os.path.exists(os.path.join(data_dir, name)):
+            files.append((os.path.join(data_dir, name), name))
+    heatmap_dir = os.path.join(data_dir, 'heatmap')
+    if os.path.isdir(heatmap_dir):
+        files.extend(directory_files(heatmap_dir, 'heatmap'))
+    return files
+
+def load_manifest(public_dir: str) -> Dict:
+    path = os.path.join(public_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    return {'version': MANIFEST_VERSION, 'files': {}}
+
+def _is_current(entry: Optional[Dict], source_hash: str, settings: Dict, target: str) -> bool:
+    """True when the published file came from this source with these settings and is intact"""
+    if not entry or entry.get('source_sha256') != source_hash or entry.get('settings') != settings:
+        return False
+    variants = [(target, entry['bytes'])]
+    variants += [(f"{target}.{encoding}", size) for encoding, size in entry.get('encodings', {}).items()]
+    return all(os.path.exists(path) and os.path.getsize(path) == size for path, size in variants)
+
+def publish_artifacts(files: Sequence[Tuple[str, str]], public_dir: str, precision: Optional[int] = None,
+                      minify: bool = True, encodings: Optional[Sequence[str]] = None) -> Dict:
+    """
+    Publish pipeline outputs to the web app's public directory
+
+    Args:
+        files: (source path, name in public_dir) pairs
+        public_dir: Directory the web app serves (public/)
+        precision: Round floats to this many decimals when re-encoding (None: keep them)
+        minify: Re-encode JSON compactly; otherwise copy the bytes as they are
+        encodings: Compressed variants to write (default: gz, plus br if brotli is installed)
+
+    Returns:
+        Dict with the published and skipped names, total bytes written and elapsed seconds
+    """
+    start = time.perf_counter()
+    encodings = available_encodings() if encodings is None else list(encodings)
+    os.makedirs(public_dir, exist_ok=True)
+    manifest = load_manifest(public_dir)
+    settings = {'minify': minify, 'precision': precision if minify else None}
+    published, skipped = [], []
+    written = 0
+    # Tile sets have thousands of files; only the summary is printed for them
+    verbose = len(files) <= 50
+
+    for source, name in files:
+        target = os.path.join(public_dir, name)
+        with metrics.span('hash'):
+            source_hash = file_sha256(source)
+        entry = manifest['files'].get(name)
+        if _is_current(entry, source_hash, settings, target) and sorted(entry.get('encodings', {})) == sorted(encodings):
+            skipped.append(name)
+            if verbose:
+                print(f"  {name}: unchanged, skipped")
+            continue
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with metrics.span('publish'):
+            if minify:
+                info = _minify(source, target, precision, encodings)
+            else:
+                info = _copy(source, target, encodings)
+        # Variants from earlier settings would be served stale
+        for stale in set((entry or {}).get('encodings', {})) - set(encodings):
+            if os.path.exists(f"{target}.{stale}"):
+                os.remove(f"{target}.{stale}")
+        manifest['files'][name] = {
+            'bytes': info['bytes'],
+            'sha256': info['sha256'],
+            'url': f"{name}?v={info['sha256'][:12]}",
+            'encodings': {encoding: info[encoding] for encoding in encodings},
+            'source_sha256': source_hash,
+            'settings': settings,
+        }
+        written += info['bytes'] + sum(info[encoding] for encoding in encodings)
+        published.append(name)
+        variants = ', '.join(f"{info[encoding]:,} .{encoding}" for encoding in encodings)
+        if verbose:
+            print(f"  {name}: {os.path.getsize(source):,} -> {info['bytes']:,} bytes"
+                  + (f" ({variants})" if variants else ''))
+
+    if published:
+        manifest_path = os.path.join(public_dir, MANIFEST_NAME)
+        with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(manifest_path + '.tmp', manifest_path)
+
+    elapsed = time.perf_counter() - start
+    metrics.count('files_published', len(published))
+    metrics.count('files_skipped', len(skipped))
+    metrics.count('bytes_written', written)
+    print(f"Published {len(published)} files to {public_dir}, {len(skipped)} unchanged ({elapsed:.2f}s)")
+    return {'published': published, 'skipped': skipped, 'bytes_written': written, 'seconds': elapsed}
+
+def parse_file_spec(spec: str) -> Tuple[str, str]:
+    """'SOURCE' or 'SOURCE:NAME' -> (source path, name in public/)"""
+    source, _, name = spec.partition(':')
+    return source, name or os.path.basename(os.path.normpath(source))
+
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    default_public = os.path.join(os.path.dirname(script_dir), 'public')
+
+    parser = argparse.ArgumentParser(description='Publish pipeline outputs to public/ with .gz/.br variants')
+    parser.add_argument('files', nargs='*', metavar='SOURCE[:NAME]',
+                        help='Files or directories (tile sets) to publish (default: intervals.json, '
+                             'locations.json, the buildings file and any sentiment/rollup/heatmap outputs)')
+    parser.add_argument('--public-dir', default=default_public)
+    parser.add_argument('--buildings', default=None,
+                        help='Buildings GeoJSON published as buildings_usc.geojson '
+                             '(default: buildings_usc_filtered.geojson or buildings_usc.geojson in data/)')
+    parser.add_argument('--precision', type=int, default=None, help='Round floats to this many decimals')
+    parser.add_argument('--no-minify', action='store_true', help='Copy files byte for byte instead of re-encoding')
+    parser.add_argument('--encodings', default=','.join(available_encodings()),
+                        help="Comma-separated compressed variants: gz, br (default: all available)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    encodings = [encoding for encoding in args.encodings.split(',') if encoding]
+    if set(encodings) - set(available_encodings()):
+        parser.error(f"unavailable encodings: {', '.join(sorted(set(encodings) - set(available_encodings())))} "
+                     f"(.br needs the brotli package)")
+
+    if args.files:
+        files = []
+        for spec in args.files:
+            source, name = parse_file_spec(spec)
+            files.extend(directory_files(source, name) if os.path.isdir(source) else [(source, name)])
+    else:
+        files = default_artifacts(script_dir, args.buildings)
+
+    with instrumented(args):
+        publish_artifacts(files, args.public_dir, precision=args.precision, minify=not args.no_minify,
+                          encodings=encodings)
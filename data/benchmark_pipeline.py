@@ -0,0 +1,336 @@
+"""
+Benchmark the data pipeline stages at synthetic scales (10^3 .. 10^7 buildings or intervals)
+
+Every measurement runs in a fresh spawned process, so peak memory (VmHWM) belongs to that
+stage alone and earlier stages cannot warm caches for later ones. Inputs are generated once
+per scale and reused. Route lookups are served offline from a fixture route cache filled with
+synthetic geometries, so no network or Mapbox token is needed.
+
+Results are written as JSON; --compare flags stages that got slower than a baseline run.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Callable, Dict, List
+
+from json_stream import JsonArrayWriter
+from pipeline_metrics import peak_rss_mb
+
+DEFAULT_SCALES = (1_000, 10_000, 100_000)
+# The pure-Python reference loop is too slow to be useful past this size
+MAX_LOOP_SCALE = 100_000
+# Slowdown ratio (new / baseline) reported as a regression
+REGRESSION_THRESHOLD = 1.2
+
+USC_LAT = 34.0224
+USC_LON = -118.2851
+# Synthetic buildings are spread over a box of this half-width (degrees) around USC
+BUILDING_SPREAD_DEG = 0.03
+# Average generated intervals per user per day, used to size the generation stage
+INTERVALS_PER_USER_DAY = 86
+
+# Input generation
+
+def synthetic_buildings(path: str, count: int, seed: int = 0):
+    """Write a FeatureCollection of count small, irregular polygons around USC"""
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{\n  "type": "FeatureCollection",\n  "features": ')
+        writer = JsonArrayWriter(f, depth=2)
+        for i in range(count):
+            lon = USC_LON + rng.uniform(-BUILDING_SPREAD_DEG, BUILDING_SPREAD_DEG)
+            lat = USC_LAT + rng.uniform(-BUILDING_SPREAD_DEG, BUILDING_SPREAD_DEG)
+            w = rng.uniform(0.00005, 0.0004)
+            h = rng.uniform(0.00005, 0.0004)
+            ring = [[round(lon + dx * w + rng.uniform(-1e-6, 1e-6), 7),
+                     round(lat + dy * h + rng.uniform(-1e-6, 1e-6), 7)]
+                    for dx, dy in ((0, 0), (1, 0), (1, 0.5), (1, 1), (0.5, 1), (0, 1))]
+            ring.append(ring[0])
+            writer.write({
+                'type': 'Feature',
+                'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+                'properties': {'id': f"way/{i}", 'tags': {'building': 'yes'}}
+            })
+        writer.close()
+        f.write('\n}')
+
+def synthetic_intervals(path: str, count: int, seed: int = 0):
+    """Write count sorted intervals with the intervals.json schema (stays and travel points)"""
+    rng = random.Random(seed)
+    places = [(f"Place {i}", rng.choice(['home', 'school', 'work', 'gym', 'food']),
+               USC_LAT + rng.uniform(-0.02, 0.02), USC_LON + rng.uniform(-0.02, 0.02)) for i in range(50)]
+    epoch = datetime(2024, 11, 19).timestamp()
+    t = epoch
+    with open(path, 'w', encoding='utf-8') as f:
+        writer = JsonArrayWriter(f)
+        for _ in range(count):
+            duration = rng.uniform(0.5, 90.0)
+            start, t = t, t + duration * 60
+            interval = {
+                'start_time': datetime.fromtimestamp(start).isoformat(),
+                'end_time': datetime.fromtimestamp(t).isoformat(),
+                'duration_minutes': round(duration, 2)
+            }
+            if rng.random() < 0.6:
+                name, kind, lat, lon = rng.choice(places)
+                interval.update({'latitude': lat, 'longitude': lon, 'location_name': name,
+                                 'location_type': kind, 'sentiment_score': rng.uniform(-1, 1),
+                                 'activity': kind})
+            else:
+                interval.update({'latitude': USC_LAT + rng.uniform(-0.02, 0.02),
+                                 'longitude': USC_LON + rng.uniform(-0.02, 0.02),
+                                 'location_name': 'Traveling', 'location_type': 'traveling',
+                                 'sentiment_score': rng.uniform(-0.3, 0.3), 'activity': 'traveling',
+                                 'travel_mode': rng.choice(['walking', 'driving'])})
+            writer.write(interval)
+        writer.close()
+
+def fixture_route_cache(path: str):
+    """Fill a route cache with synthetic geometries for every route the schedules need"""
+    import generate_intervals_with_routes as gen
+    from directions_stub_server import synthetic_route
+    from route_cache import RouteCache, route_key
+
+    cache = RouteCache(path)
+    for req in gen.schedule_route_requests(gen.BASE_DATE, 7):
+        start_lat, start_lon, end_lat, end_lon, profile = req
+        cache.put(route_key(*req), synthetic_route(start_lon, start_lat, end_lon, end_lat), profile)
+    cache.close()
+
+# Stages (each runs inside a spawned child; returns the number of items processed)
+
+def _stage_load_buildings(inputs: Dict, scale: int, workdir: str) -> int:
+    with open(inputs['buildings'], 'r', encoding='utf-8') as f:
+        return len(json.load(f)['features'])
+
+def _stage_filter(inputs: Dict, scale: int, workdir: str) -> int:
+    from filter_buildings import filter_buildings_by_radius
+    filter_buildings_by_radius(inputs['buildings'], os.path.join(workdir, 'filtered.geojson'),
+                               USC_LAT, USC_LON, 1.3)
+    return scale
+
+def _stage_filter_stream(inputs: Dict, scale: int, workdir: str) -> int:
+    from filter_buildings import stream_filter_buildings_by_radius
+    return stream_filter_buildings_by_radius(inputs['buildings'], os.path.join(workdir, 'filtered.geojson'),
+                                             USC_LAT, USC_LON, 1.3)['total']
+
+def _interpolation_routes(scale: int):
+    from directions_stub_server import synthetic_route
+    rng = random.Random(scale)
+    routes = []
+    for _ in range(max(1, scale // 10)):
+        lon, lat = USC_LON + rng.uniform(-0.02, 0.02), USC_LAT + rng.uniform(-0.02, 0.02)
+        routes.append(synthetic_route(lon, lat, lon + rng.uniform(-0.01, 0.01), lat + rng.uniform(-0.01, 0.01),
+                                      steps=rng.randint(4, 40)))
+    return routes
+
+def _stage_interpolate(inputs: Dict, scale: int, workdir: str) -> int:
+    from route_interpolation import interpolate_routes
+    routes = _interpolation_routes(scale)
+    _timer['start'] = time.perf_counter()
+    return sum(len(points) for points in interpolate_routes(routes, 10))
+
+def _stage_interpolate_loop(inputs: Dict, scale: int, workdir: str) -> int:
+    from route_interpolation import _interpolate_route_points_loop
+    routes = _interpolation_routes(scale)
+    _timer['start'] = time.perf_counter()
+    return sum(len(_interpolate_route_points_loop(route, 10)) for route in routes)
+
+def _stage_load_intervals(inputs: Dict, scale: int, workdir: str) -> int:
+    with open(inputs['intervals'], 'r', encoding='utf-8') as f:
+        return len(json.load(f))
+
+def _stage_serialize_json(inputs: Dict, scale: int, workdir: str) -> int:
+    with open(inputs['intervals'], 'r', encoding='utf-8') as f:
+        intervals = json.load(f)
+    _timer['start'] = time.perf_counter()  # Time only the dump, not the load
+    with open(os.path.join(workdir, 'serialized.json'), 'w', encoding='utf-8') as f:
+        json.dump(intervals, f, indent=2)
+    return len(intervals)
+
+def _stage_serialize_artifact(inputs: Dict, scale: int, workdir: str) -> int:
+    from artifacts import write_json
+    with open(inputs['intervals'], 'r', encoding='utf-8') as f:
+        intervals = json.load(f)
+    _timer['start'] = time.perf_counter()  # Compact JSON plus the .gz variant, as artifacts.py writes it
+    write_json(os.path.join(workdir, 'serialized_compact.json'), intervals, precision=6, encodings=['gz'])
+    return len(intervals)
+
+def _stage_serialize_binary(inputs: Dict, scale: int, workdir: str) -> int:
+    from interval_columns import write_interval_columns
+    with open(inputs['intervals'], 'r', encoding='utf-8') as f:
+        intervals = json.load(f)
+    _timer['start'] = time.perf_counter()
+    return write_interval_columns(intervals, os.path.join(workdir, 'serialized.bin'))['count']
+
+def _stage_generate(inputs: Dict, scale: int, workdir: str) -> int:
+    import generate_intervals_with_routes as gen
+    from generate_scaled_intervals import generate_scaled_intervals
+    from route_cache import RouteCache
+
+    routes = gen.fetch_routes(gen.schedule_route_requests(gen.BASE_DATE, 7), gen.MAPBOX_TOKEN,
+                              route_cache=RouteCache(inputs['route_cache']), offline=True)
+    users = max(1, scale // (INTERVALS_PER_USER_DAY * 7))
+    return generate_scaled_intervals(os.path.join(workdir, 'generated.json'), users, gen.BASE_DATE, 7,
+                                     routes, gen.location_map, workers=1)['intervals']
+
+STAGES: Dict[str, Callable] = {
+    'load_buildings': _stage_load_buildings,
+    'filter': _stage_filter,
+    'filter_stream': _stage_filter_stream,
+    'interpolate': _stage_interpolate,
+    'interpolate_loop': _stage_interpolate_loop,
+    'load_intervals': _stage_load_intervals,
+    'serialize_json': _stage_serialize_json,
+    'serialize_artifact': _stage_serialize_artifact,
+    'serialize_binary': _stage_serialize_binary,
+    'generate': _stage_generate
+}
+
+# Stage timers may move the start point past their own setup (e.g. loading input)
+_timer: Dict = {}
+
+def _measure(stage: str, inputs: Dict, scale: int, workdir: str) -> Dict:
+    """Run one stage in this (fresh) process and report time and memory"""
+    base_rss = peak_rss_mb()
+    _timer['start'] = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        items = STAGES[stage](inputs, scale, workdir)
+    seconds = time.perf_counter() - _timer['start']
+    peak_rss = peak_rss_mb()
+    return {
+        'stage': stage,
+        'scale': scale,
+        'items': items,
+        'seconds': round(seconds, 6),
+        'items_per_second': round(items / seconds, 1) if seconds > 0 else None,
+        'peak_rss_mb': None if peak_rss is None else round(peak_rss, 1),
+        'base_rss_mb': None if base_rss is None else round(base_rss, 1)
+    }
+
+def run_stage(stage: str, inputs: Dict, scale: int, workdir: str) -> Dict:
+    """Measure a stage in a spawned child process"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(_measure, stage, inputs, scale, workdir).result()
+
+def prepare_inputs(workdir: str, scale: int, seed: int) -> Dict:
+    """Generate (or reuse) synthetic inputs for one scale"""
+    inputs = {
+        'buildings': os.path.join(workdir, f"buildings_{scale}.geojson"),
+        'intervals': os.path.join(workdir, f"intervals_{scale}.json"),
+        'route_cache': os.path.join(workdir, 'route_cache.sqlite')
+    }
+    if not os.path.exists(inputs['buildings']):
+        print(f"  generating {scale:,} buildings...")
+        synthetic_buildings(inputs['buildings'], scale, seed)
+    if not os.path.exists(inputs['intervals']):
+        print(f"  generating {scale:,} intervals...")
+        synthetic_intervals(inputs['intervals'], scale, seed)
+    if not os.path.exists(inputs['route_cache']):
+        fixture_route_cache(inputs['route_cache'])
+    return inputs
+
+def run_benchmarks(scales: List[int], stages: List[str], workdir: str, repeat: int = 1, seed: int = 0,
+                   max_loop_scale: int = MAX_LOOP_SCALE) -> Dict:
+    """
+    Run every stage at every scale, keeping the fastest of `repeat` runs
+
+    Returns:
+        Results document (environment info plus one entry per stage and scale)
+    """
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    for scale in scales:
+        print(f"Scale {scale:,}:")
+        inputs = prepare_inputs(workdir, scale, seed)
+        for stage in stages:
+            if stage == 'interpolate_loop' and scale > max_loop_scale:
+                continue
+            runs = [run_stage(stage, inputs, scale, workdir) for _ in range(repeat)]
+            best = min(runs, key=lambda r: r['seconds'])
+            if best['peak_rss_mb'] is not None:
+                best['peak_rss_mb'] = max(r['peak_rss_mb'] for r in runs)
+            results.append(best)
+            rate = f"{best['items_per_second']:>14,.0f}/s" if best['items_per_second'] else ''
+            memory = f"{best['peak_rss_mb']:>10.1f} MB" if best['peak_rss_mb'] is not None else ''
+            print(f"  {stage:18s}{best['seconds']:>10.3f}s{rate}{memory}")
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': repeat,
+        'results': results
+    }
+
+def compare_results(current: Dict, baseline: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[Dict]:
+    """
+    Print current vs baseline per (stage, scale)
+
+    Returns:
+        Entries whose time or peak memory grew by more than the threshold ratio
+    """
+    previous = {(r['stage'], r['scale']): r for r in baseline['results']}
+    regressions = []
+    print(f"\n{'stage':18s}{'scale':>12s}{'time':>10s}{'memory':>10s}")
+    for result in current['results']:
+        old = previous.get((result['stage'], result['scale']))
+        if old is None:
+            continue
+        time_ratio = result['seconds'] / old['seconds'] if old['seconds'] > 0 else 1.0
+        memory_ratio = (result['peak_rss_mb'] / old['peak_rss_mb']
+                        if result['peak_rss_mb'] is not None and old['peak_rss_mb'] else 1.0)
+        flag = ''
+        if time_ratio > threshold or memory_ratio > threshold:
+            flag = '  REGRESSION'
+            regressions.append({'stage': result['stage'], 'scale': result['scale'],
+                                'time_ratio': round(time_ratio, 3), 'memory_ratio': round(memory_ratio, 3)})
+        print(f"{result['stage']:18s}{result['scale']:>12,}{time_ratio:>9.2f}x{memory_ratio:>9.2f}x{flag}")
+    return regressions
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Benchmark pipeline stages at synthetic scales')
+    parser.add_argument('--scales', default=','.join(str(s) for s in DEFAULT_SCALES),
+                        help='Comma-separated input sizes, e.g. 1e3,1e5,1e7')
+    parser.add_argument('--stages', default=','.join(STAGES), help='Comma-separated subset of stages')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per measurement (fastest is kept)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-loop-scale', type=int, default=MAX_LOOP_SCALE,
+                        help='Skip the reference interpolation loop above this scale')
+    parser.add_argument('--workdir', default=os.path.join(script_dir, 'benchmark_data'),
+                        help='Where synthetic inputs are generated and reused')
+    parser.add_argument('--output', default=os.path.join(script_dir, 'benchmark_results.json'))
+    parser.add_argument('--compare', metavar='BASELINE_JSON', help='Compare against an earlier results file')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Slowdown ratio reported as a regression (default 1.2)')
+    args = parser.parse_args()
+
+    scales = [int(float(s)) for s in args.scales.split(',')]
+    stages = args.stages.split(',')
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+
+    report = run_benchmarks(scales, stages, args.workdir, args.repeat, args.seed, args.max_loop_scale)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved to: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.2f}x")
+            sys.exit(1)
@@ -0,0 +1,159 @@
+"""
+Precompute per-building sentiment by joining intervals to building footprints offline
+Replaces the O(buildings x intervals) scan done by getBuildingSentiment in the browser
+with a grid index over building centroids
+"""
+import argparse
+import os
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from artifacts import publish_artifacts, write_json
+from filter_buildings import building_center
+from json_stream import iter_json_array
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+from spatial_index import GridIndex
+
+# Same threshold and bucket size as the web app (~33 meters, 3-hour buckets)
+DEFAULT_THRESHOLD = 0.0003
+DEFAULT_BUCKET_SIZE = 3
+
+# Cap on memoized per-coordinate lookups (stay intervals repeat the same coordinates)
+MATCH_CACHE_SIZE = 100_000
+
+def build_centroid_index(buildings_file: str, cell_size: float):
+    """
+    Index building centers from a GeoJSON file
+    Returns (index, building_ids) where building_ids[i] is the OSM id of feature i (or None)
+    """
+    index = GridIndex(cell_size)
+    building_ids = []
+    for i, feature in enumerate(iter_json_array(buildings_file, key='features')):
+        building_ids.append(feature.get('properties', {}).get('id'))
+        center = building_center(feature)
+        if center is not None:
+            index.insert(i, center[0], center[1])
+    return index, building_ids
+
+def join_intervals_to_buildings(buildings_file: str, intervals_file: str,
+                                threshold: float = DEFAULT_THRESHOLD,
+                                bucket_size: int = DEFAULT_BUCKET_SIZE) -> Dict:
+    """
+    Join intervals to every building whose center is within threshold degrees
+
+    Intervals are streamed, and only running sums are kept per building, so memory
+    depends on the number of matched buildings rather than the number of intervals.
+
+    Returns:
+        Dict with the join parameters and a 'buildings' list. Each entry holds the feature
+        index, OSM id, mean sentiment, interval count and duration-weighted 'timeBuckets'
+        in the same shape getBuildingSentiment returns
+    """
+    print(f"Indexing buildings from {buildings_file}...")
+    with metrics.span('index'):
+        index, building_ids = build_centroid_index(buildings_file, threshold)
+    print(f"Indexed {index.size} building centers into {len(index.cells)} grid cells")
+
+    # building index -> [sum_sentiment, count, {bucket: [weighted_sum, total_weight, count, total_duration]}]
+    totals: Dict[int, list] = {}
+    match_cache: Dict[tuple, List[int]] = {}
+    interval_count = 0
+
+    print(f"Joining intervals from {intervals_file}...")
+    join_start = time.perf_counter()
+    for interval in iter_json_array(intervals_file):
+        interval_count += 1
+        coord = (interval['longitude'], interval['latitude'])
+        matches = match_cache.get(coord)
+        if matches is None:
+            matches = [key for key, _ in index.query_radius(coord[0], coord[1], threshold)]
+            if len(match_cache) >= MATCH_CACHE_SIZE:
+                match_cache.clear()
+            match_cache[coord] = matches
+        if not matches:
+            continue
+
+        sentiment = interval['sentiment_score']
+        duration = interval.get('duration_minutes') or 0
+        hour = datetime.fromisoformat(interval['start_time']).hour
+        bucket = (hour // bucket_size) * bucket_size
+
+        for building in matches:
+            entry = totals.get(building)
+            if entry is None:
+                entry = totals[building] = [0.0, 0, {}]
+            entry[0] += sentiment
+            entry[1] += 1
+            stats = entry[2].get(bucket)
+            if stats is None:
+                stats = entry[2][bucket] = [0.0, 0.0, 0, 0.0]
+            stats[0] += sentiment * duration
+            stats[1] += duration
+            stats[2] += 1
+            stats[3] += duration
+
+    metrics.add_time('join', time.perf_counter() - join_start)
+    metrics.count('intervals_read', interval_count)
+
+    buildings = []
+    for building in sorted(totals):
+        sum_sentiment, count, bucket_stats = totals[building]
+        time_buckets = []
+        for bucket in sorted(bucket_stats):
+            weighted_sum, total_weight, bucket_count, total_duration = bucket_stats[bucket]
+            if bucket_count == 0 or total_duration <= 0:
+                continue  # Only show buckets with data
+            end_hour = bucket + bucket_size
+            time_buckets.append({
+                'bucket': bucket,
+                'timeRange': f"{bucket:02d}:00 - {end_hour:02d}:00",
+                'avgSentiment': weighted_sum / total_weight if total_weight > 0 else 0,
+                'count': bucket_count,
+                'totalDuration': total_duration
+            })
+        buildings.append({
+            'index': building,
+            'id': building_ids[building],
+            'sentiment': sum_sentiment / count,
+            'count': count,
+            'timeBuckets': time_buckets,
+            'hasMultipleBuckets': len(time_buckets) > 1
+        })
+
+    metrics.count('buildings_matched', len(buildings))
+    print(f"Joined {interval_count} intervals to {len(buildings)} buildings")
+    return {
+        'threshold': threshold,
+        'bucket_size': bucket_size,
+        'building_count': len(building_ids),
+        'buildings': buildings
+    }
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Precompute per-building sentiment from intervals')
+    parser.add_argument('--buildings', default=os.path.join(script_dir, '..', 'public', 'buildings_usc.geojson'))
+    parser.add_argument('--intervals', default=os.path.join(script_dir, 'intervals.json'))
+    parser.add_argument('--output', default=os.path.join(script_dir, 'building_sentiment.json'))
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Join distance in degrees (default 0.0003, ~33 meters)')
+    parser.add_argument('--bucket-size', type=int, default=DEFAULT_BUCKET_SIZE,
+                        help='Time-of-day bucket size in hours')
+    parser.add_argument('--publish', nargs='?', const=os.path.join(os.path.dirname(script_dir), 'public'),
+                        metavar='PUBLIC_DIR', help='Also publish the output to PUBLIC_DIR (with .gz/.br variants)')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args):
+        start = time.perf_counter()
+        result = join_intervals_to_buildings(args.buildings, args.intervals,
+                                             threshold=args.threshold, bucket_size=args.bucket_size)
+        with metrics.span('write'):
+            write_json(args.output, result)
+
+        print(f"Finished in {time.perf_counter() - start:.2f}s")
+        print(f"\nSaved to: {args.output}")
+        if args.publish:
+            publish_artifacts([(args.output, os.path.basename(args.output))], args.publish)
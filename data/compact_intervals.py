@@ -0,0 +1,183 @@
+"""
+Compact an intervals file by dropping samples that carry no extra information
+Optional post-processing for large generated datasets (and for traces from ingest_gps.py).
+
+Two passes run over each user's intervals, one day at a time:
+  - Adjacent stay intervals at the same place with the same activity are merged while
+    their sentiment scores stay within --sentiment-tolerance of each other. The merged
+    score is the duration-weighted mean, so it is within the tolerance of every original.
+  - Runs of travel points are simplified with Douglas-Peucker. Every dropped point lies
+    within --travel-tolerance meters of the kept path. A kept point's interval absorbs
+    the dropped points after it, and its score is their duration-weighted mean.
+
+Only intervals that touch (end_time == next start_time) are combined. The input is read as
+a stream and written out day by day, so memory is bounded by one day of intervals.
+"""
+import argparse
+import os
+import time
+from typing import Dict, Iterable, List
+
+from filter_buildings import simplify_line
+from json_stream import JsonArrayWriter, iter_json_array
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+
+DEFAULT_SENTIMENT_TOLERANCE = 0.1
+DEFAULT_TRAVEL_TOLERANCE = 10.0  # meters
+
+METERS_PER_DEGREE = 111_320.0
+
+def is_travel(interval: Dict) -> bool:
+    return interval.get('location_type') == 'traveling'
+
+def _stay_key(interval: Dict) -> tuple:
+    return (interval['location_name'], interval['location_type'], interval['latitude'],
+            interval['longitude'], interval.get('activity'))
+
+def merge_group(group: List[Dict]) -> Dict:
+    """One interval covering group (contiguous intervals), placed at the first one"""
+    if len(group) == 1:
+        return group[0]
+    merged = dict(group[0])
+    total = sum(interval['duration_minutes'] for interval in group)
+    if total > 0:
+        sentiment = sum(interval['sentiment_score'] * interval['duration_minutes'] for interval in group) / total
+    else:
+        sentiment = sum(interval['sentiment_score'] for interval in group) / len(group)
+    merged['end_time'] = group[-1]['end_time']
+    merged['duration_minutes'] = total
+    merged['sentiment_score'] = round(sentiment, 2)
+    return merged
+
+def simplify_travel(run: List[Dict], tolerance_m: float) -> List[Dict]:
+    """Keep the travel points Douglas-Peucker needs to stay within tolerance_m of the path"""
+    if len(run) < 3:
+        return run
+    # Degrees of latitude are the longest, so this tolerance is never looser than tolerance_m
+    points = [(interval['longitude'], interval['latitude'], i) for i, interval in enumerate(run)]
+    kept = [point[2] for point in simplify_line(points, tolerance_m / METERS_PER_DEGREE)]
+    return [merge_group(run[a:b]) for a, b in zip(kept, kept[1:] + [len(run)])]
+
+def compact_user_day(intervals: List[Dict], sentiment_tolerance: float = DEFAULT_SENTIMENT_TOLERANCE,
+                     travel_tolerance_m: float = DEFAULT_TRAVEL_TOLERANCE) -> List[Dict]:
+    """
+    Compact one user's intervals (in time order)
+
+    Returns:
+        List of intervals covering the same time spans, in the same order
+    """
+    result: List[Dict] = []
+    run: List[Dict] = []
+    low = high = 0.0
+
+    def flush():
+        if not run:
+            return
+        if is_travel(run[0]):
+            result.extend(simplify_travel(run, travel_tolerance_m))
+        else:
+            result.append(merge_group(run))
+
+    for interval in intervals:
+        sentiment = interval['sentiment_score']
+        if run:
+            last = run[-1]
+            joinable = last['end_time'] == interval['start_time']
+            if joinable and is_travel(interval):
+                joinable = is_travel(last) and last.get('travel_mode') == interval.get('travel_mode')
+            elif joinable:
+                joinable = (not is_travel(last) and _stay_key(last) == _stay_key(interval)
+                            and max(high, sentiment) - min(low, sentiment) <= sentiment_tolerance)
+            if joinable:
+                run.append(interval)
+                low, high = min(low, sentiment), max(high, sentiment)
+                continue
+            flush()
+        run = [interval]
+        low = high = sentiment
+    flush()
+    return result
+
+def compact_day(intervals: List[Dict], sentiment_tolerance: float = DEFAULT_SENTIMENT_TOLERANCE,
+                travel_tolerance_m: float = DEFAULT_TRAVEL_TOLERANCE) -> List[Dict]:
+    """Compact one day of intervals, possibly interleaving several users (user_id)"""
+    by_user: Dict = {}
+    for interval in intervals:
+        by_user.setdefault(interval.get('user_id'), []).append(interval)
+    if len(by_user) == 1:
+        return compact_user_day(intervals, sentiment_tolerance, travel_tolerance_m)
+    result = []
+    for user_intervals in by_user.values():
+        result.extend(compact_user_day(user_intervals, sentiment_tolerance, travel_tolerance_m))
+    # Same order as generate_scaled_intervals: by start time, then user (stable within a user)
+    result.sort(key=lambda interval: (interval['start_time'], interval.get('user_id')))
+    return result
+
+def compact_intervals(intervals: Iterable[Dict], output_file: str,
+                      sentiment_tolerance: float = DEFAULT_SENTIMENT_TOLERANCE,
+                      travel_tolerance_m: float = DEFAULT_TRAVEL_TOLERANCE) -> Dict:
+    """
+    Stream intervals (sorted by start_time) into a compacted JSON array, one day at a time
+
+    Returns:
+        Dict with input/output interval counts, the compression ratio and elapsed seconds
+    """
+    start = time.perf_counter()
+    read = 0
+    day_intervals: List[Dict] = []
+    current_day = None
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        writer = JsonArrayWriter(f)
+
+        def flush_day():
+            with metrics.span('compact'):
+                compacted = compact_day(day_intervals, sentiment_tolerance, travel_tolerance_m)
+            with metrics.span('write'):
+                for interval in compacted:
+                    writer.write(interval)
+            day_intervals.clear()
+
+        for interval in intervals:
+            read += 1
+            day = interval['start_time'][:10]
+            if day != current_day:
+                if current_day is not None and day < current_day:
+                    raise ValueError(f"Intervals must be sorted by start_time ({day} after {current_day})")
+                flush_day()
+                current_day = day
+            day_intervals.append(interval)
+        flush_day()
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    ratio = read / writer.count if writer.count else 1.0
+    metrics.count('intervals_read', read)
+    metrics.count('intervals_written', writer.count)
+    print(f"Compacted {read:,} intervals into {writer.count:,} ({ratio:.2f}x) in {elapsed:.2f}s")
+    return {'intervals_in': read, 'intervals_out': writer.count, 'ratio': ratio, 'seconds': elapsed}
+
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Merge redundant stay intervals and downsample travel paths')
+    parser.add_argument('--intervals', default=os.path.join(script_dir, 'intervals.json'))
+    parser.add_argument('--output', default=os.path.join(script_dir, 'intervals_compact.json'))
+    parser.add_argument('--sentiment-tolerance', type=float, default=DEFAULT_SENTIMENT_TOLERANCE,
+                        help='Largest sentiment spread merged into one stay interval (default 0.1)')
+    parser.add_argument('--travel-tolerance', type=float, default=DEFAULT_TRAVEL_TOLERANCE,
+                        help='Largest distance in meters between a dropped travel point and the kept path (default 10)')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args):
+        result = compact_intervals(iter_json_array(args.intervals), args.output,
+                                   args.sentiment_tolerance, args.travel_tolerance)
+        size_in = os.path.getsize(args.intervals)
+        size_out = os.path.getsize(args.output)
+        metrics.count('bytes_read', size_in)
+        metrics.count('bytes_written', size_out)
+        print(f"File size: {size_in / 1e6:.2f} MB -> {size_out / 1e6:.2f} MB "
+              f"({size_in / size_out if size_out else 1.0:.2f}x)")
+        print(f"\nSaved to: {args.output}")
@@ -0,0 +1,160 @@
+"""
+Local stand-in for the Mapbox Directions API
+Serves deterministic synthetic routes so route fetching can be benchmarked and tested
+without network access. Point the generator at it with --directions-url or MAPBOX_API_URL.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+ROUTE_PATH = re.compile(r'^/directions/v5/mapbox/(?P<profile>[\w-]+)/'
+                        r'(?P<lon1>-?[\d.]+),(?P<lat1>-?[\d.]+);(?P<lon2>-?[\d.]+),(?P<lat2>-?[\d.]+)$')
+
+# 200 responses a flaky upstream or proxy might produce
+MALFORMED_BODIES = [
+    b'{"code": "Ok", "routes": [{"geometry": {"type": "LineStr',   # Truncated JSON
+    b'<html><body>Gateway error</body></html>',                    # Not JSON at all
+    b'{"code": "Ok", "routes": [{"distance": 0}]}',                # Route without geometry
+]
+
+def synthetic_route(lon1: float, lat1: float, lon2: float, lat2: float, steps: int = 8) -> List[List[float]]:
+    """
+    Street-grid style route: along longitude first, then latitude, with evenly spaced vertices
+    """
+    coords = []
+    for i in range(steps + 1):
+        coords.append([lon1 + (lon2 - lon1) * i / steps, lat1])
+    for i in range(1, steps + 1):
+        coords.append([lon2, lat1 + (lat2 - lat1) * i / steps])
+    return coords
+
+
+class StubDirectionsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split('?', 1)[0]
+        match = ROUTE_PATH.match(path)
+        if server.latency_s:
+            time.sleep(server.latency_s)
+
+        if not match:
+            self._send(404, {'message': 'Not Found'})
+            return
+        if server.should_fail():
+            self._send(503, {'message': 'Service Unavailable (simulated)'})
+            return
+        if server.over_rate_limit():
+            self._send(429, {'message': 'Too Many Requests (simulated)'}, {'Retry-After': '0.1'})
+            return
+
+        malformed = server.malformed_body()
+        if malformed is not None:
+            self._send_raw(200, malformed)
+            return
+
+        lon1, lat1, lon2, lat2 = (float(match.group(k)) for k in ('lon1', 'lat1', 'lon2', 'lat2'))
+        coords = synthetic_route(lon1, lat1, lon2, lat2)
+        self._send(200, {
+            'code': 'Ok',
+            'routes': [{
+                'geometry': {'type': 'LineString', 'coordinates': coords},
+                'distance': 0,
+                'duration': 0
+            }]
+        })
+
+    def _send(self, status: int, body: dict, headers: Optional[dict] = None):
+        self._send_raw(status, json.dumps(body).encode('utf-8'), headers)
+
+    def _send_raw(self, status: int, payload: bytes, headers: Optional[dict] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+        with self.server.lock:
+            self.server.served[status] = self.server.served.get(status, 0) + 1
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+
+class StubDirectionsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], latency_ms: float = 0.0, failure_rate: float = 0.0,
+                 rate_limit: Optional[float] = None, seed: int = 0, malformed_rate: float = 0.0):
+        super().__init__(address, StubDirectionsHandler)
+        self.latency_s = latency_ms / 1000.0
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.rate_limit = rate_limit
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.served = {}
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.failure_rate
+
+    def malformed_body(self) -> Optional[bytes]:
+        """A broken 200 body (truncated JSON or a route without geometry), or None"""
+        with self.lock:
+            if not self.malformed_rate or self.rng.random() >= self.malformed_rate:
+                return None
+            return self.rng.choice(MALFORMED_BODIES)
+
+    def over_rate_limit(self) -> bool:
+        """Fixed one-second window limiter, like a simple API gateway"""
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+            return self._window_count > self.rate_limit
+
+def start_stub_server(host: str = '127.0.0.1', port: int = 0, **options):
+    """
+    Start a stub server on a background thread
+    Returns (server, base_url); call server.shutdown() when done
+    """
+    server = StubDirectionsServer((host, port), **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a local stand-in Mapbox Directions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--malformed-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with a malformed 200 body')
+    parser.add_argument('--rate-limit', type=float, default=None, help='Requests/s before answering 429')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubDirectionsServer((args.host, args.port), latency_ms=args.latency_ms,
+                                  failure_rate=args.failure_rate, rate_limit=args.rate_limit, seed=args.seed,
+                                  malformed_rate=args.malformed_rate)
+    print(f"Stub Directions API listening on http://{args.host}:{args.port}")
+    print(f"Use: MAPBOX_API_URL=http://{args.host}:{args.port} python generate_intervals_with_routes.py")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,76 +1,446 @@
 """
 Filter buildings to a smaller radius around USC for better performance
 """
+import argparse
 import json
+import math
 import os
+import shutil
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
 
-def filter_buildings_by_radius(input_file, output_file, center_lat, center_lon, radius_km=1.0):
+from artifacts import ArtifactFile, directory_files, publish_artifacts, write_json, write_json_array
+from json_stream import JsonArrayWriter, iter_json_array
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+
+def building_center(feature: Dict) -> Optional[Tuple[float, float]]:
+    """
+    Get building center as (lon, lat) - average of the first few outer ring coordinates
+    Matches the sampling used by getBuildingSentiment in the web app
+    Returns None for non-polygon or empty geometries
+    """
+    if feature['geometry']['type'] != 'Polygon':
+        return None
+    coords = feature['geometry']['coordinates'][0]
+    if len(coords) == 0:
+        return None
+    # Sample first few points for center calculation
+    sample_size = min(10, len(coords))
+    sum_lon = sum(c[0] for c in coords[:sample_size])
+    sum_lat = sum(c[1] for c in coords[:sample_size])
+    return sum_lon / sample_size, sum_lat / sample_size
+
+def _within_radius(feature: Dict, center_lat: float, center_lon: float, radius_deg: float) -> bool:
+    center = building_center(feature)
+    if center is None:
+        return False
+    building_lon, building_lat = center
+    # Simple distance check (Euclidean in lat/lon space)
+    d_lat = building_lat - center_lat
+    d_lon = building_lon - center_lon
+    distance_sq = d_lat * d_lat + d_lon * d_lon
+    return distance_sq <= radius_deg * radius_deg
+
+def filter_buildings_by_radius(input_file, output_file, center_lat, center_lon, radius_km=1.0,
+                               precision: Optional[int] = None):
     """
     Filter buildings to only include those within radius_km of center point
-    
+
     Args:
         input_file: Path to input GeoJSON file
-        output_file: Path to output GeoJSON file
+        output_file: Path to output GeoJSON file (compact JSON)
         center_lat: Center latitude
         center_lon: Center longitude
         radius_km: Radius in kilometers (default 1km)
+        precision: Round coordinates to this many decimals (None: keep them)
     """
     print(f"Loading buildings from {input_file}...")
-    with open(input_file, 'r', encoding='utf-8') as f:
+    with metrics.span('load'), open(input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
-    
+
     # Convert radius from km to degrees (approximate)
     # At USC latitude (~34°), 1 degree ≈ 111 km
     radius_deg = radius_km / 111.0
-    
+
     print(f"Filtering buildings within {radius_km}km of ({center_lat}, {center_lon})...")
-    
-    filtered_features = []
-    for feature in data['features']:
-        if feature['geometry']['type'] == 'Polygon':
-            # Get building center (average of first few coordinates)
-            coords = feature['geometry']['coordinates'][0]
-            if len(coords) > 0:
-                # Sample first few points for center calculation
-                sample_size = min(10, len(coords))
-                sum_lon = sum(c[0] for c in coords[:sample_size])
-                sum_lat = sum(c[1] for c in coords[:sample_size])
-                building_lon = sum_lon / sample_size
-                building_lat = sum_lat / sample_size
-                
-                # Simple distance check (Euclidean in lat/lon space)
-                d_lat = building_lat - center_lat
-                d_lon = building_lon - center_lon
-                distance_sq = d_lat * d_lat + d_lon * d_lon
-                
-                if distance_sq <= radius_deg * radius_deg:
-                    filtered_features.append(feature)
-    
-    output_data = {
-        "type": "FeatureCollection",
-        "features": filtered_features
-    }
-    
+
+    with metrics.span('filter'):
+        filtered_features = [
+            feature for feature in data['features']
+            if _within_radius(feature, center_lat, center_lon, radius_deg)
+        ]
+    metrics.count('features_read', len(data['features']))
+    metrics.count('features_kept', len(filtered_features))
+
     print(f"Writing {len(filtered_features)} buildings to {output_file}...")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, indent=2)
-    
+    with metrics.span('write'):
+        write_json_array(output_file, filtered_features, precision, key='features',
+                         header={'type': 'FeatureCollection'})
+
     print(f"Filtered from {len(data['features'])} to {len(filtered_features)} buildings")
     print(f"Reduction: {((1 - len(filtered_features) / len(data['features'])) * 100):.1f}%")
 
+def stream_filter_buildings_by_radius(input_file, output_file, center_lat, center_lon, radius_km=1.0,
+                                      precision: Optional[int] = None):
+    """
+    Streaming version of filter_buildings_by_radius for very large inputs
+    Features are parsed, filtered and written one at a time, so peak memory does not
+    grow with file size. Output is byte-identical to filter_buildings_by_radius.
+
+    Returns:
+        Dict with total/kept feature counts, elapsed seconds and features per second
+    """
+    radius_deg = radius_km / 111.0
+
+    print(f"Streaming buildings from {input_file}...")
+    print(f"Filtering buildings within {radius_km}km of ({center_lat}, {center_lon})...")
+
+    start = time.perf_counter()
+    total = 0
+
+    def kept_features():
+        nonlocal total
+        for feature in iter_json_array(input_file, key='features'):
+            total += 1
+            if _within_radius(feature, center_lat, center_lon, radius_deg):
+                yield feature
+
+    kept = write_json_array(output_file, kept_features(), precision, key='features',
+                            header={'type': 'FeatureCollection'})['count']
+    elapsed = time.perf_counter() - start
+    # Load, filter and write are interleaved when streaming, so they share one span
+    metrics.add_time('filter_stream', elapsed)
+
+    metrics.count('features_read', total)
+    metrics.count('features_kept', kept)
+    rate = total / elapsed if elapsed > 0 else float('inf')
+    print(f"Filtered from {total} to {kept} buildings")
+    if total:
+        print(f"Reduction: {((1 - kept / total) * 100):.1f}%")
+    print(f"Throughput: {rate:,.0f} features/s ({elapsed:.2f}s)")
+
+    return {'total': total, 'kept': kept, 'seconds': elapsed, 'features_per_second': rate}
+
+# Tiling (z/x/y web mercator tiles with level-of-detail simplification)
+
+TILE_SIZE_PX = 256
+# Spilled features are buffered per tile and flushed to disk in batches of this many bytes
+SPILL_BUFFER_BYTES = 1 << 16
+# Cap on all tiles' buffers together; when exceeded, the largest buffers are flushed first
+SPILL_TOTAL_BYTES = 64 << 20
+
+def lonlat_to_tile(lon: float, lat: float, zoom: int) -> Tuple[int, int]:
+    """Web mercator tile containing a point"""
+    n = 1 << zoom
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+def tile_quadkey(x: int, y: int, zoom: int) -> str:
+    digits = []
+    for i in range(zoom, 0, -1):
+        mask = 1 << (i - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return ''.join(digits)
+
+def zoom_tolerance(zoom: int) -> float:
+    """Size of one screen pixel in degrees of longitude at this zoom"""
+    return 360.0 / (TILE_SIZE_PX * (1 << zoom))
+
+def zoom_precision(zoom: int) -> int:
+    """Decimal places needed to stay below a fraction of a pixel at this zoom"""
+    return max(4, math.ceil(-math.log10(zoom_tolerance(zoom))) + 1)
+
+def simplify_line(points: Sequence[Sequence[float]], tolerance: float) -> List[Sequence[float]]:
+    """
+    Douglas-Peucker simplification keeping the first and last point
+    Closed rings work as-is: distances are measured from the shared start/end point
+    """
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance * tolerance
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = points[first][0], points[first][1]
+        dx, dy = points[last][0] - x1, points[last][1] - y1
+        length_sq = dx * dx + dy * dy
+        max_dist, index = -1.0, None
+        for i in range(first + 1, last):
+            px, py = points[i][0] - x1, points[i][1] - y1
+            if length_sq > 0:
+                t = max(0.0, min(1.0, (px * dx + py * dy) / length_sq))
+                px, py = px - t * dx, py - t * dy
+            dist = px * px + py * py
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if index is not None and max_dist > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [p for p, k in zip(points, keep) if k]
+
+def _simplify_rings(rings: List, tolerance: float, decimals: int) -> Optional[List]:
+    """Simplified, quantized rings of one polygon; None when the outer ring collapses"""
+    result = []
+    for i, ring in enumerate(rings):
+        simplified = simplify_line(ring, tolerance)
+        quantized = []
+        for point in simplified:
+            q = [round(point[0], decimals), round(point[1], decimals)]
+            if not quantized or q != quantized[-1]:
+                quantized.append(q)
+        if len(quantized) < 4:
+            if i == 0:
+                return None
+            continue
+        result.append(quantized)
+    return result
+
+def tile_center(feature: Dict) -> Optional[Tuple[float, float]]:
+    """
+    Point that decides a building's tile: building_center for a Polygon, and the center of the
+    first member polygon for a MultiPolygon (e.g. an OSM relation with several outer rings)
+    """
+    geometry = feature.get('geometry') or {}
+    if geometry.get('type') == 'MultiPolygon':
+        if not geometry['coordinates']:
+            return None
+        return building_center({'geometry': {'type': 'Polygon', 'coordinates': geometry['coordinates'][0]}})
+    if geometry.get('type') != 'Polygon':
+        return None
+    return building_center(feature)
+
+def simplify_feature(feature: Dict, zoom: int, max_zoom: int) -> Optional[Dict]:
+    """
+    Level-of-detail version of a building for a zoom level
+    Below max_zoom rings are simplified to one pixel and coordinates are quantized; buildings
+    that collapse below a pixel are dropped (None). Holes that collapse are removed, and so
+    are the collapsed members of a MultiPolygon.
+    """
+    if zoom >= max_zoom:
+        return feature
+    tolerance = zoom_tolerance(zoom)
+    decimals = zoom_precision(zoom)
+    geometry = feature['geometry']
+    if geometry['type'] == 'MultiPolygon':
+        polygons = [p for p in (_simplify_rings(rings, tolerance, decimals) for rings in geometry['coordinates'])
+                    if p is not None]
+        if not polygons:
+            return None
+        simplified = {'type': 'MultiPolygon', 'coordinates': polygons}
+    else:
+        rings = _simplify_rings(geometry['coordinates'], tolerance, decimals)
+        if rings is None:
+            return None
+        simplified = {'type': 'Polygon', 'coordinates': rings}
+    return {
+        'type': 'Feature',
+        'geometry': simplified,
+        'properties': feature.get('properties', {})
+    }
+
+def _write_tile(task) -> Dict:
+    """Build one output tile from the spilled max-zoom features it covers (runs in a worker)"""
+    zoom, x, y, max_zoom, spill_paths, output_file = task
+    count = 0
+    dropped = 0
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with ArtifactFile(output_file) as out:
+        out.write('{"type":"FeatureCollection","features":')
+        writer = JsonArrayWriter(out, indent=None)
+        for spill_path in spill_paths:
+            with open(spill_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    feature = simplify_feature(json.loads(line), zoom, max_zoom)
+                    if feature is None:
+                        dropped += 1
+                        continue
+                    writer.write(feature)
+                    count += 1
+        writer.close()
+        out.write('}')
+    return {'z': zoom, 'x': x, 'y': y, 'quadkey': tile_quadkey(x, y, zoom), 'features': count,
+            'dropped': dropped, 'bytes': out.info['bytes'], 'sha256': out.info['sha256']}
+
+def _clear_tiles(output_dir: str):
+    """Remove the spill directory, zoom directories and manifest left by an earlier run"""
+    if not os.path.isdir(output_dir):
+        return
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        if os.path.isdir(path) and (name == '.spill' or name.isdigit()):
+            shutil.rmtree(path)
+        elif name == 'manifest.json':
+            os.remove(path)
+
+def tile_buildings(input_file: str, output_dir: str, min_zoom: int = 13, max_zoom: int = 16,
+                   workers: Optional[int] = None, buffer_bytes: int = SPILL_TOTAL_BYTES) -> Dict:
+    """
+    Split buildings into z/x/y GeoJSON tiles for zoom levels min_zoom..max_zoom
+
+    Each building goes in the tile containing its center (tile_center); features without
+    polygon geometry are skipped and counted in the manifest. max_zoom tiles keep full geometry;
+    lower zooms get Douglas-Peucker simplification at one pixel and quantized coordinates.
+    Features are streamed into per-tile spill files first, then tiles are written in
+    parallel, so memory stays bounded for large regions: spill buffers hold at most
+    buffer_bytes in total.
+
+    Writes output_dir/{z}/{x}/{y}.geojson and output_dir/manifest.json, replacing the tiles
+    of any earlier run in output_dir
+
+    Returns:
+        The manifest dict
+    """
+    if not 0 <= min_zoom <= max_zoom:
+        raise ValueError("Need 0 <= min_zoom <= max_zoom")
+    start = time.perf_counter()
+    spill_dir = os.path.join(output_dir, '.spill')
+    # Spill files are appended to, so leftovers from a crashed run would be merged in
+    _clear_tiles(output_dir)
+    os.makedirs(spill_dir)
+
+    # Pass 1: stream features into spill files, one per max-zoom tile
+    print(f"Spilling buildings from {input_file} into zoom {max_zoom} tiles...")
+    buffers = defaultdict(list)
+    buffered_bytes = defaultdict(int)
+    buffered_total = 0
+    spill_paths = {}
+    total = 0
+    skipped = 0
+
+    def flush(tile):
+        nonlocal buffered_total
+        with open(spill_paths[tile], 'a', encoding='utf-8') as f:
+            f.writelines(buffers[tile])
+        buffers[tile].clear()
+        buffered_total -= buffered_bytes[tile]
+        buffered_bytes[tile] = 0
+
+    for feature in iter_json_array(input_file, key='features'):
+        center = tile_center(feature)
+        if center is None:
+            skipped += 1
+            continue
+        total += 1
+        tile = lonlat_to_tile(center[0], center[1], max_zoom)
+        if tile not in spill_paths:
+            spill_paths[tile] = os.path.join(spill_dir, f"{tile[0]}_{tile[1]}.jsonl")
+        line = json.dumps(feature, separators=(',', ':')) + '\n'
+        buffers[tile].append(line)
+        buffered_bytes[tile] += len(line)
+        buffered_total += len(line)
+        if buffered_bytes[tile] >= SPILL_BUFFER_BYTES:
+            flush(tile)
+        elif buffered_total > buffer_bytes:
+            # Many tiles each below the per-tile threshold: flush the largest until half the cap is free
+            for largest in sorted(buffered_bytes, key=buffered_bytes.get, reverse=True):
+                if buffered_total <= buffer_bytes // 2:
+                    break
+                flush(largest)
+            metrics.count('spill_cap_flushes')
+    for tile in list(buffers):
+        if buffers[tile]:
+            flush(tile)
+    metrics.add_time('tile_spill', time.perf_counter() - start)
+    metrics.count('features_read', total)
+    metrics.count('features_skipped', skipped)
+    if skipped:
+        print(f"Skipped {skipped} features that are not Polygons or MultiPolygons")
+
+    # Pass 2: every output tile gathers the max-zoom spill files beneath it
+    tasks = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        shift = max_zoom - zoom
+        children = defaultdict(list)
+        for (x, y), path in spill_paths.items():
+            children[(x >> shift, y >> shift)].append(path)
+        for (x, y), paths in sorted(children.items()):
+            output_file = os.path.join(output_dir, str(zoom), str(x), f"{y}.geojson")
+            tasks.append((zoom, x, y, max_zoom, sorted(paths), output_file))
+
+    print(f"Writing {len(tasks)} tiles for zooms {min_zoom}-{max_zoom}...")
+    with metrics.span('tile_write'), ProcessPoolExecutor(max_workers=workers) as executor:
+        tiles = list(executor.map(_write_tile, tasks, chunksize=max(1, len(tasks) // 64)))
+    metrics.count('tiles_written', len(tiles))
+    shutil.rmtree(spill_dir)
+
+    manifest = {
+        'min_zoom': min_zoom,
+        'max_zoom': max_zoom,
+        'tile_path': '{z}/{x}/{y}.geojson',
+        'buildings': total,
+        'skipped': skipped,
+        'levels': {
+            str(zoom): {'tolerance_deg': 0 if zoom >= max_zoom else zoom_tolerance(zoom),
+                        'precision': None if zoom >= max_zoom else zoom_precision(zoom)}
+            for zoom in range(min_zoom, max_zoom + 1)
+        },
+        'tiles': tiles
+    }
+    write_json(os.path.join(output_dir, 'manifest.json'), manifest)
+
+    elapsed = time.perf_counter() - start
+    for zoom in range(min_zoom, max_zoom + 1):
+        level = [t for t in tiles if t['z'] == zoom]
+        print(f"  z{zoom}: {len(level)} tiles, {sum(t['features'] for t in level)} buildings, "
+              f"{sum(t['bytes'] for t in level):,} bytes")
+    print(f"Tiled {total} buildings in {elapsed:.2f}s")
+    return manifest
+
 if __name__ == "__main__":
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    
+
     # USC coordinates
     usc_lat = 34.0224
     usc_lon = -118.2851
-    
+
+    parser = argparse.ArgumentParser(description='Filter buildings to a radius around USC')
+    parser.add_argument('--input', default=os.path.join(script_dir, 'buildings_usc.geojson'))
+    parser.add_argument('--output', default=os.path.join(script_dir, 'buildings_usc_filtered.geojson'))
     # Filter to 1.3km radius (expanded from 1km)
-    input_file = os.path.join(script_dir, 'buildings_usc.geojson')
-    output_file = os.path.join(script_dir, 'buildings_usc_filtered.geojson')
-    
-    filter_buildings_by_radius(input_file, output_file, usc_lat, usc_lon, radius_km=1.3)
-    
-    print(f"\nFiltered building file saved to: {output_file}")
-    print("Copy this file to public/buildings_usc.geojson to use it in the app")
+    parser.add_argument('--radius-km', type=float, default=1.3)
+    parser.add_argument('--stream', action='store_true',
+                        help='Parse and write features incrementally (constant memory, for large inputs)')
+    parser.add_argument('--tiles', metavar='OUTPUT_DIR',
+                        help='Tiling mode: write z/x/y tiles and a manifest to OUTPUT_DIR instead of filtering')
+    parser.add_argument('--min-zoom', type=int, default=13)
+    parser.add_argument('--max-zoom', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=None, help='Tile writer processes (default: all cores)')
+    parser.add_argument('--spill-mb', type=float, default=SPILL_TOTAL_BYTES / (1 << 20),
+                        help='Memory for buffered features while tiling, all tiles together')
+    parser.add_argument('--precision', type=int, default=None, help='Round coordinates to this many decimals')
+    parser.add_argument('--publish', nargs='?', const=os.path.join(os.path.dirname(script_dir), 'public'),
+                        metavar='PUBLIC_DIR',
+                        help='Also publish the output as buildings_usc.geojson (tiles: as public/<dir name>/), '
+                             'with .gz/.br variants')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args):
+        if args.tiles:
+            tile_buildings(args.input, args.tiles, args.min_zoom, args.max_zoom, workers=args.workers,
+                           buffer_bytes=int(args.spill_mb * (1 << 20)))
+            print(f"\nTiles saved to: {args.tiles}")
+            if args.publish:
+                publish_artifacts(directory_files(args.tiles, os.path.basename(os.path.normpath(args.tiles))),
+                                  args.publish)
+        else:
+            if args.stream:
+                stream_filter_buildings_by_radius(args.input, args.output, usc_lat, usc_lon,
+                                                  radius_km=args.radius_km, precision=args.precision)
+            else:
+                filter_buildings_by_radius(args.input, args.output, usc_lat, usc_lon,
+                                           radius_km=args.radius_km, precision=args.precision)
 
+            print(f"\nFiltered building file saved to: {args.output}")
+            if args.publish:
+                publish_artifacts([(args.output, 'buildings_usc.geojson')], args.publish)
+            else:
+                print("Run with --publish (or python artifacts.py) to use it in the app")
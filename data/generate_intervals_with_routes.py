@@ -2,13 +2,25 @@
 Generate interval data with actual Mapbox route coordinates for travel segments
 Uses Mapbox Directions API to get realistic paths
 """
+import argparse
 import json
-import random
+import numpy as np
 import requests
+import time
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 import os
 
+from artifacts import publish_artifacts, round_floats, write_json
+from interval_columns import write_interval_columns
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+from route_cache import DEFAULT_CACHE_PATH, RouteCache, route_key
+from route_fetcher import DEFAULT_API_URL, directions_url, fetch_routes, parse_route
+from route_interpolation import interpolate_routes
+from schedule_engine import ScheduleEngine
+from sentiment_models import (AR1Model, AlternatingModel, RandomWalkModel, SentimentModel, TransitionModel,
+                              UniformModel, stream_rng)
+
 # Load locations
 script_dir = os.path.dirname(os.path.abspath(__file__))
 with open(os.path.join(script_dir, 'locations.json'), 'r', encoding='utf-8') as f:
@@ -21,9 +33,10 @@ def get_route(start_lat: float, start_lon: float, end_lat: float, end_lon: float
     """
     Get route between two points using Mapbox Directions API
     Returns list of [lon, lat] coordinates for the route
+    For many routes use route_fetcher.fetch_routes, which fetches concurrently
     """
     try:
-        url = f"https://api.mapbox.com/directions/v5/mapbox/{profile}/{start_lon},{start_lat};{end_lon},{end_lat}"
+        url = directions_url(DEFAULT_API_URL, start_lat, start_lon, end_lat, end_lon, profile)
         params = {
             'access_token': MAPBOX_TOKEN,
             'geometries': 'geojson',
@@ -31,10 +44,7 @@ def get_route(start_lat: float, start_lon: float, end_lat: float, end_lon: float
         }
         response = requests.get(url, params=params, timeout=10)
         if response.status_code == 200:
-            data = response.json()
-            if data.get('routes') and len(data['routes']) > 0:
-                route_coords = data['routes'][0]['geometry']['coordinates']
-                return route_coords
+            return parse_route(response.json())
         else:
             print(f"API error {response.status_code}: {response.text}")
     except Exception as e:
@@ -44,58 +54,58 @@ def get_route(start_lat: float, start_lon: float, end_lat: float, end_lon: float
 def interpolate_route_points(route_coords: List[List[float]], num_points: int) -> List[Dict]:
     """
     Interpolate route coordinates to get evenly spaced points
-    Returns list of {lat, lon} dicts
+    Returns list of {lat, lon} dicts (thin wrapper over the vectorized interpolate_routes)
     """
-    if not route_coords or len(route_coords) < 2:
-        return []
-    
-    points = []
-    total_distance = 0
-    segment_distances = []
-    
-    # Calculate cumulative distances
-    for i in range(len(route_coords) - 1):
-        lon1, lat1 = route_coords[i]
-        lon2, lat2 = route_coords[i + 1]
-        # Simple distance calculation
-        dist = ((lat2 - lat1)**2 + (lon2 - lon1)**2)**0.5
-        total_distance += dist
-        segment_distances.append(dist)
-    
-    if total_distance == 0:
-        return [{'lat': route_coords[0][1], 'lon': route_coords[0][0]}]
-    
-    # Generate evenly spaced points
-    for i in range(num_points):
-        target_dist = (i / (num_points - 1)) * total_distance if num_points > 1 else 0
-        cumulative = 0
-        for j, seg_dist in enumerate(segment_distances):
-            if cumulative + seg_dist >= target_dist:
-                # Interpolate within this segment
-                progress = (target_dist - cumulative) / seg_dist if seg_dist > 0 else 0
-                lon1, lat1 = route_coords[j]
-                lon2, lat2 = route_coords[j + 1]
-                points.append({
-                    'lat': lat1 + (lat2 - lat1) * progress,
-                    'lon': lon1 + (lon2 - lon1) * progress
-                })
-                break
-            cumulative += seg_dist
-        else:
-            # Use last point
-            lon, lat = route_coords[-1]
-            points.append({'lat': lat, 'lon': lon})
-    
-    return points
+    points = interpolate_routes([route_coords], num_points)[0]
+    return [{'lat': lat, 'lon': lon} for lon, lat in points.tolist()]
+
+# Schedule location keys, and the bundled locations.json entries they use when a location set
+# does not assign them with a 'schedule_key' field
+SCHEDULE_LOCATION_KEYS = ('home', 'gym', 'cpa', 'ralphs', 'doheny')
+SCHEDULE_LOCATION_NAMES = {'gym': 'Lyon Center', 'cpa': 'Kaprielian Hall', 'doheny': 'Doheny Library'}
+# Updated Ralphs coordinates
+RALPHS = {'name': 'Ralphs', 'type': 'grocery', 'latitude': 34.0260, 'longitude': -118.2843, 'address': '2600 S. Vermont Ave., Los Angeles, CA 90007'}
+
+def build_location_map(locations: List[Dict]) -> Dict[str, Dict]:
+    """
+    Map schedule location keys (home, gym, cpa, ralphs, doheny) to entries of a location set
+
+    An entry with "schedule_key": "<key>" is used for that key. Other keys fall back to the
+    bundled set: the home-type entry, the names in SCHEDULE_LOCATION_NAMES, and RALPHS
+    if the set has a Ralphs entry.
+    Raises ValueError naming the keys the set cannot fill.
+    """
+    location_map = {}
+    for loc in locations:
+        key = loc.get('schedule_key')
+        if key is None:
+            continue
+        if key not in SCHEDULE_LOCATION_KEYS:
+            raise ValueError(f"Unknown schedule_key '{key}' on {loc['name']} "
+                             f"(expected one of {', '.join(SCHEDULE_LOCATION_KEYS)})")
+        if key in location_map:
+            raise ValueError(f"Location set assigns schedule key '{key}' twice: "
+                             f"{location_map[key]['name']}, {loc['name']}")
+        location_map[key] = loc
+    if 'home' not in location_map:
+        home = next((loc for loc in locations if loc['type'] == 'home'), None)
+        if home is not None:
+            location_map['home'] = home
+    by_name = {loc['name']: loc for loc in locations}
+    for key, name in SCHEDULE_LOCATION_NAMES.items():
+        if key not in location_map and name in by_name:
+            location_map[key] = by_name[name]
+    if 'ralphs' not in location_map and RALPHS['name'] in by_name:
+        location_map['ralphs'] = RALPHS
+
+    missing = [key for key in SCHEDULE_LOCATION_KEYS if key not in location_map]
+    if missing:
+        raise ValueError(f"Location set has no entry for schedule locations {', '.join(missing)} "
+                         f"(mark the entries to use with \"schedule_key\")")
+    return {key: location_map[key] for key in SCHEDULE_LOCATION_KEYS}
 
 # Updated locations with correct Ralphs coordinates
-location_map = {
-    'home': next(loc for loc in locations if loc['type'] == 'home'),
-    'gym': next(loc for loc in locations if loc['name'] == 'Lyon Center'),
-    'cpa': next(loc for loc in locations if loc['name'] == 'Kaprielian Hall'),
-    'ralphs': {'name': 'Ralphs', 'type': 'grocery', 'latitude': 34.0260, 'longitude': -118.2843, 'address': '2600 S. Vermont Ave., Los Angeles, CA 90007'},
-    'doheny': next(loc for loc in locations if loc['name'] == 'Doheny Library')
-}
+location_map = build_location_map(locations)
 
 # Update Ralphs in locations if it exists
 for loc in locations:
@@ -103,183 +113,179 @@ for loc in locations:
         loc['latitude'] = 34.0260
         loc['longitude'] = -118.2843
 
-def generate_intervals_with_routes():
+BASE_DATE = datetime(2024, 11, 19, 0, 0)  # Start date (Tuesday) - skipping Monday Nov 18
+NUM_DAYS = 6  # Tuesday through Sunday
+
+# Sentiment ranges
+SENTIMENT_RANGES = {
+    'low': (0.2, 0.5),
+    'low_medium': (0.1, 0.3),
+    'medium': (-0.05, 0.15),
+    'high': (-0.3, -0.1),
+}
+
+# Sentiment model per stress level (schedule 'stress' / 'travel_stress' values); add entries
+# here to make new profiles available to SCHEDULE_SPEC
+SENTIMENT_PROFILES: Dict[str, SentimentModel] = {
+    name: UniformModel(*bounds) for name, bounds in SENTIMENT_RANGES.items()
+}
+SENTIMENT_PROFILES.update({
+    # Medium and high in turns, 20 minutes each
+    'fluctuate_medium_high': AlternatingModel([SENTIMENT_RANGES['medium'], SENTIMENT_RANGES['high']],
+                                              step_minutes=20),
+    # High for the first 30% of the stay, neutral until 60%, then low (pieces of ~30 minutes)
+    'high_to_low': TransitionModel([(0.3, SENTIMENT_RANGES['high']), (0.6, (-0.1, 0.1)),
+                                    (1.0, SENTIMENT_RANGES['low'])], step_minutes=30, min_pieces=3),
+    # Slow drifts around medium (15-minute pieces, AR(1) with phi 0.8)
+    'drifting': AR1Model(-0.3, 0.5, mean=0.05, phi=0.8, sigma=0.06, step_minutes=15),
+    # Unanchored wandering between high and low stress
+    'restless': RandomWalkModel(-0.3, 0.5, sigma=0.08, step_minutes=15),
+})
+
+def sentiment_model(stress: str, default: str) -> SentimentModel:
+    """Model for a stress level; unknown levels use the default profile"""
+    return SENTIMENT_PROFILES.get(stress) or SENTIMENT_PROFILES[default]
+
+# Typical weekday: stays with arrival times; travel between them is inserted by the compiler
+# (travel_* fields describe the trip *into* a stay)
+SCHEDULE_SPEC = {
+    'travel_minutes': {'walking': 20, 'driving': 5},
+    'stays': [
+        {'at': (0, 0), 'location': 'home', 'stress': 'low'},
+        {'at': (7, 30), 'location': 'home', 'stress': 'low_medium'},
+        {'at': (8, 50), 'location': 'gym', 'stress': 'high', 'travel_stress': 'medium'},
+        {'at': (9, 50), 'location': 'gym', 'stress': 'low'},
+        {'at': (10, 20), 'location': 'home', 'stress': 'low'},
+        {'at': (12, 20), 'location': 'cpa', 'stress': 'medium'},
+        {'at': (14, 20), 'location': 'home', 'stress': 'low', 'travel_stress': 'medium'},
+        {'at': (15, 5), 'location': 'ralphs', 'stress': 'low', 'travel_mode': 'driving'},
+        {'at': (15, 45), 'location': 'home', 'stress': 'medium', 'travel_mode': 'driving'},
+        {'at': (19, 20), 'location': 'doheny', 'stress': 'fluctuate_medium_high'},
+        {'at': (22, 20), 'location': 'home', 'stress': 'high_to_low', 'travel_stress': 'high'},
+    ],
+    'rules': [
+        # Weekends: no gym, shorter study, calmer travel
+        {'when': {'weekend': True}, 'changes': [
+            {'match': {'location': 'gym'}, 'set': {'location': 'home', 'stress': 'low'}},
+            {'match': {'location': 'doheny'}, 'set': {'until': (21, 0)}},
+            {'match': {'travel_stress': 'medium'}, 'set': {'travel_stress': 'low_medium'}},
+            {'match': {'travel_stress': 'high'}, 'set': {'travel_stress': 'medium'}},
+        ]},
+        # Tuesday: late gym, skip class
+        {'when': {'weekdays': [1]}, 'changes': [
+            {'match': {'location': 'gym', 'stress': 'high'}, 'set': {'at': (9, 0)}},
+            {'match': {'location': 'cpa'}, 'set': {'location': 'home', 'stress': 'low'}},
+        ]},
+        # Wednesday: early class, longer study
+        {'when': {'weekdays': [2]}, 'changes': [
+            {'match': {'location': 'cpa'}, 'set': {'at': (12, 0)}},
+            {'match': {'location': 'doheny'}, 'set': {'until': (22, 30)}},
+        ]},
+        # Thursday: no gym, longer class (groceries move later to fit)
+        {'when': {'weekdays': [3]}, 'changes': [
+            {'match': {'location': 'gym'}, 'set': {'location': 'home', 'stress': 'low'}},
+            {'match': {'location': 'cpa'}, 'set': {'until': (15, 0)}},
+            {'match': {'location': 'ralphs'}, 'set': {'at': (15, 45), 'until': (16, 20)}},
+        ]},
+        # Friday: early finish
+        {'when': {'weekdays': [4]}, 'changes': [
+            {'match': {'location': 'doheny'}, 'set': {'until': (20, 0)}},
+        ]},
+    ]
+}
+
+schedule_engine = ScheduleEngine(SCHEDULE_SPEC)
+
+def get_schedule_for_date(day: datetime) -> List[Dict]:
+    """Compiled timeline for a date (shared between days of the same type; do not modify)"""
+    return schedule_engine.for_date(day)
+
+def schedule_route_requests(base_date=None, num_days=None, loc_map=None):
     """
-    Generate intervals based on user schedule with actual route coordinates
-    Generates 7 days of data (one week)
+    Collect every (start_lat, start_lon, end_lat, end_lon, profile) route the schedules need
+    Used to fetch all routes up front (concurrently) instead of one at a time per segment
+
+    Every day in [base_date, base_date + num_days) is looked up, since calendar rules can
+    give any date its own timeline; each distinct timeline and route is listed once.
+    """
+    base_date = base_date or BASE_DATE
+    loc_map = loc_map or location_map
+    num_days = NUM_DAYS if num_days is None else num_days
+    route_requests = []
+    seen_schedules = set()
+    seen_requests = set()
+    for day_offset in range(num_days):
+        schedule = get_schedule_for_date(base_date + timedelta(days=day_offset))
+        # Days of the same type share one compiled timeline object
+        if id(schedule) in seen_schedules:
+            continue
+        seen_schedules.add(id(schedule))
+        for segment in schedule:
+            if 'from' not in segment or 'to' not in segment:
+                continue
+            from_loc = loc_map[segment['from']]
+            to_loc = loc_map[segment['to']]
+            profile = 'driving' if segment.get('mode', 'walking') == 'driving' else 'walking'
+            request = (from_loc['latitude'], from_loc['longitude'], to_loc['latitude'], to_loc['longitude'], profile)
+            if request not in seen_requests:
+                seen_requests.add(request)
+                route_requests.append(request)
+    return route_requests
+
+def generate_day_intervals(start_date: datetime, schedule: List[Dict],
+                           routes: Dict[str, Optional[List[List[float]]]],
+                           rng: Optional[np.random.Generator] = None,
+                           loc_map: Optional[Dict[str, Dict]] = None, verbose: bool = True) -> List[Dict]:
+    """
+    Generate one day's intervals from a day schedule
+
+    Args:
+        start_date: Midnight of the day to generate
+        schedule: Compiled day timeline from get_schedule_for_date (weekend and weekday
+                  variations are schedule rules, already applied)
+        routes: {route_key: [lon, lat] coordinates or None} from fetch_routes
+        rng: Sentiment random stream (defaults to stream_rng(0, 0, day ordinal), i.e. user 0
+             with seed 0)
+        loc_map: Location set from build_location_map (defaults to locations.json)
+        verbose: Print when falling back to linear interpolation
     """
+    loc_map = loc_map or location_map
+    if rng is None:
+        rng = stream_rng(0, 0, start_date.toordinal())
     intervals = []
-    base_date = datetime(2024, 11, 19, 0, 0)  # Start date (Tuesday) - skipping Monday Nov 18
-    
-    # Sentiment ranges
-    sentiment_ranges = {
-        'low': (0.2, 0.5),
-        'low_medium': (0.1, 0.3),
-        'medium': (-0.05, 0.15),
-        'high': (-0.3, -0.1),
-        'fluctuate_medium_high': None  # Will alternate
-    }
     
-    # Base schedule with travel mode (will be modified per day)
-    base_schedule = [
-        {'start': (0, 0), 'end': (7, 30), 'location': 'home', 'stress': 'low'},
-        {'start': (7, 30), 'end': (8, 30), 'location': 'home', 'stress': 'low_medium'},
-        {'start': (8, 30), 'end': (8, 50), 'from': 'home', 'to': 'gym', 'stress': 'medium', 'mode': 'walking'},
-        {'start': (8, 50), 'end': (9, 50), 'location': 'gym', 'stress': 'high'},
-        {'start': (9, 50), 'end': (10, 0), 'location': 'gym', 'stress': 'low'},
-        {'start': (10, 0), 'end': (10, 20), 'from': 'gym', 'to': 'home', 'stress': 'low', 'mode': 'walking'},
-        {'start': (10, 20), 'end': (12, 0), 'location': 'home', 'stress': 'low'},
-        {'start': (12, 0), 'end': (12, 20), 'from': 'home', 'to': 'cpa', 'stress': 'low', 'mode': 'walking'},
-        {'start': (12, 20), 'end': (14, 0), 'location': 'cpa', 'stress': 'medium'},
-        {'start': (14, 0), 'end': (14, 20), 'from': 'cpa', 'to': 'home', 'stress': 'medium', 'mode': 'walking'},
-        {'start': (14, 20), 'end': (15, 0), 'location': 'home', 'stress': 'low'},
-        {'start': (15, 0), 'end': (15, 5), 'from': 'home', 'to': 'ralphs', 'stress': 'low', 'mode': 'driving'},
-        {'start': (15, 5), 'end': (15, 40), 'location': 'ralphs', 'stress': 'low'},
-        {'start': (15, 40), 'end': (15, 45), 'from': 'ralphs', 'to': 'home', 'stress': 'low', 'mode': 'driving'},
-        {'start': (15, 45), 'end': (19, 0), 'location': 'home', 'stress': 'medium'},
-        {'start': (19, 0), 'end': (19, 20), 'from': 'home', 'to': 'doheny', 'stress': 'low', 'mode': 'walking'},
-        {'start': (19, 20), 'end': (22, 0), 'location': 'doheny', 'stress': 'fluctuate_medium_high'},
-        {'start': (22, 0), 'end': (22, 20), 'from': 'doheny', 'to': 'home', 'stress': 'high', 'mode': 'walking'},
-        {'start': (22, 20), 'end': (24, 0), 'location': 'home', 'stress': 'high_to_low'},
-    ]
-    
-    # Day-specific schedule variations
-    def get_schedule_for_day(day_offset, is_weekend):
-        """Get modified schedule based on day of week"""
-        import copy
-        schedule = [copy.deepcopy(seg) for seg in base_schedule]  # Deep copy
-        
-        day_of_week = (base_date + timedelta(days=day_offset)).weekday()  # 0=Monday, 6=Sunday
+    for segment in schedule:
+        start_hour, start_min = segment['start']
+        end_hour, end_min = segment['end']
         
-        if is_weekend:
-            # Weekends: no gym, shorter study time
-            for seg in schedule:
-                if seg.get('location') == 'gym':
-                    # Replace gym time with home time
-                    seg['location'] = 'home'
-                    seg['stress'] = 'low'
-                elif seg.get('location') == 'doheny':
-                    # Shorter study on weekends - end at 21:00 instead of 22:00
-                    if seg['end'] == (22, 0):
-                        seg['end'] = (21, 0)
-                        # Also adjust the travel home segment
-                        for seg2 in schedule:
-                            if seg2.get('from') == 'doheny' and seg2.get('to') == 'home':
-                                seg2['start'] = (21, 0)
+        segment_start = start_date.replace(hour=start_hour, minute=start_min)
+        if end_hour == 24:
+            segment_end = start_date.replace(hour=0, minute=end_min) + timedelta(days=1)
         else:
-            # Weekday variations
-            if day_of_week == 1:  # Tuesday - late gym, skip class
-                for seg in schedule:
-                    if seg.get('location') == 'gym':
-                        # Move gym later (9:00-10:00 instead of 8:50-10:00)
-                        seg['start'] = (9, 0)
-                        seg['end'] = (10, 0)
-                        # Adjust travel to gym
-                        for seg2 in schedule:
-                            if seg2.get('from') == 'home' and seg2.get('to') == 'gym':
-                                seg2['start'] = (8, 50)
-                                seg2['end'] = (9, 0)
-                    elif seg.get('location') == 'cpa':
-                        # Skip class on Tuesday - replace with home time
-                        seg['location'] = 'home'
-                        seg['stress'] = 'low'
-            elif day_of_week == 2:  # Wednesday - early class, longer study
-                for seg in schedule:
-                    if seg.get('from') == 'home' and seg.get('to') == 'cpa':
-                        seg['start'] = (11, 30)  # Earlier class start
-                        seg['end'] = (12, 0)  # Earlier arrival
-                    elif seg.get('location') == 'cpa':
-                        seg['start'] = (12, 0)  # Class starts earlier
-                    elif seg.get('location') == 'doheny':
-                        seg['end'] = (22, 30)  # Study longer
-                        # Adjust travel home
-                        for seg2 in schedule:
-                            if seg2.get('from') == 'doheny' and seg2.get('to') == 'home':
-                                seg2['start'] = (22, 30)
-            elif day_of_week == 3:  # Thursday - no gym, longer class
-                for seg in schedule:
-                    if seg.get('location') == 'gym':
-                        # Replace gym with home time
-                        seg['location'] = 'home'
-                        seg['stress'] = 'low'
-                    elif seg.get('location') == 'cpa':
-                        seg['end'] = (15, 0)  # Longer class (until 3pm)
-                        # Adjust travel home from class
-                        for seg2 in schedule:
-                            if seg2.get('from') == 'cpa' and seg2.get('to') == 'home':
-                                seg2['start'] = (15, 0)
-                                seg2['end'] = (15, 20)
-            elif day_of_week == 4:  # Friday - early finish, shorter evening study
-                for seg in schedule:
-                    if seg.get('location') == 'doheny':
-                        # End study early on Friday (8pm instead of 10pm)
-                        seg['end'] = (20, 0)
-                        # Adjust travel home
-                        for seg2 in schedule:
-                            if seg2.get('from') == 'doheny' and seg2.get('to') == 'home':
-                                seg2['start'] = (20, 0)
-                                seg2['end'] = (20, 20)
+            segment_end = start_date.replace(hour=end_hour, minute=end_min)
         
-        return schedule
-    
-    route_cache = {}
-    
-    # Generate data for 6 days (Tuesday through Sunday, skipping Monday)
-    for day_offset in range(6):
-        start_date = base_date + timedelta(days=day_offset)
-        day_name = start_date.strftime('%A')
-        print(f"\nGenerating data for {day_name}, {start_date.strftime('%Y-%m-%d')}...")
-        
-        # Add some variation to the schedule based on day of week
-        # Weekends might have different patterns
-        is_weekend = start_date.weekday() >= 5  # Saturday or Sunday
+        duration_minutes = (segment_end - segment_start).total_seconds() / 60
         
-        # Get day-specific schedule
-        schedule = get_schedule_for_day(day_offset, is_weekend)
-        
-        for segment in schedule:
-            start_hour, start_min = segment['start']
-            end_hour, end_min = segment['end']
+        if 'from' in segment and 'to' in segment:
+            # Travel segment
+            from_loc = loc_map[segment['from']]
+            to_loc = loc_map[segment['to']]
+            mode = segment.get('mode', 'walking')
+            profile = 'driving' if mode == 'driving' else 'walking'
             
-            segment_start = start_date.replace(hour=start_hour, minute=start_min)
-            if end_hour == 24:
-                segment_end = start_date.replace(hour=0, minute=end_min) + timedelta(days=1)
-            else:
-                segment_end = start_date.replace(hour=end_hour, minute=end_min)
+            # Get route
+            route = routes.get(route_key(from_loc['latitude'], from_loc['longitude'],
+                                         to_loc['latitude'], to_loc['longitude'], profile))
             
-            duration_minutes = (segment_end - segment_start).total_seconds() / 60
-            
-            if 'from' in segment and 'to' in segment:
-                # Travel segment
-                # Skip travel to/from gym on weekends
-                if is_weekend and (segment['from'] == 'gym' or segment['to'] == 'gym'):
-                    continue
-                
-                from_loc = location_map[segment['from']]
-                to_loc = location_map[segment['to']]
-                mode = segment.get('mode', 'walking')
-                profile = 'driving' if mode == 'driving' else 'walking'
-                
-                # Get route
-                cache_key = f"{from_loc['latitude']},{from_loc['longitude']}_{to_loc['latitude']},{to_loc['longitude']}_{profile}"
-                if cache_key not in route_cache:
-                    print(f"Getting {profile} route from {from_loc['name']} to {to_loc['name']}...")
-                    route = get_route(
-                        from_loc['latitude'], from_loc['longitude'],
-                        to_loc['latitude'], to_loc['longitude'],
-                        profile=profile
-                    )
-                    route_cache[cache_key] = route
-                else:
-                    route = route_cache[cache_key]
-                
-                # Generate route points
+            # Generate route points
+            with metrics.span('interpolation'):
                 if route and len(route) > 2:
                     # Use actual route coordinates
                     route_points = interpolate_route_points(route, max(3, int(duration_minutes / 2)))  # Points every ~2 minutes
                 else:
                     # Fallback: linear interpolation
-                    print(f"  No route found, using linear interpolation")
+                    if verbose:
+                        print(f"  No route found, using linear interpolation")
                     route_points = []
                     num_points = max(3, int(duration_minutes / 2))
                     for i in range(num_points):
@@ -288,161 +294,171 @@ def generate_intervals_with_routes():
                             'lat': from_loc['latitude'] + (to_loc['latitude'] - from_loc['latitude']) * progress,
                             'lon': from_loc['longitude'] + (to_loc['longitude'] - from_loc['longitude']) * progress
                         })
+            
+            sampling_start = time.perf_counter()
+            # Create intervals for each route point
+            time_per_point = duration_minutes / len(route_points) if route_points else duration_minutes
+            model = sentiment_model(segment['stress'], 'medium')
+            sentiments = np.round(model.sample(len(route_points), rng), 2).tolist()
+            
+            for i, point in enumerate(route_points):
+                point_start = segment_start + timedelta(minutes=i * time_per_point)
+                point_end = segment_start + timedelta(minutes=(i + 1) * time_per_point)
+                if i == len(route_points) - 1:
+                    point_end = segment_end
                 
-                # Create intervals for each route point
-                time_per_point = duration_minutes / len(route_points) if route_points else duration_minutes
-                stress_type = segment['stress']
-                
-                # Weekend variation: slightly lower stress on weekends
-                if is_weekend and stress_type in ['medium', 'high']:
-                    # Reduce stress slightly on weekends
-                    stress_type = 'low_medium' if stress_type == 'medium' else 'medium'
-                
-                for i, point in enumerate(route_points):
-                    point_start = segment_start + timedelta(minutes=i * time_per_point)
-                    point_end = segment_start + timedelta(minutes=(i + 1) * time_per_point)
-                    if i == len(route_points) - 1:
-                        point_end = segment_end
-                    
-                    if stress_type in sentiment_ranges and sentiment_ranges[stress_type]:
-                        sentiment = random.uniform(*sentiment_ranges[stress_type])
-                    else:
-                        sentiment = random.uniform(-0.05, 0.15)  # Default medium
-                    
-                    intervals.append({
-                        'start_time': point_start.isoformat(),
-                        'end_time': point_end.isoformat(),
-                        'duration_minutes': (point_end - point_start).total_seconds() / 60,
-                        'latitude': point['lat'],
-                        'longitude': point['lon'],
-                        'location_name': 'Traveling',
-                        'location_type': 'traveling',
-                        'sentiment_score': round(sentiment, 2),
-                        'activity': 'traveling',
-                        'travel_mode': mode
-                    })
-            else:
-                # Stay segment
-                loc = location_map[segment['location']]
-                stress_type = segment['stress']
-                
-                # Weekend variation: skip gym on weekends, adjust study time
-                if is_weekend:
-                    if segment.get('location') == 'gym':
-                        # Skip gym on weekends - replace with extra home time
-                        # Instead of going to gym, stay at home
-                        loc = location_map['home']
-                        stress_type = 'low'  # Relaxed at home
-                    elif segment.get('location') == 'doheny':
-                        # Shorter study time on weekends
-                        if duration_minutes > 120:
-                            duration_minutes = 90  # Reduce to 1.5 hours
-                            segment_end = segment_start + timedelta(minutes=duration_minutes)
-                
-                # For fluctuating stress, alternate
-                if stress_type == 'fluctuate_medium_high':
-                    # Alternate every 20 minutes
-                    num_cycles = int(duration_minutes / 20)
-                    for cycle in range(num_cycles):
-                        cycle_start = segment_start + timedelta(minutes=cycle * 20)
-                        cycle_end = min(segment_start + timedelta(minutes=(cycle + 1) * 20), segment_end)
-                        is_high = cycle % 2 == 1
-                        sentiment_range = (-0.3, -0.1) if is_high else (-0.05, 0.15)
-                        sentiment = random.uniform(*sentiment_range)
-                        
-                        intervals.append({
-                            'start_time': cycle_start.isoformat(),
-                            'end_time': cycle_end.isoformat(),
-                            'duration_minutes': (cycle_end - cycle_start).total_seconds() / 60,
-                            'latitude': loc['latitude'],
-                            'longitude': loc['longitude'],
-                            'location_name': loc['name'],
-                            'location_type': loc['type'],
-                            'sentiment_score': round(sentiment, 2),
-                            'activity': 'studying' if loc['type'] == 'library' else 'other'
-                        })
-                    
-                    # Handle remainder
-                    remainder_start = segment_start + timedelta(minutes=num_cycles * 20)
-                    if remainder_start < segment_end:
-                        is_high = num_cycles % 2 == 1
-                        sentiment_range = (-0.3, -0.1) if is_high else (-0.05, 0.15)
-                        sentiment = random.uniform(*sentiment_range)
-                        intervals.append({
-                            'start_time': remainder_start.isoformat(),
-                            'end_time': segment_end.isoformat(),
-                            'duration_minutes': (segment_end - remainder_start).total_seconds() / 60,
-                            'latitude': loc['latitude'],
-                            'longitude': loc['longitude'],
-                            'location_name': loc['name'],
-                            'location_type': loc['type'],
-                            'sentiment_score': round(sentiment, 2),
-                            'activity': 'studying' if loc['type'] == 'library' else 'other'
-                        })
-                elif stress_type == 'high_to_low':
-                    # Transition from high to low
-                    num_segments = max(3, int(duration_minutes / 30))
-                    for i in range(num_segments):
-                        seg_start = segment_start + timedelta(minutes=i * (duration_minutes / num_segments))
-                        seg_end = segment_start + timedelta(minutes=(i + 1) * (duration_minutes / num_segments))
-                        if i == num_segments - 1:
-                            seg_end = segment_end
-                        
-                        progress = i / (num_segments - 1) if num_segments > 1 else 0
-                        if progress < 0.3:
-                            sentiment = random.uniform(-0.3, -0.1)
-                        elif progress < 0.6:
-                            sentiment = random.uniform(-0.1, 0.1)
-                        else:
-                            sentiment = random.uniform(0.2, 0.5)
-                        
-                        intervals.append({
-                            'start_time': seg_start.isoformat(),
-                            'end_time': seg_end.isoformat(),
-                            'duration_minutes': (seg_end - seg_start).total_seconds() / 60,
-                            'latitude': loc['latitude'],
-                            'longitude': loc['longitude'],
-                            'location_name': loc['name'],
-                            'location_type': loc['type'],
-                            'sentiment_score': round(sentiment, 2),
-                            'activity': 'sleep' if loc['type'] == 'home' else 'other'
-                        })
+                intervals.append({
+                    'start_time': point_start.isoformat(),
+                    'end_time': point_end.isoformat(),
+                    'duration_minutes': (point_end - point_start).total_seconds() / 60,
+                    'latitude': point['lat'],
+                    'longitude': point['lon'],
+                    'location_name': 'Traveling',
+                    'location_type': 'traveling',
+                    'sentiment_score': sentiments[i],
+                    'activity': 'traveling',
+                    'travel_mode': mode
+                })
+        else:
+            # Stay segment, split into the pieces its sentiment model asks for
+            # (one interval, 20-minute alternations, a high-to-low transition, ...)
+            sampling_start = time.perf_counter()
+            loc = loc_map[segment['location']]
+            stress_type = segment['stress']
+            model = sentiment_model(stress_type, 'low')
+            offsets = model.pieces(duration_minutes)
+            sentiments = np.round(model.sample(len(offsets), rng), 2).tolist()
+            
+            for i, offset in enumerate(offsets):
+                piece_start = segment_start + timedelta(minutes=offset)
+                piece_end = segment_start + timedelta(minutes=offsets[i + 1]) if i + 1 < len(offsets) else segment_end
+                if loc['type'] == 'library':
+                    activity = 'studying'
+                elif loc['type'] == 'home' and (stress_type == 'high_to_low' or segment_start.hour < 7):
+                    activity = 'sleep'
                 else:
-                    # Simple stay
-                    if stress_type in sentiment_ranges and sentiment_ranges[stress_type]:
-                        sentiment = random.uniform(*sentiment_ranges[stress_type])
-                    else:
-                        sentiment = random.uniform(0.2, 0.5)  # Default low
-                    
-                    intervals.append({
-                        'start_time': segment_start.isoformat(),
-                        'end_time': segment_end.isoformat(),
-                        'duration_minutes': duration_minutes,
-                        'latitude': loc['latitude'],
-                        'longitude': loc['longitude'],
-                        'location_name': loc['name'],
-                        'location_type': loc['type'],
-                        'sentiment_score': round(sentiment, 2),
-                        'activity': 'sleep' if loc['type'] == 'home' and segment_start.hour < 7 else 'other'
-                    })
-    
-    # Sort by start time
-    intervals.sort(key=lambda x: x['start_time'])
+                    activity = 'other'
+                
+                intervals.append({
+                    'start_time': piece_start.isoformat(),
+                    'end_time': piece_end.isoformat(),
+                    'duration_minutes': (piece_end - piece_start).total_seconds() / 60,
+                    'latitude': loc['latitude'],
+                    'longitude': loc['longitude'],
+                    'location_name': loc['name'],
+                    'location_type': loc['type'],
+                    'sentiment_score': sentiments[i],
+                    'activity': activity
+                })
+        
+        # Sentiment sampling and interval records (everything after route interpolation)
+        metrics.add_time('sentiment_sampling', time.perf_counter() - sampling_start)
     
+    metrics.count('intervals_emitted', len(intervals))
     return intervals
 
-if __name__ == '__main__':
-    print("Generating intervals with actual Mapbox routes...")
-    print("This may take a minute to fetch routes from Mapbox API...")
+def generate_intervals_with_routes(route_cache: Optional[RouteCache] = None, offline: bool = False,
+                                   seed: int = 0, **fetch_options):
+    """
+    Generate intervals based on user schedule with actual route coordinates
+    Generates 7 days of data (one week)
+
+    Args:
+        route_cache: Persistent route cache; routes found there are not fetched again
+        offline: Never call the Directions API; uncached routes use linear interpolation
+        seed: Sentiment seed; each day draws from stream_rng(seed, 0, day ordinal), the same
+              stream as user 0 in generate_scaled_intervals.py
+        **fetch_options: Passed to route_fetcher.RouteFetcher (api_url, max_workers, rate_limit, ...)
+    """
+    intervals = []
+    base_date = BASE_DATE
     
-    intervals = generate_intervals_with_routes()
+    # Fetch every route the schedules need up front (cached or concurrently)
+    routes = fetch_routes(schedule_route_requests(base_date, NUM_DAYS), MAPBOX_TOKEN,
+                          route_cache=route_cache, offline=offline, **fetch_options)
     
-    output_file = os.path.join(script_dir, 'intervals.json')
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(intervals, f, indent=2)
+    # Generate data for 6 days (Tuesday through Sunday, skipping Monday)
+    for day_offset in range(NUM_DAYS):
+        start_date = base_date + timedelta(days=day_offset)
+        day_name = start_date.strftime('%A')
+        print(f"\nGenerating data for {day_name}, {start_date.strftime('%Y-%m-%d')}...")
+        
+        # Day-specific schedule (weekday/weekend rules applied)
+        schedule = get_schedule_for_date(start_date)
+        
+        rng = stream_rng(seed, 0, start_date.toordinal())
+        intervals.extend(generate_day_intervals(start_date, schedule, routes, rng=rng))
     
-    print(f"\nGenerated {len(intervals)} intervals")
-    print(f"Date range: {intervals[0]['start_time']} to {intervals[-1]['end_time']}")
-    print(f"\nSaved to: {output_file}")
-    print(f"\nNote: Copy to public/intervals.json for web app")
+    # Sort by start time
+    with metrics.span('sort'):
+        intervals.sort(key=lambda x: x['start_time'])
+    
+    return intervals
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate intervals with actual Mapbox routes')
+    parser.add_argument('--route-cache', default=DEFAULT_CACHE_PATH,
+                        help='SQLite route cache file (reused across runs)')
+    parser.add_argument('--no-route-cache', action='store_true', help='Disable the persistent route cache')
+    parser.add_argument('--offline', action='store_true',
+                        default=os.environ.get('ROUTE_CACHE_OFFLINE', '') not in ('', '0'),
+                        help='Only use cached routes, never call the API (also ROUTE_CACHE_OFFLINE=1)')
+    parser.add_argument('--cache-ttl-days', type=float, default=None,
+                        help='Treat cached routes older than this as missing')
+    parser.add_argument('--cache-max-entries', type=int, default=None,
+                        help='Evict least recently used routes beyond this many entries')
+    parser.add_argument('--directions-url', default=DEFAULT_API_URL,
+                        help='Directions API base URL (e.g. a local directions_stub_server.py)')
+    parser.add_argument('--route-workers', type=int, default=8, help='Concurrent route requests')
+    parser.add_argument('--route-rate', type=float, default=10.0, help='Maximum route requests per second')
+    parser.add_argument('--route-retries', type=int, default=3, help='Retries per route (exponential backoff)')
+    parser.add_argument('--seed', type=int, default=0, help='Sentiment seed (same seed, same intervals)')
+    parser.add_argument('--precision', type=int, default=6,
+                        help='Decimals kept for floats in intervals.json (coordinates, durations)')
+    parser.add_argument('--publish', nargs='?', const=os.path.join(os.path.dirname(script_dir), 'public'),
+                        metavar='PUBLIC_DIR',
+                        help='Also publish intervals.json and locations.json (with .gz/.br) to public/')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args):
+        route_cache = None
+        if not args.no_route_cache:
+            ttl = args.cache_ttl_days * 86400 if args.cache_ttl_days is not None else None
+            route_cache = RouteCache(args.route_cache, ttl_seconds=ttl, max_entries=args.cache_max_entries)
 
+        print("Generating intervals with actual Mapbox routes...")
+        if args.offline:
+            print("Offline mode: using cached routes only")
+        else:
+            print("This may take a minute to fetch routes from Mapbox API...")
+        
+        intervals = generate_intervals_with_routes(
+            route_cache=route_cache, offline=args.offline, seed=args.seed, api_url=args.directions_url,
+            max_workers=args.route_workers, rate_limit=args.route_rate, retries=args.route_retries
+        )
+        
+        output_file = os.path.join(script_dir, 'intervals.json')
+        binary_file = os.path.join(script_dir, 'intervals.bin')
+        with metrics.span('write'):
+            # Round once, so intervals.json and intervals.bin hold the same values
+            intervals = round_floats(intervals, args.precision)
+            write_json(output_file, intervals)
+            
+            # Columnar binary copy (typed arrays + dictionary-encoded categories)
+            write_interval_columns(intervals, binary_file)
+        
+        print(f"\nGenerated {len(intervals)} intervals")
+        print(f"Date range: {intervals[0]['start_time']} to {intervals[-1]['end_time']}")
+        if route_cache is not None:
+            stats = route_cache.stats()
+            print(f"Route cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+        print(f"\nSaved to: {output_file} ({os.path.getsize(output_file):,} bytes)")
+        print(f"Saved to: {binary_file} ({os.path.getsize(binary_file):,} bytes)")
+        if args.publish:
+            print()
+            publish_artifacts([(output_file, 'intervals.json'),
+                               (os.path.join(script_dir, 'locations.json'), 'locations.json')],
+                              args.publish, precision=args.precision)
+        else:
+            print(f"\nNote: run with --publish (or python artifacts.py) to update public/ for the web app")
@@ -0,0 +1,211 @@
+"""
+Generate large synthetic interval datasets (many users over long date ranges) for load testing
+(user, day) work units run on a process pool; each unit draws from its own random stream
+(sentiment_models.stream_rng(seed, user_id, day ordinal)), so output is identical for any
+worker count. Per-day results are merged and streamed to disk instead of sorting one giant list.
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import generate_intervals_with_routes as gen
+from json_stream import JsonArrayWriter
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+from route_cache import DEFAULT_CACHE_PATH, RouteCache
+from sentiment_models import stream_rng
+
+# Sort key for merged output: (start_time, user_id, position within the user's day)
+SortKey = Tuple[str, int, int]
+
+# Per-process state, set once by _init_worker so routes are not re-sent with every task
+_worker_state: Dict = {}
+
+def _init_worker(routes: Dict, loc_map: Dict, pool_worker: bool = False):
+    if pool_worker:
+        metrics.reset()  # Forked workers start with a copy of the parent's metrics
+    _worker_state['routes'] = routes
+    _worker_state['loc_map'] = loc_map
+
+def _generate_batch(day: str, user_ids: range, seed: int) -> List[Tuple[SortKey, str]]:
+    """
+    Generate one day for a batch of users
+    Returns (sort key, encoded JSON) pairs sorted by key; encoding happens in the worker
+    so the parent process only merges and writes
+    """
+    start_date = datetime.fromisoformat(day)
+    schedule = gen.get_schedule_for_date(start_date)
+
+    rows = []
+    for user_id in user_ids:
+        rng = stream_rng(seed, user_id, start_date.toordinal())
+        intervals = gen.generate_day_intervals(start_date, schedule, _worker_state['routes'],
+                                               rng=rng, loc_map=_worker_state['loc_map'], verbose=False)
+        for position, interval in enumerate(intervals):
+            interval['user_id'] = user_id
+            rows.append(((interval['start_time'], user_id, position), json.dumps(interval, indent=2)))
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+def _generate_batch_in_worker(day: str, user_ids: range, seed: int):
+    """Pool entry point: also hands back the worker's metrics for the parent to merge"""
+    rows = _generate_batch(day, user_ids, seed)
+    return rows, metrics.drain()
+
+def iter_generated_days(jobs: List[Tuple[str, range]], routes: Dict, loc_map: Dict,
+                        workers: Optional[int] = None, seed: int = 0,
+                        users_per_task: int = 50) -> Iterator[Tuple[str, Iterator[Tuple[SortKey, str]]]]:
+    """
+    Run (day, user_ids) jobs on a process pool and yield each day's rows merged in sort order
+
+    Days are yielded in job order. Only a small window of days is in flight at once, so
+    memory is bounded by a few days of output regardless of the date range.
+
+    Args:
+        jobs: (day as ISO midnight timestamp, user ids to generate) pairs
+        workers: Process count (default: all cores; 1 runs in-process)
+        seed: Base seed; each (user, day) unit derives its own stream from it
+        users_per_task: Users per submitted task (amortizes inter-process overhead)
+    """
+    workers = workers or os.cpu_count() or 1
+    if not jobs:
+        return
+
+    def batches(user_ids):
+        return [user_ids[u:u + users_per_task] for u in range(0, len(user_ids), users_per_task)]
+
+    # Keep enough days in flight to occupy every worker, but no more (bounds memory)
+    window = max(2, math.ceil(2 * workers / max(1, len(batches(jobs[0][1])))))
+
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(routes, loc_map, True))
+    else:
+        _init_worker(routes, loc_map)
+
+    def submit(job):
+        day, user_ids = job
+        if executor is None:
+            return day, [_generate_batch(day, batch, seed) for batch in batches(user_ids)]
+        return day, [executor.submit(_generate_batch_in_worker, day, batch, seed) for batch in batches(user_ids)]
+
+    try:
+        remaining = iter(jobs)
+        pending = deque(submit(job) for job in islice(remaining, window))
+        while pending:
+            day, parts = pending.popleft()
+            if executor is None:
+                results = parts
+            else:
+                results = []
+                for part in parts:
+                    rows, worker_metrics = part.result()
+                    metrics.merge(worker_metrics)
+                    results.append(rows)
+            next_job = next(remaining, None)
+            if next_job is not None:
+                pending.append(submit(next_job))
+            yield day, heapq.merge(*results, key=lambda row: row[0])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+def generate_scaled_intervals(output_file: str, num_users: int, start_date: datetime, num_days: int,
+                              routes: Dict, loc_map: Dict, workers: Optional[int] = None, seed: int = 0,
+                              users_per_task: int = 50) -> Dict:
+    """
+    Generate intervals for num_users users over num_days days and stream them to output_file
+
+    Args:
+        output_file: JSON array output (same schema as intervals.json plus 'user_id')
+        num_users: Number of synthetic users
+        start_date: First day (midnight)
+        num_days: Number of consecutive days
+        routes: {route_key: coordinates or None} from fetch_routes
+        loc_map: Location set from build_location_map
+        workers: Process count (default: all cores; 1 runs in-process)
+        seed: Base seed; each (user, day) unit derives its own stream from it
+        users_per_task: Users per submitted task (amortizes inter-process overhead)
+
+    Returns:
+        Dict with interval count, elapsed seconds and intervals per second
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = [((start_date + timedelta(days=d)).isoformat(), range(num_users)) for d in range(num_days)]
+
+    start = time.perf_counter()
+    with open(output_file, 'w', encoding='utf-8') as f:
+        writer = JsonArrayWriter(f)
+        for day, rows in iter_generated_days(jobs, routes, loc_map, workers, seed, users_per_task):
+            # Days never overlap in start time, so writing day by day keeps the whole file sorted
+            with metrics.span('write'):
+                for _, text in rows:
+                    writer.write_json(text)
+            print(f"  {day[:10]}: {writer.count} intervals written")
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    rate = writer.count / elapsed if elapsed > 0 else float('inf')
+    print(f"Generated {writer.count} intervals for {num_users} users x {num_days} days "
+          f"in {elapsed:.2f}s ({rate:,.0f} intervals/s, {workers} workers)")
+    return {'intervals': writer.count, 'seconds': elapsed, 'intervals_per_second': rate}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a multi-user, multi-week synthetic interval dataset')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--start', default=gen.BASE_DATE.strftime('%Y-%m-%d'), help='First day (YYYY-MM-DD)')
+    date_range = parser.add_mutually_exclusive_group()
+    date_range.add_argument('--days', type=int, default=28)
+    date_range.add_argument('--end', help='Last day, inclusive (YYYY-MM-DD)')
+    parser.add_argument('--locations', default=os.path.join(gen.script_dir, 'locations.json'),
+                        help='Location set (same format as locations.json)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--users-per-task', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join(gen.script_dir, 'intervals_scaled.json'))
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only regenerate days whose inputs changed since the last run (see --manifest)')
+    parser.add_argument('--manifest', default=None,
+                        help='Per-day hash manifest for --incremental (default: OUTPUT.manifest.json)')
+    parser.add_argument('--route-cache', default=DEFAULT_CACHE_PATH)
+    parser.add_argument('--offline', action='store_true',
+                        default=os.environ.get('ROUTE_CACHE_OFFLINE', '') not in ('', '0'),
+                        help='Only use cached routes (uncached travel uses linear interpolation)')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    start_date = datetime.strptime(args.start, '%Y-%m-%d')
+    num_days = args.days
+    if args.end:
+        num_days = (datetime.strptime(args.end, '%Y-%m-%d') - start_date).days + 1
+    if num_days < 1 or args.users < 1:
+        parser.error('need at least one user and one day')
+
+    with instrumented(args):
+        with metrics.span('load'), open(args.locations, 'r', encoding='utf-8') as f:
+            try:
+                loc_map = gen.build_location_map(json.load(f))
+            except ValueError as e:
+                parser.error(f"{args.locations}: {e}")
+
+        route_requests = gen.schedule_route_requests(start_date, num_days, loc_map)
+        routes = gen.fetch_routes(route_requests, gen.MAPBOX_TOKEN, route_cache=RouteCache(args.route_cache),
+                                  offline=args.offline)
+
+        print(f"Generating {args.users} users x {num_days} days from {args.start}...")
+        if args.incremental:
+            from incremental_intervals import update_scaled_intervals
+            update_scaled_intervals(args.output, args.manifest or args.output + '.manifest.json', args.users,
+                                    start_date, num_days, routes, loc_map, workers=args.workers,
+                                    seed=args.seed, users_per_task=args.users_per_task)
+        else:
+            generate_scaled_intervals(args.output, args.users, start_date, num_days, routes, loc_map,
+                                      workers=args.workers, seed=args.seed, users_per_task=args.users_per_task)
+        print(f"\nSaved to: {args.output}")
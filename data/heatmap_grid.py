@@ -0,0 +1,274 @@
+"""
+Aggregate intervals into a multi-resolution sentiment heatmap for zoomed-out map views
+
+Intervals are binned by position into square or hexagonal cells at several levels.
+Sentiment is duration-weighted, like the bucket tooltips in getBuildingSentiment:
+sum(sentiment * duration) / sum(duration). The result is one small file per level.
+
+Cells live in web mercator space at the level's zoom (a level-L cell is about the size
+of a zoom-L map tile, 256 px):
+  - square: cell (x, y) is the zoom-L tile. The levels form a quadtree, and the parent of
+    (L, x, y) is (L - 1, x >> 1, y >> 1). Only the finest level is binned from the
+    intervals; coarser levels are summed from its cells.
+  - hex: pointy-top axial (q, r) hexagons with the same area as a level-L square. Hexes
+    do not nest, so each level is binned from the intervals.
+The work is one vectorized NumPy pass per chunk of rows over the latitude, longitude,
+sentiment and duration columns (intervals.bin is memory-mapped). Cells are counted with
+np.bincount, so memory depends on the chunk size and the number of occupied cells.
+"""
+import argparse
+import math
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from artifacts import directory_files, publish_artifacts, write_json
+from interval_columns import open_intervals
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+
+DEFAULT_LEVELS = (13, 14, 15, 16, 17, 18)
+CHUNK_ROWS = 1 << 22
+TILE_SIZE_PX = 256
+# Circumradius (px) of a hexagon with the area of a 256 px square
+HEX_SIZE_PX = TILE_SIZE_PX * math.sqrt(2 / (3 * math.sqrt(3)))
+SQRT3 = math.sqrt(3)
+# Above this many cells in the bounding box of a chunk, bin with np.unique instead of dense bincount
+DENSE_CELL_LIMIT = 1 << 24
+
+# (x or q, y or r, weighted sentiment sum, total duration, count) per occupied cell
+CellTable = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+def mercator(lon: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Normalized web mercator coordinates in [0, 1) (y grows southwards, like tile rows)"""
+    lat = np.clip(lat, -85.05112878, 85.05112878)
+    mx = (lon + 180.0) / 360.0
+    my = (1.0 - np.log(np.tan(np.radians(lat)) + 1.0 / np.cos(np.radians(lat))) / math.pi) / 2.0
+    return mx, my
+
+def inverse_mercator(mx: np.ndarray, my: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    lon = mx * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1.0 - 2.0 * my))))
+    return lon, lat
+
+def hex_cells(mx: np.ndarray, my: np.ndarray, level: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Axial (q, r) of the pointy-top hexagon containing each point
+
+    Uses Charles Chambers' floor formulation, which gives the same cells as cube-coordinate
+    rounding with about half the array passes
+    """
+    scale = TILE_SIZE_PX * 2.0 ** level / HEX_SIZE_PX
+    y = my * scale
+    x = mx * (scale / SQRT3)
+    t = np.floor(x + y + 1)
+    r = np.floor((t + np.floor(y - x + 1)) / 3)
+    col = np.floor((np.floor(2 * x + 1) + t) / 3)
+    return (col - r).astype(np.int64), r.astype(np.int64)
+
+def hex_centers(q: np.ndarray, r: np.ndarray, level: int) -> Tuple[np.ndarray, np.ndarray]:
+    world = TILE_SIZE_PX * 2.0 ** level
+    px = HEX_SIZE_PX * (SQRT3 * q + SQRT3 / 2 * r)
+    py = HEX_SIZE_PX * 1.5 * r
+    return inverse_mercator(px / world, py / world)
+
+def square_centers(x: np.ndarray, y: np.ndarray, level: int) -> Tuple[np.ndarray, np.ndarray]:
+    n = 2.0 ** level
+    return inverse_mercator((x + 0.5) / n, (y + 0.5) / n)
+
+def bin_cells(x: np.ndarray, y: np.ndarray, weighted: np.ndarray, duration: np.ndarray,
+              count: Optional[np.ndarray] = None) -> CellTable:
+    """
+    Sum weighted sentiment, duration and count per (x, y) cell
+
+    Dense np.bincount over the occupied bounding box when it is small enough, otherwise
+    np.unique to number the cells first. count=None counts each row once.
+    """
+    if len(x) == 0:
+        empty = np.empty(0)
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), empty, empty, empty
+    x0, y0 = int(x.min()), int(y.min())
+    width, height = int(x.max()) - x0 + 1, int(y.max()) - y0 + 1
+    keys = (x - x0) * height + (y - y0)
+    if width * height <= max(DENSE_CELL_LIMIT, 2 * len(x)):
+        size = width * height
+        cells = np.bincount(keys, weights=count, minlength=size) if count is not None \
+            else np.bincount(keys, minlength=size)
+        occupied = np.flatnonzero(cells)
+        sums = np.bincount(keys, weights=weighted, minlength=size)[occupied]
+        durations = np.bincount(keys, weights=duration, minlength=size)[occupied]
+        counts = cells[occupied]
+        unique = occupied
+    else:
+        unique, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=weighted)
+        durations = np.bincount(inverse, weights=duration)
+        counts = np.bincount(inverse, weights=count) if count is not None else np.bincount(inverse)
+    return unique // height + x0, unique % height + y0, sums, durations, counts.astype(np.float64)
+
+def _merge_tables(tables: List[CellTable]) -> CellTable:
+    if len(tables) == 1:
+        return tables[0]
+    x, y, sums, durations, counts = (np.concatenate(parts) for parts in zip(*tables))
+    return bin_cells(x, y, sums, durations, counts)
+
+def aggregate_arrays(lon: np.ndarray, lat: np.ndarray, sentiment: np.ndarray, duration: np.ndarray,
+                     levels: Sequence[int] = DEFAULT_LEVELS, grid: str = 'square',
+                     chunk_rows: int = CHUNK_ROWS, mask: Optional[np.ndarray] = None) -> Dict[int, CellTable]:
+    """
+    Cell tables per level from interval columns
+
+    Args:
+        lon, lat, sentiment, duration: Column arrays (NumPy views, e.g. from IntervalColumns)
+        levels: Zoom levels to produce
+        grid: 'square' (quadtree) or 'hex'
+        chunk_rows: Rows converted per vectorized step; bounds temporary memory
+        mask: Optional boolean array of rows to include
+    """
+    if grid not in ('square', 'hex'):
+        raise ValueError(f"Unknown grid '{grid}' (expected square or hex)")
+    levels = sorted(set(levels))
+    finest = levels[-1]
+    partial: Dict[int, List[CellTable]] = {level: [] for level in levels}
+
+    for start in range(0, len(lon), chunk_rows):
+        end = start + chunk_rows
+        c_lon = np.asarray(lon[start:end], dtype=np.float64)
+        c_lat = np.asarray(lat[start:end], dtype=np.float64)
+        c_dur = np.asarray(duration[start:end], dtype=np.float64)
+        c_sent = np.asarray(sentiment[start:end], dtype=np.float64)
+        keep = np.isfinite(c_lon) & np.isfinite(c_lat)
+        if mask is not None:
+            keep &= mask[start:end]
+        if not keep.all():
+            c_lon, c_lat, c_dur, c_sent = c_lon[keep], c_lat[keep], c_dur[keep], c_sent[keep]
+        c_dur = np.nan_to_num(c_dur)
+        weighted = c_sent * c_dur
+        mx, my = mercator(c_lon, c_lat)
+        if grid == 'square':
+            n = 2.0 ** finest
+            x = np.minimum((mx * n).astype(np.int64), int(n) - 1)
+            y = np.minimum((my * n).astype(np.int64), int(n) - 1)
+            partial[finest].append(bin_cells(x, y, weighted, c_dur))
+        else:
+            for level in levels:
+                q, r = hex_cells(mx, my, level)
+                partial[level].append(bin_cells(q, r, weighted, c_dur))
+
+    tables: Dict[int, CellTable] = {}
+    if grid == 'square':
+        base = _merge_tables(partial[finest]) if partial[finest] else bin_cells(*(np.empty(0),) * 4)
+        for level in levels:
+            shift = finest - level
+            x, y, sums, durations, counts = base
+            tables[level] = bin_cells(x >> shift, y >> shift, sums, durations, counts) if shift else base
+    else:
+        for level in levels:
+            tables[level] = _merge_tables(partial[level]) if partial[level] else bin_cells(*(np.empty(0),) * 4)
+    return tables
+
+def cell_rows(table: CellTable, level: int, grid: str) -> Dict:
+    """JSON-ready columnar cell list for one level"""
+    x, y, sums, durations, counts = table
+    # Same fallback as the tooltips: no duration means sentiment 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sentiment = np.where(durations > 0, sums / durations, 0.0)
+    lon, lat = square_centers(x, y, level) if grid == 'square' else hex_centers(x, y, level)
+    names = ('x', 'y') if grid == 'square' else ('q', 'r')
+    return {
+        'grid': grid,
+        'level': level,
+        'columns': [names[0], names[1], 'lon', 'lat', 'sentiment', 'duration_minutes', 'count'],
+        'cells': [list(row) for row in zip(x.tolist(), y.tolist(), np.round(lon, 6).tolist(),
+                                           np.round(lat, 6).tolist(), np.round(sentiment, 4).tolist(),
+                                           np.round(durations, 2).tolist(), counts.astype(np.int64).tolist())]
+    }
+
+def build_heatmap(intervals_file: str, output_dir: str, levels: Sequence[int] = DEFAULT_LEVELS,
+                  grid: str = 'square', stays_only: bool = False) -> Dict:
+    """
+    Write {grid}_{level}.json per level plus manifest.json into output_dir
+
+    Returns:
+        The manifest dict
+    """
+    with metrics.span('load'):
+        cols = open_intervals(intervals_file)
+    try:
+        mask = None
+        if stays_only:
+            codes, dictionary = cols.categorical('location_type')
+            travel = [i for i, value in enumerate(dictionary) if value == 'traveling']
+            mask = ~np.isin(codes, travel)
+        start = time.perf_counter()
+        with metrics.span('aggregate'):
+            tables = aggregate_arrays(cols['longitude'], cols['latitude'], cols['sentiment_score'],
+                                      cols['duration_minutes'], levels, grid, mask=mask)
+        elapsed = time.perf_counter() - start
+        count = len(cols)
+    finally:
+        cols.close()
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {'grid': grid, 'intervals': count, 'stays_only': stays_only,
+                'tile_size_px': TILE_SIZE_PX, 'levels': []}
+    if grid == 'hex':
+        manifest['hex_size_px'] = HEX_SIZE_PX
+    with metrics.span('write'):
+        for level in sorted(tables):
+            name = f"{grid}_{level}.json"
+            path = os.path.join(output_dir, name)
+            info = write_json(path, cell_rows(tables[level], level, grid))
+            cells = len(tables[level][0])
+            manifest['levels'].append({'level': level, 'file': name, 'cells': cells,
+                                       'bytes': info['bytes'], 'sha256': info['sha256']})
+            print(f"  level {level}: {cells:,} cells ({info['bytes']:,} bytes)")
+    write_json(os.path.join(output_dir, 'manifest.json'), manifest)
+
+    metrics.count('intervals_read', count)
+    metrics.count('cells_written', sum(level['cells'] for level in manifest['levels']))
+    print(f"Aggregated {count:,} intervals into {len(tables)} {grid} levels in {elapsed:.2f}s")
+    return manifest
+
+def _benchmark(rows: int, levels: Sequence[int], grid: str, seed: int = 0):
+    """Time aggregate_arrays on random intervals spread over the USC area"""
+    rng = np.random.default_rng(seed)
+    lon = rng.uniform(-118.31, -118.27, rows)
+    lat = rng.uniform(34.01, 34.035, rows)
+    sentiment = rng.uniform(-1, 1, rows).astype(np.float32)
+    duration = rng.uniform(1, 60, rows)
+    start = time.perf_counter()
+    tables = aggregate_arrays(lon, lat, sentiment, duration, levels, grid)
+    elapsed = time.perf_counter() - start
+    cells = sum(len(table[0]) for table in tables.values())
+    print(f"{rows:,} intervals -> {cells:,} {grid} cells over {len(tables)} levels in {elapsed:.2f}s "
+          f"({rows / elapsed:,.0f} intervals/s)")
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Bin intervals into a multi-resolution sentiment heatmap')
+    parser.add_argument('--intervals', default=os.path.join(script_dir, 'intervals.json'),
+                        help='intervals.json-style file or intervals.bin')
+    parser.add_argument('--output-dir', default=os.path.join(script_dir, 'heatmap'))
+    parser.add_argument('--grid', choices=['square', 'hex'], default='square')
+    parser.add_argument('--levels', default=','.join(str(level) for level in DEFAULT_LEVELS),
+                        help='Comma-separated zoom levels (default 13-18)')
+    parser.add_argument('--stays-only', action='store_true', help='Leave travel points out')
+    parser.add_argument('--benchmark', type=int, metavar='ROWS',
+                        help='Time the aggregation on ROWS random intervals instead of reading a file')
+    parser.add_argument('--publish', nargs='?', const=os.path.join(os.path.dirname(script_dir), 'public'),
+                        metavar='PUBLIC_DIR', help='Also publish the level files to public/heatmap/ (with .gz/.br variants)')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args):
+        levels = [int(level) for level in args.levels.split(',')]
+        if args.benchmark:
+            _benchmark(args.benchmark, levels, args.grid)
+        else:
+            build_heatmap(args.intervals, args.output_dir, levels, args.grid, args.stays_only)
+            print(f"\nSaved to: {args.output_dir}")
+            if args.publish:
+                publish_artifacts(directory_files(args.output_dir, 'heatmap'), args.publish)
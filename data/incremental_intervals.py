@@ -0,0 +1,250 @@
+"""
+Incremental regeneration of scaled interval datasets (generate_scaled_intervals.py output)
+
+A manifest next to the output records, for every day, a hash of everything that day's
+intervals depend on: the compiled schedule, the locations and route geometries it uses,
+the sentiment models, the base seed and a generator version. It also records the byte
+offset and length of the day's block in the output file. On the next run only days whose
+hash changed are regenerated. When just the user count changed, only the added users are
+generated and merged into the existing block. Unchanged days are copied as raw byte ranges
+and never parsed, and a date range that only grew is appended in place.
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import generate_intervals_with_routes as gen
+from generate_scaled_intervals import SortKey, iter_generated_days
+from pipeline_metrics import metrics
+from route_cache import route_key
+from sentiment_models import profile_configs
+
+MANIFEST_VERSION = 1
+# Bump when generate_day_intervals changes output for the same inputs
+GENERATOR_VERSION = 2
+
+# Layout written by JsonArrayWriter (indent=2): '[\n' block ',\n' block ... '\n]'
+SEPARATOR = b',\n'
+ARRAY_CLOSE = b'\n]'
+PAD = '  '
+COPY_CHUNK = 1 << 20
+
+def day_inputs(day: datetime, routes: Dict, loc_map: Dict) -> Dict:
+    """Everything one day's intervals depend on, apart from the seed and user ids"""
+    schedule = gen.get_schedule_for_date(day)
+    used = set()
+    for segment in schedule:
+        if 'location' in segment:
+            used.add(segment['location'])
+        else:
+            used.update((segment['from'], segment['to']))
+    route_keys = sorted({route_key(*req) for req in gen.schedule_route_requests(day, 1, loc_map)})
+    return {
+        'generator_version': GENERATOR_VERSION,
+        'day': day.isoformat(),
+        'schedule': schedule,
+        'locations': {key: loc_map[key] for key in sorted(used)},
+        'routes': {key: routes.get(key) for key in route_keys},
+        'sentiment_profiles': profile_configs(gen.SENTIMENT_PROFILES)
+    }
+
+def day_hash(day: datetime, routes: Dict, loc_map: Dict, seed: int) -> str:
+    inputs = day_inputs(day, routes, loc_map)
+    inputs['seed'] = seed
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+def encode_block(rows: Iterator[Tuple[SortKey, str]]) -> Tuple[bytes, int]:
+    """Join one day's encoded intervals the way JsonArrayWriter lays them out"""
+    texts = [PAD + text.replace('\n', '\n' + PAD) for _, text in rows]
+    return ',\n'.join(texts).encode('utf-8'), len(texts)
+
+def decode_block(block: bytes) -> Iterator[Tuple[SortKey, str]]:
+    """Inverse of encode_block: yields (sort key, unindented JSON text) for each interval"""
+    text = block.decode('utf-8')
+    decoder = json.JSONDecoder()
+    positions: Dict[int, int] = {}
+    pos = 0
+    while pos < len(text):
+        while text[pos] in ' ,\n':
+            pos += 1
+        interval, end = decoder.raw_decode(text, pos)
+        user_id = interval['user_id']
+        # A user's intervals appear in generation order within the day
+        position = positions.get(user_id, 0)
+        positions[user_id] = position + 1
+        yield (interval['start_time'], user_id, position), text[pos:end].replace('\n' + PAD, '\n')
+        pos = end
+        while pos < len(text) and text[pos] in ' ,\n':
+            pos += 1
+
+def _read_range(f, offset: int, length: int) -> bytes:
+    f.seek(offset)
+    return f.read(length)
+
+def _copy_range(src, dst, offset: int, length: int):
+    src.seek(offset)
+    while length > 0:
+        chunk = src.read(min(COPY_CHUNK, length))
+        if not chunk:
+            raise ValueError("Output file is shorter than its manifest says")
+        dst.write(chunk)
+        length -= len(chunk)
+
+def load_manifest(manifest_file: str, output_file: str) -> Optional[Dict]:
+    """Previous manifest, or None when it is missing or does not describe the output file"""
+    if not (os.path.exists(manifest_file) and os.path.exists(output_file)):
+        return None
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('size') != os.path.getsize(output_file):
+        print("Manifest does not match the output file, regenerating everything")
+        return None
+    return manifest
+
+def update_scaled_intervals(output_file: str, manifest_file: str, num_users: int, start_date: datetime,
+                            num_days: int, routes: Dict, loc_map: Dict, workers: Optional[int] = None,
+                            seed: int = 0, users_per_task: int = 50) -> Dict:
+    """
+    Bring output_file up to date with generate_scaled_intervals(...) for these arguments
+
+    The result is byte-identical to a full regeneration. Days are classified as:
+        reused       hash and user count unchanged; bytes copied (or left in place)
+        patched      hash unchanged, user count changed; users added/removed in the block
+        regenerated  new day or hash changed
+    If every existing day is reused and new days only follow them, the new days are
+    appended in place; otherwise the file is rebuilt into a temp file and swapped in.
+
+    Returns:
+        Dict with per-category day counts, the update mode, interval count and elapsed seconds
+    """
+    start = time.perf_counter()
+    previous = load_manifest(manifest_file, output_file)
+    old_days = {entry['day']: entry for entry in previous['days']} if previous else {}
+
+    plan = []  # (day, hash, action, old manifest entry)
+    jobs: List[Tuple[str, range]] = []
+    for d in range(num_days):
+        day = start_date + timedelta(days=d)
+        digest = day_hash(day, routes, loc_map, seed)
+        old = old_days.get(day.date().isoformat())
+        if old is not None and old['hash'] == digest and old['users'] == num_users:
+            action = 'reused'
+        elif old is not None and old['hash'] == digest:
+            action = 'patched'
+            if num_users > old['users']:
+                jobs.append((day.isoformat(), range(old['users'], num_users)))
+        else:
+            action = 'regenerated'
+            jobs.append((day.isoformat(), range(num_users)))
+        plan.append((day, digest, action, old))
+
+    counts = {'reused': 0, 'patched': 0, 'regenerated': 0}
+    for _, _, action, _ in plan:
+        counts[action] += 1
+    counts['dropped'] = len(set(old_days) - {day.date().isoformat() for day, _, _, _ in plan})
+
+    old_order = [entry['day'] for entry in previous['days']] if previous else []
+    new_order = [day.date().isoformat() for day, _, _, _ in plan]
+    appending = (bool(old_order) and previous['intervals'] > 0 and new_order[:len(old_order)] == old_order
+                 and all(action == 'reused' for _, _, action, _ in plan[:len(old_order)]))
+    if appending and len(new_order) == len(old_order):
+        mode = 'unchanged'
+    elif appending:
+        mode = 'append'
+    else:
+        mode = 'rewrite'
+
+    generated = iter_generated_days(jobs, routes, loc_map, workers, seed, users_per_task)
+
+    def next_generated(day: datetime):
+        generated_day, rows = next(generated)
+        assert generated_day == day.isoformat()
+        return rows
+
+    def build_block(day: datetime, action: str, old: Optional[Dict], src) -> Tuple[bytes, int]:
+        if action == 'regenerated':
+            return encode_block(next_generated(day))
+        # Patched: keep surviving users from the old block and merge in the added ones
+        kept = [row for row in decode_block(_read_range(src, old['offset'], old['length']))
+                if row[0][1] < num_users]
+        if num_users > old['users']:
+            added = list(next_generated(day))
+            kept = sorted(kept + added, key=lambda row: row[0])
+        return encode_block(iter(kept))
+
+    try:
+        entries = []
+        if mode in ('unchanged', 'append'):
+            entries = [dict(old) for _, _, _, old in plan[:len(old_order)]]
+            if mode == 'append':
+                with open(output_file, 'r+b') as f:
+                    # Drop the closing bracket and continue the array
+                    f.seek(previous['size'] - len(ARRAY_CLOSE))
+                    f.truncate()
+                    position = f.tell()
+                    for day, digest, action, old in plan[len(old_order):]:
+                        with metrics.span('write'):
+                            block, count = build_block(day, action, old, f)
+                        if count:
+                            f.write(SEPARATOR)
+                            position += len(SEPARATOR)
+                        f.write(block)
+                        entries.append({'day': day.date().isoformat(), 'hash': digest, 'users': num_users,
+                                        'offset': position, 'length': len(block), 'count': count})
+                        position += len(block)
+                    f.write(ARRAY_CLOSE)
+        else:
+            temp_file = output_file + '.tmp'
+            src = open(output_file, 'rb') if previous else None
+            try:
+                with open(temp_file, 'wb') as out:
+                    out.write(b'[')
+                    wrote_any = False
+                    for day, digest, action, old in plan:
+                        with metrics.span('write'):
+                            if action == 'reused':
+                                length, count = old['length'], old['count']
+                                block = None
+                            else:
+                                block, count = build_block(day, action, old, src)
+                                length = len(block)
+                            if count:
+                                out.write(SEPARATOR if wrote_any else b'\n')
+                                wrote_any = True
+                            offset = out.tell()
+                            if block is None:
+                                _copy_range(src, out, old['offset'], length)
+                            else:
+                                out.write(block)
+                        entries.append({'day': day.date().isoformat(), 'hash': digest, 'users': num_users,
+                                        'offset': offset, 'length': length, 'count': count})
+                    out.write(b'\n]' if wrote_any else b']')
+            finally:
+                if src is not None:
+                    src.close()
+            os.replace(temp_file, output_file)
+    finally:
+        generated.close()  # Shuts the worker pool down if generation stopped early
+
+    total = sum(entry['count'] for entry in entries)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'seed': seed,
+        'users': num_users,
+        'size': os.path.getsize(output_file),
+        'intervals': total,
+        'days': entries
+    }
+    with open(manifest_file + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+    elapsed = time.perf_counter() - start
+    metrics.count('days_reused', counts['reused'])
+    metrics.count('days_regenerated', counts['regenerated'] + counts['patched'])
+    print(f"Incremental update ({mode}): {counts['regenerated']} days regenerated, {counts['patched']} patched, "
+          f"{counts['reused']} reused, {counts['dropped']} dropped; {total} intervals in {elapsed:.2f}s")
+    return dict(counts, mode=mode, intervals=total, seconds=elapsed)
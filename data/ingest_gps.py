@@ -0,0 +1,455 @@
+"""
+Ingest raw GPS traces (CSV or GPX) into the interval schema used by intervals.json
+
+Points are read one at a time and segmented in a single pass. A stay is a run of points
+that remain within --stay-radius meters of their running centroid for at least
+--min-stay minutes. Points that never become part of a stay are grouped into travel
+intervals of about --travel-seconds each. Stays are snapped to the nearest entry in
+locations.json through a grid index. Memory is bounded: a confirmed stay keeps only
+running sums, and the only points buffered are those of a stay candidate that has not
+yet reached the minimum duration.
+
+CSV input needs a timestamp column and latitude/longitude columns. Common names (time,
+lat, lon, lng, ...) are recognised. An optional sentiment column fills sentiment_score,
+which defaults to 0.0. Timestamps may be ISO 8601 or Unix epoch seconds. Input must be
+in time order.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from json_stream import JsonArrayWriter
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+from spatial_index import GridIndex
+
+DEFAULT_STAY_RADIUS = 50.0      # meters
+DEFAULT_MIN_STAY = 5.0          # minutes
+DEFAULT_SNAP_RADIUS = 150.0     # meters
+DEFAULT_MAX_GAP = 30.0          # minutes without a fix before a stay or travel run is cut
+DEFAULT_TRAVEL_SECONDS = 120.0  # Same spacing as the generator's route points (~2 minutes)
+DEFAULT_DRIVING_SPEED = 3.0     # m/s (~11 km/h); slower travel counts as walking
+
+METERS_PER_DEGREE = 111_320.0
+EPOCH = datetime(1970, 1, 1)
+UTC_EPOCH = EPOCH.replace(tzinfo=timezone.utc)
+
+TIME_COLUMNS = ('timestamp', 'time', 'datetime', 'date_time', 'recorded_at')
+LAT_COLUMNS = ('latitude', 'lat')
+LON_COLUMNS = ('longitude', 'lon', 'lng', 'long')
+SENTIMENT_COLUMNS = ('sentiment_score', 'sentiment')
+
+# (seconds, latitude, longitude, sentiment or None); seconds count from EPOCH in local time
+Point = Tuple[float, float, float, Optional[float]]
+
+def parse_timestamp(value: str, utc_offset: float = 0.0) -> float:
+    """
+    ISO 8601 or epoch seconds -> seconds since EPOCH in output (wall clock) time
+
+    Naive ISO timestamps are taken as wall clock time already. Timestamps with a zone
+    and epoch seconds are UTC and are shifted by utc_offset hours.
+    """
+    value = value.strip()
+    try:
+        return float(value) + utc_offset * 3600
+    except ValueError:
+        pass
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is not None:
+        return (dt - UTC_EPOCH).total_seconds() + utc_offset * 3600
+    return (dt - EPOCH).total_seconds()
+
+def format_timestamp(seconds: float) -> str:
+    return (EPOCH + timedelta(seconds=seconds)).isoformat()
+
+def _find_column(header: List[str], candidates: Tuple[str, ...], required: bool = True) -> Optional[int]:
+    lowered = [name.strip().lower() for name in header]
+    for name in candidates:
+        if name in lowered:
+            return lowered.index(name)
+    if required:
+        raise ValueError(f"CSV needs one of the columns {', '.join(candidates)} (found {', '.join(header)})")
+    return None
+
+def read_csv_points(path: str, utc_offset: float = 0.0) -> Iterator[Point]:
+    """Yield points from a CSV file with a header row"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+        t_col = _find_column(header, TIME_COLUMNS)
+        lat_col = _find_column(header, LAT_COLUMNS)
+        lon_col = _find_column(header, LON_COLUMNS)
+        s_col = _find_column(header, SENTIMENT_COLUMNS, required=False)
+        skipped = 0
+        for row in reader:
+            try:
+                sentiment = None
+                if s_col is not None and row[s_col].strip():
+                    sentiment = float(row[s_col])
+                yield (parse_timestamp(row[t_col], utc_offset), float(row[lat_col]), float(row[lon_col]),
+                       sentiment)
+            except (ValueError, IndexError):
+                skipped += 1
+        if skipped:
+            metrics.count('points_skipped', skipped)
+            print(f"Skipped {skipped} malformed CSV rows")
+
+def read_gpx_points(path: str, utc_offset: float = 0.0) -> Iterator[Point]:
+    """
+    Yield track points (and waypoints with a time) from a GPX file
+
+    The tree is parsed incrementally. Each point is removed from its parent once it is read.
+    Finished segments, tracks and routes are removed the same way, so memory does not grow
+    with the file. A <sentiment> child element (directly or inside <extensions>) is used as
+    the point's sentiment.
+    """
+    skipped = 0
+    parents = []  # Open elements; clear() alone would leave every emptied point attached to the tree
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            parents.append(elem)
+            continue
+        parents.pop()
+        tag = elem.tag.rsplit('}', 1)[-1]
+        if tag in ('trkseg', 'trk', 'rte'):
+            if parents:
+                parents[-1].remove(elem)
+            continue
+        if tag not in ('trkpt', 'wpt', 'rtept'):
+            continue
+        timestamp = sentiment = None
+        for child in elem.iter():
+            name = child.tag.rsplit('}', 1)[-1]
+            if name == 'time':
+                timestamp = child.text
+            elif name == 'sentiment' and child.text:
+                sentiment = float(child.text)
+        try:
+            if timestamp is None:
+                raise ValueError("point has no time")
+            yield parse_timestamp(timestamp, utc_offset), float(elem.get('lat')), float(elem.get('lon')), sentiment
+        except (TypeError, ValueError):
+            skipped += 1
+        elem.clear()
+        if parents:
+            parents[-1].remove(elem)
+    if skipped:
+        metrics.count('points_skipped', skipped)
+        print(f"Skipped {skipped} GPX points without a valid time or position")
+
+def read_points(path: str, fmt: Optional[str] = None, utc_offset: float = 0.0) -> Iterator[Point]:
+    """Dispatch on fmt ('csv' or 'gpx'), or on the file extension when fmt is None"""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt == 'csv':
+        return read_csv_points(path, utc_offset)
+    if fmt == 'gpx':
+        return read_gpx_points(path, utc_offset)
+    raise ValueError(f"Unknown GPS trace format '{fmt}' (expected csv or gpx)")
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Equirectangular distance in meters (accurate to well under 1% at city scale)"""
+    dx = (lon2 - lon1) * math.cos(math.radians((lat1 + lat2) * 0.5))
+    dy = lat2 - lat1
+    return math.sqrt(dx * dx + dy * dy) * METERS_PER_DEGREE
+
+
+class LocationSnapper:
+    """Nearest known location (locations.json) within a radius of a stay's centroid"""
+    def __init__(self, locations: List[Dict], radius_m: float = DEFAULT_SNAP_RADIUS):
+        # GridIndex works in degrees; a degree of longitude is shorter than one of latitude,
+        # so the query radius is widened by 1/cos(lat) and the exact check is done in meters
+        self.radius_m = radius_m
+        self.locations = locations
+        self.radius_deg = radius_m / METERS_PER_DEGREE
+        self.index = GridIndex(max(self.radius_deg, 1e-6))
+        self.max_stretch = 1.0
+        for i, loc in enumerate(locations):
+            self.index.insert(i, loc['longitude'], loc['latitude'])
+            self.max_stretch = max(self.max_stretch, 1 / max(math.cos(math.radians(loc['latitude'])), 1e-6))
+
+    def snap(self, lat: float, lon: float) -> Optional[Dict]:
+        best, best_dist = None, self.radius_m
+        for i, _ in self.index.query_radius(lon, lat, self.radius_deg * self.max_stretch):
+            loc = self.locations[i]
+            dist = distance_m(lat, lon, loc['latitude'], loc['longitude'])
+            if dist <= best_dist:
+                best, best_dist = loc, dist
+        return best
+
+
+class StayPointDetector:
+    """
+    Incremental stay-point segmentation of one time-ordered GPS trace
+
+    Feed points with add(); finished intervals are returned as they become known, in time
+    order, and finish() flushes the tail. Intervals tile the trace without gaps except
+    where no fix arrived for longer than max_gap.
+    """
+    def __init__(self, snapper: Optional[LocationSnapper] = None,
+                 stay_radius_m: float = DEFAULT_STAY_RADIUS, min_stay_minutes: float = DEFAULT_MIN_STAY,
+                 max_gap_minutes: float = DEFAULT_MAX_GAP, travel_seconds: float = DEFAULT_TRAVEL_SECONDS,
+                 driving_speed: float = DEFAULT_DRIVING_SPEED):
+        self.snapper = snapper
+        self.stay_radius_m = stay_radius_m
+        self.min_stay = min_stay_minutes * 60
+        self.max_gap = max_gap_minutes * 60
+        self.travel_seconds = travel_seconds
+        self.driving_speed = driving_speed
+
+        # Stay candidate: running sums, plus its points until it is long enough to be a stay
+        self.candidate: List[Point] = []
+        self.confirmed = False
+        self.start_t = self.last_t = 0.0
+        self.count = 0
+        self.sum_lat = self.sum_lon = 0.0
+        self.sent_sum = 0.0
+        self.sent_count = 0
+
+        # Travel chunk being accumulated: first point, last point, path length, sentiment sums
+        self.chunk_first: Optional[Point] = None
+        self.chunk_last: Optional[Point] = None
+        self.chunk_dist = 0.0
+        self.chunk_sent_sum = 0.0
+        self.chunk_sent_count = 0
+
+        self.previous_t: Optional[float] = None
+        self.out_of_order = 0
+
+    def add(self, point: Point) -> List[Dict]:
+        t, lat, lon, sentiment = point
+        if self.previous_t is not None and t < self.previous_t:
+            self.out_of_order += 1
+            return []
+        self.previous_t = t
+
+        emitted: List[Dict] = []
+        if self.count:
+            c_lat = self.sum_lat / self.count
+            c_lon = self.sum_lon / self.count
+            if distance_m(c_lat, c_lon, lat, lon) > self.stay_radius_m:
+                self._close_candidate(t, emitted)
+            elif not self.confirmed and t - self.last_t > self.max_gap:
+                # Too little evidence before a long silence to call this a stay
+                self._close_candidate(t, emitted)
+        self._extend_candidate(point)
+        return emitted
+
+    def finish(self) -> List[Dict]:
+        emitted: List[Dict] = []
+        if self.count:
+            self._close_candidate(None, emitted)
+        self._flush_chunk(None, emitted)
+        return emitted
+
+    def _extend_candidate(self, point: Point):
+        t, lat, lon, sentiment = point
+        if not self.count:
+            self.start_t = t
+        self.count += 1
+        self.last_t = t
+        self.sum_lat += lat
+        self.sum_lon += lon
+        if sentiment is not None:
+            self.sent_sum += sentiment
+            self.sent_count += 1
+        if self.confirmed:
+            return
+        self.candidate.append(point)
+        if t - self.start_t >= self.min_stay:
+            self.confirmed = True
+            self.candidate = []
+
+    def _close_candidate(self, next_t: Optional[float], emitted: List[Dict]):
+        """The candidate ends before a point at next_t (None at end of input)"""
+        if self.confirmed:
+            self._flush_chunk(self.start_t, emitted)
+            end = self.last_t
+            if next_t is not None and next_t - self.last_t <= self.max_gap:
+                end = next_t
+            emitted.append(self._stay_interval(end))
+        else:
+            for point in self.candidate:
+                self._add_travel(point, emitted)
+        self.candidate = []
+        self.confirmed = False
+        self.count = self.sent_count = 0
+        self.sum_lat = self.sum_lon = self.sent_sum = 0.0
+
+    def _add_travel(self, point: Point, emitted: List[Dict]):
+        t, lat, lon, sentiment = point
+        last = self.chunk_last
+        if last is not None:
+            if t - last[0] > self.max_gap:
+                self._flush_chunk(None, emitted)
+            else:
+                self.chunk_dist += distance_m(last[1], last[2], lat, lon)
+                if t - self.chunk_first[0] >= self.travel_seconds:
+                    self._flush_chunk(t, emitted)
+                    self.chunk_dist = 0.0
+        if self.chunk_first is None:
+            self.chunk_first = point
+        self.chunk_last = point
+        if sentiment is not None:
+            self.chunk_sent_sum += sentiment
+            self.chunk_sent_count += 1
+
+    def _flush_chunk(self, end_t: Optional[float], emitted: List[Dict]):
+        """Emit the travel chunk as one interval ending at end_t (default: its last fix)"""
+        first, last = self.chunk_first, self.chunk_last
+        if first is None:
+            return
+        if end_t is None:
+            end_t = last[0]
+        duration = end_t - first[0]
+        if duration > 0:
+            speed = self.chunk_dist / duration
+            sentiment = self.chunk_sent_sum / self.chunk_sent_count if self.chunk_sent_count else 0.0
+            emitted.append({
+                'start_time': format_timestamp(first[0]),
+                'end_time': format_timestamp(end_t),
+                'duration_minutes': duration / 60,
+                'latitude': first[1],
+                'longitude': first[2],
+                'location_name': 'Traveling',
+                'location_type': 'traveling',
+                'sentiment_score': round(sentiment, 2),
+                'activity': 'traveling',
+                'travel_mode': 'driving' if speed >= self.driving_speed else 'walking'
+            })
+        self.chunk_first = self.chunk_last = None
+        self.chunk_dist = 0.0
+        self.chunk_sent_sum = 0.0
+        self.chunk_sent_count = 0
+
+    def _stay_interval(self, end_t: float) -> Dict:
+        lat = self.sum_lat / self.count
+        lon = self.sum_lon / self.count
+        loc = self.snapper.snap(lat, lon) if self.snapper is not None else None
+        if loc is not None:
+            lat, lon = loc['latitude'], loc['longitude']
+            name, loc_type = loc['name'], loc['type']
+            metrics.count('stays_snapped')
+        else:
+            name, loc_type = 'Unknown', 'other'
+        start = EPOCH + timedelta(seconds=self.start_t)
+        if loc_type == 'library':
+            activity = 'studying'
+        elif loc_type == 'home' and start.hour < 7:
+            activity = 'sleep'
+        else:
+            activity = 'other'
+        sentiment = self.sent_sum / self.sent_count if self.sent_count else 0.0
+        return {
+            'start_time': start.isoformat(),
+            'end_time': format_timestamp(end_t),
+            'duration_minutes': (end_t - self.start_t) / 60,
+            'latitude': lat,
+            'longitude': lon,
+            'location_name': name,
+            'location_type': loc_type,
+            'sentiment_score': round(sentiment, 2),
+            'activity': activity
+        }
+
+
+def ingest_gps(input_file: str, output_file: str, locations: Optional[List[Dict]] = None,
+               fmt: Optional[str] = None, utc_offset: float = 0.0,
+               snap_radius_m: float = DEFAULT_SNAP_RADIUS, **detector_options) -> Dict:
+    """
+    Segment a GPS trace into stay and travel intervals and write them as a JSON array
+
+    Args:
+        input_file: CSV or GPX trace, in time order
+        output_file: Interval JSON output (same layout as intervals.json)
+        locations: Known places to snap stays to (locations.json entries)
+        fmt: 'csv' or 'gpx' (default: from the file extension)
+        utc_offset: Hours added to UTC timestamps to get local wall clock time
+        snap_radius_m: Stays farther than this from every location are left unsnapped
+        **detector_options: Passed to StayPointDetector (stay_radius_m, min_stay_minutes, ...)
+
+    Returns:
+        Dict with point, interval and stay counts and elapsed seconds
+    """
+    start = time.perf_counter()
+    snapper = LocationSnapper(locations, snap_radius_m) if locations else None
+    detector = StayPointDetector(snapper, **detector_options)
+    points = 0
+    stays = 0
+
+    with open(output_file, 'w', encoding='utf-8') as f:
+        writer = JsonArrayWriter(f)
+
+        def write(intervals: List[Dict]):
+            nonlocal stays
+            for interval in intervals:
+                if interval['location_type'] != 'traveling':
+                    stays += 1
+                writer.write(interval)
+
+        with metrics.span('segment'):
+            for point in read_points(input_file, fmt, utc_offset):
+                points += 1
+                emitted = detector.add(point)
+                if emitted:
+                    write(emitted)
+            write(detector.finish())
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    metrics.count('points_read', points)
+    metrics.count('intervals_emitted', writer.count)
+    metrics.count('stays_detected', stays)
+    if detector.out_of_order:
+        metrics.count('points_out_of_order', detector.out_of_order)
+        print(f"Dropped {detector.out_of_order} points that went back in time")
+    rate = points / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"Read {points:,} points -> {writer.count:,} intervals ({stays:,} stays) "
+          f"in {elapsed:.2f}s ({rate:,.0f} points/min)")
+    return {'points': points, 'intervals': writer.count, 'stays': stays, 'seconds': elapsed}
+
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Turn a raw GPS trace (CSV or GPX) into stay and travel intervals')
+    parser.add_argument('input', help='GPS trace (.csv or .gpx)')
+    parser.add_argument('--format', choices=['csv', 'gpx'], help='Input format (default: from the extension)')
+    parser.add_argument('--output', default=os.path.join(script_dir, 'intervals_gps.json'))
+    parser.add_argument('--locations', default=os.path.join(script_dir, 'locations.json'),
+                        help="Known places to snap stays to ('' to disable snapping)")
+    parser.add_argument('--stay-radius', type=float, default=DEFAULT_STAY_RADIUS,
+                        help='Meters a stay may drift from its centroid (default 50)')
+    parser.add_argument('--min-stay', type=float, default=DEFAULT_MIN_STAY,
+                        help='Minutes within the radius that make a stay (default 5)')
+    parser.add_argument('--snap-radius', type=float, default=DEFAULT_SNAP_RADIUS,
+                        help='Meters within which a stay is snapped to a known location (default 150)')
+    parser.add_argument('--max-gap', type=float, default=DEFAULT_MAX_GAP,
+                        help='Minutes without a fix after which the current interval is cut (default 30)')
+    parser.add_argument('--travel-seconds', type=float, default=DEFAULT_TRAVEL_SECONDS,
+                        help='Target length of each travel interval (default 120)')
+    parser.add_argument('--driving-speed', type=float, default=DEFAULT_DRIVING_SPEED,
+                        help='Average m/s at or above which travel counts as driving (default 3)')
+    parser.add_argument('--utc-offset', type=float, default=0.0,
+                        help='Hours added to UTC/epoch timestamps for local time, e.g. -8 for PST')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args):
+        locations = None
+        if args.locations:
+            with metrics.span('load'), open(args.locations, 'r', encoding='utf-8') as f:
+                locations = json.load(f)
+        ingest_gps(args.input, args.output, locations, fmt=args.format, utc_offset=args.utc_offset,
+                   snap_radius_m=args.snap_radius, stay_radius_m=args.stay_radius,
+                   min_stay_minutes=args.min_stay, max_gap_minutes=args.max_gap,
+                   travel_seconds=args.travel_seconds, driving_speed=args.driving_speed)
+        print(f"\nSaved to: {args.output}")
@@ -0,0 +1,331 @@
+"""
+Compact columnar binary format for interval data (intervals.bin)
+
+Layout (all little-endian):
+    8 bytes   magic b'IVCOL' + 3-byte version
+    4 bytes   uint32 header length
+    N bytes   JSON header: record count and, per column, name, dtype, byte offset,
+              and for categorical columns the dictionary of values
+    ...       column blocks, each starting on an 8-byte boundary
+
+Timestamps are stored as float64 seconds since 1970-01-01 of the naive (local wall-clock)
+ISO timestamps, so fractional seconds survive the round trip. Categorical columns
+(location_name, location_type, activity, travel_mode) are dictionary-encoded; a null
+dictionary entry means the key is absent from that record.
+"""
+import argparse
+import gzip
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+from json_stream import iter_json_array
+
+MAGIC = b'IVCOL\x00\x01\x00'
+EPOCH = datetime(1970, 1, 1)
+ALIGNMENT = 8
+
+# Column name -> storage kind and dtype
+TIME_COLUMNS = ('start_time', 'end_time')
+NUMERIC_COLUMNS = {
+    'start_time': '<f8',
+    'end_time': '<f8',
+    'duration_minutes': '<f8',
+    'latitude': '<f8',
+    'longitude': '<f8',
+    'sentiment_score': '<f4',
+    'user_id': '<i8'
+}
+CATEGORICAL_COLUMNS = ('location_name', 'location_type', 'activity', 'travel_mode')
+# Key order of generated records; decoded records follow it
+FIELD_ORDER = ('start_time', 'end_time', 'duration_minutes', 'latitude', 'longitude', 'location_name',
+               'location_type', 'sentiment_score', 'activity', 'travel_mode', 'user_id')
+MISSING_INT = -1
+
+# Sentiment is stored as float32; decoded values are rounded back to this many decimals
+SENTIMENT_DECIMALS = 6
+
+def to_epoch_seconds(timestamp: str) -> float:
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is not None:
+        raise ValueError(f"Expected a naive timestamp, got {timestamp}")
+    return (dt - EPOCH) / timedelta(seconds=1)
+
+def from_epoch_seconds(seconds: float) -> str:
+    return (EPOCH + timedelta(microseconds=round(seconds * 1_000_000))).isoformat()
+
+def _array_typecode(dtype: str) -> str:
+    return {'<f8': 'd', '<f4': 'f', '<i8': 'q'}[dtype]
+
+def write_interval_columns(intervals: Iterable[Dict], output_file: str) -> Dict:
+    """
+    Encode intervals into the columnar binary format
+
+    Args:
+        intervals: Interval dicts (e.g. iter_json_array('intervals.json'))
+        output_file: Path to write
+
+    Returns:
+        The header dict that was written
+    """
+    numeric = {name: array(_array_typecode(dtype)) for name, dtype in NUMERIC_COLUMNS.items()}
+    codes = {name: array('l') for name in CATEGORICAL_COLUMNS}
+    dictionaries = {name: {None: 0} for name in CATEGORICAL_COLUMNS}
+    present = set()
+    count = 0
+
+    for interval in intervals:
+        for key in interval:
+            if key not in present:
+                if key not in FIELD_ORDER:
+                    raise ValueError(f"Unsupported interval field: {key}")
+                present.add(key)
+        for name in NUMERIC_COLUMNS:
+            value = interval.get(name)
+            if name in TIME_COLUMNS:
+                value = to_epoch_seconds(value)
+            elif value is None:
+                value = MISSING_INT if name == 'user_id' else float('nan')
+            numeric[name].append(value)
+        for name in CATEGORICAL_COLUMNS:
+            value = interval.get(name)
+            lookup = dictionaries[name]
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(lookup)
+            codes[name].append(code)
+        count += 1
+
+    columns = []
+    blocks = []
+    for name in (name for name in FIELD_ORDER if name in present):
+        if name in NUMERIC_COLUMNS:
+            dtype = NUMERIC_COLUMNS[name]
+            data = np.frombuffer(numeric[name], dtype=dtype.replace('<', '=')).astype(dtype)
+            columns.append({'name': name, 'dtype': dtype, 'encoding': 'plain'})
+        else:
+            values = list(dictionaries[name])
+            dtype = '<u1' if len(values) <= 0xFF else '<u2' if len(values) <= 0xFFFF else '<u4'
+            data = np.frombuffer(codes[name], dtype=np.dtype('l')).astype(dtype)
+            columns.append({'name': name, 'dtype': dtype, 'encoding': 'dictionary', 'dictionary': values})
+        blocks.append(data.tobytes())
+
+    # Header size depends on the offsets it contains; fix the data start first
+    def header_bytes(data_start):
+        offset = data_start
+        for column, block in zip(columns, blocks):
+            column['offset'] = offset
+            column['nbytes'] = len(block)
+            offset += len(block) + (-len(block) % ALIGNMENT)
+        return json.dumps({'version': 1, 'count': count, 'columns': columns},
+                          separators=(',', ':')).encode('utf-8')
+
+    data_start = 0
+    while True:
+        header = header_bytes(data_start)
+        needed = len(MAGIC) + 4 + len(header)
+        needed += -needed % ALIGNMENT
+        if needed <= data_start:
+            break
+        data_start = needed
+
+    with open(output_file, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(b'\0' * (data_start - f.tell()))
+        for block in blocks:
+            f.write(block)
+            f.write(b'\0' * (-len(block) % ALIGNMENT))
+
+    return json.loads(header)
+
+
+class IntervalColumns:
+    """
+    Zero-copy reader: the file is memory-mapped and every column is a NumPy view into it
+
+    Usage:
+        with IntervalColumns('intervals.bin') as cols:
+            cols['sentiment_score'].mean()
+            cols.categorical('location_name')  # (codes, dictionary)
+    """
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an interval column file")
+        (header_len,) = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._mmap[start:start + header_len].decode('utf-8'))
+        self.count = self.header['count']
+        self.column_info = {c['name']: c for c in self.header['columns']}
+        self._views = {}
+        for info in self.header['columns']:
+            self._views[info['name']] = np.frombuffer(self._mmap, dtype=info['dtype'],
+                                                      count=self.count, offset=info['offset'])
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._views
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Raw column: values for numeric columns, dictionary codes for categorical ones"""
+        return self._views[name]
+
+    def categorical(self, name: str):
+        """Return (codes, dictionary) for a dictionary-encoded column"""
+        return self._views[name], self.column_info[name]['dictionary']
+
+    def records(self) -> Iterator[Dict]:
+        """Decode rows back into interval dicts (same keys and key order as the source JSON)"""
+        decoders = []
+        for info in self.header['columns']:
+            name = info['name']
+            column = self._views[name]
+            if info['encoding'] == 'dictionary':
+                values = column.tolist()
+                dictionary = info['dictionary']
+                decoders.append((name, lambda i, v=values, d=dictionary: d[v[i]]))
+            elif name in TIME_COLUMNS:
+                values = column.tolist()
+                decoders.append((name, lambda i, v=values: from_epoch_seconds(v[i])))
+            elif name == 'sentiment_score':
+                values = np.round(column.astype(np.float64), SENTIMENT_DECIMALS).tolist()
+                decoders.append((name, lambda i, v=values: v[i]))
+            elif name == 'user_id':
+                values = column.tolist()
+                decoders.append((name, lambda i, v=values: None if v[i] == MISSING_INT else v[i]))
+            else:
+                values = column.tolist()
+                decoders.append((name, lambda i, v=values: None if v[i] != v[i] else v[i]))
+
+        for i in range(self.count):
+            record = {}
+            for name, decode in decoders:
+                value = decode(i)
+                if value is not None:
+                    record[name] = value
+            yield record
+
+    def close(self):
+        self._views = {}
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # Caller still holds column views; the map is released with them
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def json_to_binary(json_file: str, binary_file: str) -> Dict:
+    """Convert intervals.json to the binary format (streams the JSON input)"""
+    return write_interval_columns(iter_json_array(json_file), binary_file)
+
+def open_intervals(path: str) -> IntervalColumns:
+    """
+    Memory-map intervals.bin, or convert a JSON file to the binary layout in a temp file
+
+    Files starting with the binary magic are mapped; anything else is read as JSON (so
+    leading whitespace or a BOM is fine).
+    """
+    with open(path, 'rb') as f:
+        is_binary = f.read(len(MAGIC)) == MAGIC
+    if is_binary:
+        return IntervalColumns(path)
+    fd, temp_file = tempfile.mkstemp(suffix='.bin')
+    os.close(fd)
+    try:
+        json_to_binary(path, temp_file)
+        return IntervalColumns(temp_file)
+    finally:
+        os.unlink(temp_file)  # The open map keeps the data alive
+
+def binary_to_json(binary_file: str, json_file: str, precision: Optional[int] = None) -> Dict:
+    """
+    Convert the binary format back to intervals.json
+
+    Written the way generate_intervals_with_routes.py writes intervals.json (compact, through
+    artifacts.write_json_array), so a file converted to binary and back is byte-identical.
+    precision rounds floats again, for binaries built from unrounded records.
+    """
+    from artifacts import write_json_array
+
+    with IntervalColumns(binary_file) as cols:
+        return write_json_array(json_file, cols.records(), precision)
+
+def compare(json_file: str, binary_file: str):
+    """Print size and load-time comparison between JSON and binary versions"""
+    def gzip_size(path):
+        with open(path, 'rb') as f:
+            return len(gzip.compress(f.read(), 6))
+
+    json_size = os.path.getsize(json_file)
+    binary_size = os.path.getsize(binary_file)
+    print(f"{'':24s}{'JSON':>14s}{'binary':>14s}{'ratio':>8s}")
+    print(f"{'size (bytes)':24s}{json_size:>14,}{binary_size:>14,}{json_size / binary_size:>7.1f}x")
+    json_gz, binary_gz = gzip_size(json_file), gzip_size(binary_file)
+    print(f"{'gzip size (bytes)':24s}{json_gz:>14,}{binary_gz:>14,}{json_gz / binary_gz:>7.1f}x")
+
+    # JSON load includes timestamp parsing, like loadIntervals does with new Date()
+    start = time.perf_counter()
+    with open(json_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    starts = [datetime.fromisoformat(i['start_time']) for i in data]
+    ends = [datetime.fromisoformat(i['end_time']) for i in data]
+    json_load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with IntervalColumns(binary_file) as cols:
+        cols['start_time'].min()
+        cols['end_time'].max()
+        cols['sentiment_score'].mean()
+    binary_load = time.perf_counter() - start
+    print(f"{'load + timestamps (s)':24s}{json_load:>14.4f}{binary_load:>14.4f}{json_load / binary_load:>7.1f}x")
+
+    start = time.perf_counter()
+    with IntervalColumns(binary_file) as cols:
+        decoded = sum(1 for _ in cols.records())
+    print(f"{'decode to dicts (s)':24s}{'':>14s}{time.perf_counter() - start:>14.4f}")
+    assert decoded == len(data) == len(starts) == len(ends)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert between intervals.json and the columnar binary format')
+    sub = parser.add_subparsers(dest='command', required=True)
+    to_bin = sub.add_parser('to-binary', help='intervals.json -> intervals.bin')
+    to_bin.add_argument('json_file')
+    to_bin.add_argument('binary_file')
+    to_json = sub.add_parser('to-json', help='intervals.bin -> intervals.json')
+    to_json.add_argument('binary_file')
+    to_json.add_argument('json_file')
+    to_json.add_argument('--precision', type=int, default=None, help='Round floats to this many decimals')
+    cmp = sub.add_parser('compare', help='Size and load-time comparison')
+    cmp.add_argument('json_file')
+    cmp.add_argument('binary_file')
+    args = parser.parse_args()
+
+    if args.command == 'to-binary':
+        header = json_to_binary(args.json_file, args.binary_file)
+        print(f"Wrote {header['count']} intervals to {args.binary_file} ({os.path.getsize(args.binary_file):,} bytes)")
+    elif args.command == 'to-json':
+        info = binary_to_json(args.binary_file, args.json_file, args.precision)
+        print(f"Wrote {info['count']} intervals to {args.json_file} ({info['bytes']:,} bytes)")
+    else:
+        compare(args.json_file, args.binary_file)
@@ -0,0 +1,155 @@
+"""
+Incremental JSON reading and writing for large pipeline files
+Parses array elements one at a time so memory stays flat regardless of file size
+"""
+import json
+from typing import Any, Iterator, Optional
+
+CHUNK_SIZE = 1 << 20  # 1 MB reads
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+
+class _StreamBuffer:
+    """
+    Sliding text buffer over a file object, refilled on demand
+    """
+    def __init__(self, f, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read another chunk, dropping consumed text. Returns False at EOF."""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at EOF)"""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' in JSON stream, found '{found or 'EOF'}'")
+        self.pos += 1
+
+    def decode_value(self) -> Any:
+        """Decode the next complete JSON value, reading more input until it parses"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the end of the buffer may be truncated ("12" of "123")
+            if end == len(self.text) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array(buf: _StreamBuffer) -> Iterator[Any]:
+    buf.expect('[')
+    if buf.peek() == ']':
+        buf.pos += 1
+        return
+    while True:
+        yield buf.decode_value()
+        sep = buf.peek()
+        buf.pos += 1
+        if sep == ']':
+            return
+        if sep != ',':
+            raise ValueError(f"Expected ',' or ']' in JSON array, found '{sep or 'EOF'}'")
+
+
+def iter_json_array(path: str, key: Optional[str] = None) -> Iterator[Any]:
+    """
+    Yield the elements of a JSON array one at a time
+
+    Args:
+        path: Path to a JSON file
+        key: If given, the file is an object and the array is stored under this
+             top-level key (e.g. 'features' for a GeoJSON FeatureCollection);
+             otherwise the file itself is an array
+    """
+    # utf-8-sig: files saved by some editors and Windows tools start with a byte order mark
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        buf = _StreamBuffer(f)
+        if key is None:
+            yield from _iter_array(buf)
+            return
+
+        buf.expect('{')
+        while buf.peek() != '}':
+            name = buf.decode_value()
+            buf.expect(':')
+            if name == key:
+                yield from _iter_array(buf)
+                return
+            buf.decode_value()  # Skip other top-level members
+            if buf.peek() == ',':
+                buf.pos += 1
+        raise KeyError(f"No '{key}' array found in {path}")
+
+
+class JsonArrayWriter:
+    """
+    Write a JSON array element by element
+    Output matches json.dump(..., indent=2) for the same data, so streamed and
+    in-memory code paths produce byte-identical files. With indent=None the array
+    is written compactly (no whitespace).
+    """
+    def __init__(self, f, depth: int = 1, indent: Optional[int] = 2):
+        """
+        Args:
+            f: Text file object positioned where the array should start
+            depth: Nesting level of the array (1 = top-level array,
+                   2 = array inside a top-level object, ...)
+            indent: Spaces per nesting level, or None for compact output
+        """
+        self.f = f
+        self.indent = indent
+        self.pad = ' ' * ((indent or 0) * depth)
+        self.close_pad = ' ' * ((indent or 0) * (depth - 1))
+        self.count = 0
+        self.f.write('[')
+
+    def write(self, item: Any):
+        if self.indent is None:
+            self.write_json(json.dumps(item, separators=(',', ':')))
+        else:
+            self.write_json(json.dumps(item, indent=self.indent))
+
+    def write_json(self, text: str):
+        """Write an element that was already encoded with the writer's json.dumps settings"""
+        if self.indent is None:
+            self.f.write(',' + text if self.count else text)
+        else:
+            self.f.write(',\n' if self.count else '\n')
+            self.f.write(self.pad + text.replace('\n', '\n' + self.pad))
+        self.count += 1
+
+    def close(self):
+        if self.count and self.indent is not None:
+            self.f.write('\n' + self.close_pad)
+        self.f.write(']')
@@ -0,0 +1,313 @@
+"""
+Convert raw OpenStreetMap JSON (Overpass output, e.g. buildings_usc.json) into building GeoJSON
+Output has the layout of buildings_usc.geojson: one Polygon feature per building with
+properties {id, tags}, ready for filter_buildings.py.
+
+The input is streamed twice:
+  1. Nodes go into a compact NodeStore (sorted int64 ids plus a float64 coordinate
+     array, optionally memory-mapped from disk). Building multipolygon relations are
+     recorded along with their member way ids.
+  2. Building ways are resolved against the store and written immediately. Relation
+     member ways are kept until the pass ends. Then the relations are assembled into
+     rings, and each outer ring becomes one Polygon feature with the inner rings it
+     contains.
+Memory is about 24 bytes per node (or page cache only with --node-store) plus the member
+ways of building relations. It does not grow with the number of building ways.
+"""
+import argparse
+import os
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from json_stream import JsonArrayWriter, iter_json_array
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+
+# Appended node ids/coordinates are flushed to the memory-mapped store in blocks of this many
+SPILL_BLOCK = 1 << 16
+
+Coords = List[List[float]]
+
+def is_building(tags: Optional[Dict]) -> bool:
+    return bool(tags) and tags.get('building', 'no') != 'no'
+
+def is_building_relation(element: Dict) -> bool:
+    tags = element.get('tags') or {}
+    return tags.get('type') == 'multipolygon' and is_building(tags)
+
+
+class NodeStore:
+    """
+    Node coordinates keyed by OSM id, stored as a sorted id array plus an (n, 2) lon/lat array
+
+    Lookups are binary searches over the id array. With a directory, the arrays are written
+    there and memory-mapped, so the resident cost is whatever the OS keeps cached.
+    """
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._ids = array('q')
+        self._coords = array('d')
+        self._files = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._files = (open(os.path.join(directory, 'node_ids.bin'), 'wb'),
+                           open(os.path.join(directory, 'node_coords.bin'), 'wb'))
+        self.ids: Optional[np.ndarray] = None
+        self.coords: Optional[np.ndarray] = None
+
+    def add(self, node_id: int, lon: float, lat: float):
+        self._ids.append(node_id)
+        self._coords.append(lon)
+        self._coords.append(lat)
+        if self._files is not None and len(self._ids) >= SPILL_BLOCK:
+            self._spill()
+
+    def _spill(self):
+        self._ids.tofile(self._files[0])
+        self._coords.tofile(self._files[1])
+        self._ids = array('q')
+        self._coords = array('d')
+
+    def __len__(self) -> int:
+        return len(self.ids) if self.ids is not None else len(self._ids)
+
+    def finalize(self):
+        """Sort by id (a no-op for regular OSM extracts, which list nodes in id order)"""
+        if self._files is not None:
+            self._spill()
+            for f in self._files:
+                f.close()
+            ids_path = os.path.join(self.directory, 'node_ids.bin')
+            ids = np.memmap(ids_path, dtype=np.int64, mode='r') if os.path.getsize(ids_path) \
+                else np.empty(0, dtype=np.int64)
+            coords = np.memmap(os.path.join(self.directory, 'node_coords.bin'), dtype=np.float64,
+                               mode='r').reshape(-1, 2) if len(ids) else np.empty((0, 2))
+        else:
+            ids = np.frombuffer(self._ids, dtype=np.int64)
+            coords = np.frombuffer(self._coords, dtype=np.float64).reshape(-1, 2)
+        if len(ids) > 1 and not np.all(ids[1:] > ids[:-1]):
+            order = np.argsort(ids, kind='stable')
+            ids, coords = ids[order], coords[order]
+            metrics.count('nodes_resorted', len(ids))
+        self.ids, self.coords = ids, coords
+
+    def lookup(self, refs: Sequence[int]) -> Optional[np.ndarray]:
+        """(len(refs), 2) lon/lat array, or None if any node is missing from the extract"""
+        refs = np.asarray(refs, dtype=np.int64)
+        positions = np.searchsorted(self.ids, refs)
+        if len(self.ids) == 0 or positions.max() >= len(self.ids) or not np.array_equal(self.ids[positions], refs):
+            return None
+        return self.coords[positions]
+
+    def close(self):
+        self.ids = self.coords = None
+        if self.directory is not None:
+            for name in ('node_ids.bin', 'node_coords.bin'):
+                path = os.path.join(self.directory, name)
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def way_coords(way: Dict, nodes: NodeStore) -> Optional[Coords]:
+    """Coordinates of a way, from inline geometry (Overpass 'out geom') or the node store"""
+    if way.get('geometry'):
+        return [[point['lon'], point['lat']] for point in way['geometry']]
+    refs = way.get('nodes')
+    if not refs:
+        return None
+    coords = nodes.lookup(refs)
+    return coords.tolist() if coords is not None else None
+
+def assemble_rings(parts: List[Coords]) -> Tuple[List[Coords], int]:
+    """
+    Join way segments end to end into closed rings (segments may need reversing)
+
+    Returns:
+        (rings, number of chains that could not be closed)
+    """
+    rings = []
+    open_parts = []
+    for part in parts:
+        if len(part) >= 4 and part[0] == part[-1]:
+            rings.append(part)
+        elif len(part) >= 2:
+            open_parts.append(part)
+
+    unclosed = 0
+    while open_parts:
+        ring = list(open_parts.pop())
+        progress = True
+        while ring[0] != ring[-1] and progress:
+            progress = False
+            for i, part in enumerate(open_parts):
+                if part[0] == ring[-1]:
+                    ring.extend(part[1:])
+                elif part[-1] == ring[-1]:
+                    ring.extend(part[-2::-1])
+                else:
+                    continue
+                open_parts.pop(i)
+                progress = True
+                break
+        if ring[0] == ring[-1] and len(ring) >= 4:
+            rings.append(ring)
+        else:
+            unclosed += 1
+    return rings, unclosed
+
+def point_in_ring(lon: float, lat: float, ring: Coords) -> bool:
+    """Even-odd ray casting test"""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i][0], ring[i][1]
+        xj, yj = ring[j][0], ring[j][1]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+def relation_polygons(relation: Dict, member_coords: Dict[int, Coords]) -> List[List[Coords]]:
+    """Polygons (outer ring + contained inner rings) of a multipolygon relation"""
+    outer_parts, inner_parts = [], []
+    for member in relation.get('members', []):
+        if member.get('type') != 'way':
+            continue
+        coords = member_coords.get(member['ref'])
+        if coords is None and member.get('geometry'):
+            coords = [[point['lon'], point['lat']] for point in member['geometry']]
+        if coords is None:
+            metrics.count('members_missing')
+            continue
+        (inner_parts if member.get('role') == 'inner' else outer_parts).append(coords)
+
+    outers, unclosed = assemble_rings(outer_parts)
+    inners, unclosed_inner = assemble_rings(inner_parts)
+    if unclosed or unclosed_inner:
+        metrics.count('rings_unclosed', unclosed + unclosed_inner)
+    polygons = [[outer] for outer in outers]
+    for inner in inners:
+        for polygon in polygons:
+            if point_in_ring(inner[0][0], inner[0][1], polygon[0]):
+                polygon.append(inner)
+                break
+    return polygons
+
+def feature(osm_id: int, tags: Dict, rings: List[Coords]) -> Dict:
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Polygon', 'coordinates': rings},
+        'properties': {'id': osm_id, 'tags': tags}
+    }
+
+def osm_to_geojson(input_file: str, output_file: str, node_store_dir: Optional[str] = None,
+                   compact: bool = False) -> Dict:
+    """
+    Convert building ways and multipolygon relations in an OSM JSON file to GeoJSON
+
+    Args:
+        input_file: OSM JSON with an 'elements' array (Overpass API output)
+        output_file: GeoJSON FeatureCollection to write
+        node_store_dir: If given, node coordinates are spilled here and memory-mapped
+        compact: Write without whitespace. The default indented layout matches
+                 buildings_usc.geojson, but json encodes indented output in pure Python,
+                 which makes it several times slower
+
+    Returns:
+        Dict with element and feature counts and elapsed seconds
+    """
+    start = time.perf_counter()
+    nodes = NodeStore(node_store_dir)
+    relations: List[Dict] = []
+    member_ways: Dict[int, Optional[Coords]] = {}
+
+    print(f"Pass 1: reading nodes and relations from {input_file}...")
+    with metrics.span('scan_nodes'):
+        for element in iter_json_array(input_file, key='elements'):
+            kind = element.get('type')
+            if kind == 'node':
+                nodes.add(element['id'], element['lon'], element['lat'])
+            elif kind == 'relation' and is_building_relation(element):
+                # Members are kept; everything else about the relation is small
+                relations.append({'id': element['id'], 'tags': element.get('tags', {}),
+                                  'members': element.get('members', [])})
+                for member in element.get('members', []):
+                    if member.get('type') == 'way':
+                        member_ways[member['ref']] = None
+        nodes.finalize()
+    node_count = len(nodes)
+    metrics.count('nodes_read', node_count)
+    print(f"Stored {node_count:,} nodes; {len(relations):,} building relations with "
+          f"{len(member_ways):,} member ways")
+
+    stats = {'ways': 0, 'incomplete': 0, 'unclosed': 0}
+    print("Pass 2: resolving building ways...")
+    try:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            if compact:
+                f.write('{"type":"FeatureCollection","features":')
+                writer = JsonArrayWriter(f, indent=None)
+            else:
+                f.write('{\n  "type": "FeatureCollection",\n  "features": ')
+                writer = JsonArrayWriter(f, depth=2)
+            with metrics.span('build_ways'):
+                for element in iter_json_array(input_file, key='elements'):
+                    if element.get('type') != 'way':
+                        continue
+                    stats['ways'] += 1
+                    building = is_building(element.get('tags'))
+                    member = element['id'] in member_ways
+                    if not (building or member):
+                        continue
+                    coords = way_coords(element, nodes)
+                    if coords is None:
+                        stats['incomplete'] += 1
+                        continue
+                    if member:
+                        member_ways[element['id']] = coords
+                    if building:
+                        if len(coords) < 4 or coords[0] != coords[-1]:
+                            stats['unclosed'] += 1
+                            continue
+                        writer.write(feature(element['id'], element.get('tags', {}), [coords]))
+            way_features = writer.count
+
+            with metrics.span('assemble_relations'):
+                for relation in relations:
+                    for rings in relation_polygons(relation, member_ways):
+                        writer.write(feature(relation['id'], relation['tags'], rings))
+            writer.close()
+            f.write('}' if compact else '\n}')
+    finally:
+        nodes.close()
+
+    elapsed = time.perf_counter() - start
+    metrics.count('ways_read', stats['ways'])
+    metrics.count('features_written', writer.count)
+    print(f"Wrote {way_features:,} building ways and {writer.count - way_features:,} relation polygons "
+          f"({stats['incomplete']:,} ways with missing nodes, {stats['unclosed']:,} unclosed) "
+          f"in {elapsed:.2f}s")
+    return {'nodes': node_count, 'ways': stats['ways'],
+            'features': writer.count, 'relation_features': writer.count - way_features,
+            'incomplete_ways': stats['incomplete'], 'unclosed_ways': stats['unclosed'], 'seconds': elapsed}
+
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Convert OSM JSON building data to GeoJSON')
+    parser.add_argument('--input', default=os.path.join(script_dir, 'buildings_usc.json'),
+                        help='OSM JSON (Overpass output with an "elements" array)')
+    parser.add_argument('--output', default=os.path.join(script_dir, 'buildings_usc.geojson'))
+    parser.add_argument('--node-store', metavar='DIR',
+                        help='Spill node coordinates to DIR and memory-map them (for extracts larger than RAM)')
+    parser.add_argument('--compact', action='store_true',
+                        help='Write compact JSON (much faster on large extracts; same features)')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args):
+        osm_to_geojson(args.input, args.output, args.node_store, compact=args.compact)
+        print(f"\nSaved to: {args.output}")
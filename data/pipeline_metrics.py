@@ -0,0 +1,181 @@
+"""
+Timing spans, counters and peak memory for the pipeline scripts
+
+Scripts record into the shared `metrics` object:
+
+    from pipeline_metrics import metrics
+
+    with metrics.span('route_fetch'):
+        ...
+    metrics.count('api_calls', 3)
+
+and opt into output with add_metrics_arguments(parser) and instrumented(args), which write
+a JSON metrics file (--metrics-out) and optionally a cProfile dump (--profile-out, pstats
+format for snakeviz, gprof2dot or `python -m pstats`). Span names are flat; a span entered
+several times accumulates its total seconds and call count. Recording is cheap enough to
+leave on all the time, so the metrics file costs nothing extra when requested.
+"""
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process in MB, or None where the platform does not report it"""
+    # VmHWM is per address space; ru_maxrss on Linux survives exec, so a spawned child would
+    # report the parent's peak if the parent was larger
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux (and the other Unixes) report kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class _Span:
+    """Context manager adding its elapsed time to one named span"""
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics: 'Metrics', name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Accumulated span timings and counters for one process"""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.spans: Dict[str, list] = {}  # name -> [seconds, calls]
+        self.counters: Dict[str, int] = {}
+        self.worker_peak_rss_mb = 0.0
+        self.started = time.perf_counter()
+
+    def span(self, name: str) -> _Span:
+        return _Span(self, name)
+
+    def timed(self, name: str):
+        """Decorator recording every call of a function as a span"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def add_time(self, name: str, seconds: float, calls: int = 1):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [seconds, calls]
+        else:
+            entry[0] += seconds
+            entry[1] += calls
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def snapshot(self) -> Dict:
+        peak = peak_rss_mb()
+        snapshot = {
+            'wall_seconds': round(time.perf_counter() - self.started, 6),
+            'peak_rss_mb': None if peak is None else round(peak, 1),
+            'spans': {name: {'seconds': round(seconds, 6), 'calls': calls}
+                      for name, (seconds, calls) in self.spans.items()},
+            'counters': dict(self.counters)
+        }
+        if self.worker_peak_rss_mb:
+            snapshot['worker_peak_rss_mb'] = round(self.worker_peak_rss_mb, 1)
+        return snapshot
+
+    def drain(self) -> Dict:
+        """Snapshot and reset (worker processes send their share back this way)"""
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot: Dict):
+        """Add a snapshot from another process (span times are CPU time summed across workers)"""
+        for name, span in snapshot['spans'].items():
+            self.add_time(name, span['seconds'], span['calls'])
+        for name, n in snapshot['counters'].items():
+            self.count(name, n)
+        self.worker_peak_rss_mb = max(self.worker_peak_rss_mb, snapshot['peak_rss_mb'] or 0.0)
+
+    def write(self, path: str, script: Optional[str] = None):
+        report = {
+            'script': script or os.path.basename(sys.argv[0]),
+            'argv': sys.argv[1:],
+            'created': datetime.now().isoformat(timespec='seconds')
+        }
+        report.update(self.snapshot())
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    def summary(self) -> str:
+        lines = [f"{'span':24s}{'seconds':>10s}{'calls':>10s}"]
+        for name, (seconds, calls) in sorted(self.spans.items(), key=lambda item: -item[1][0]):
+            lines.append(f"{name:24s}{seconds:>10.3f}{calls:>10,}")
+        for name, n in sorted(self.counters.items()):
+            lines.append(f"{name:24s}{n:>20,}")
+        peak = peak_rss_mb()
+        if peak is not None:
+            lines.append(f"{'peak RSS (MB)':24s}{peak:>20.1f}")
+        return '\n'.join(lines)
+
+# Shared instance used by all pipeline modules
+metrics = Metrics()
+
+def add_metrics_arguments(parser):
+    parser.add_argument('--metrics-out', metavar='JSON',
+                        help='Write stage timings, counters and peak memory to this file')
+    parser.add_argument('--profile-out', metavar='PROF',
+                        help='Run under cProfile and dump pstats data to this file')
+
+@contextmanager
+def instrumented(args, script: Optional[str] = None) -> Iterator[Metrics]:
+    """
+    Wrap a script's main body: profile it if requested and write metrics on exit
+
+    Args:
+        args: Parsed arguments from a parser set up with add_metrics_arguments
+        script: Name recorded in the metrics file (default: the running script)
+    """
+    profiler = cProfile.Profile() if args.profile_out else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_out)
+            print(f"Profile saved to: {args.profile_out}")
+        if args.metrics_out:
+            metrics.write(args.metrics_out, script)
+            print(f"\n{metrics.summary()}")
+            print(f"Metrics saved to: {args.metrics_out}")
@@ -0,0 +1,460 @@
+"""
+Local HTTP query service for interval datasets
+Serves time-window, bounding-box and point-in-time lookups so the web app does not have to
+download a months-long dataset and filter it client side (filterIntervalsByDate,
+filterIntervalsByTime, the "which interval contains this time" scans).
+
+Intervals are loaded into columns (intervals.bin is memory-mapped as-is, JSON is converted
+first) and indexed two ways:
+  - time: rows sorted by start_time. Overlap queries binary-search the sorted starts, going
+    back by the longest interval duration, so every overlapping interval is a candidate.
+  - space: rows grouped by grid cell and sorted by start within each cell. A bbox query
+    binary-searches only the cells it covers.
+Each query takes whichever candidate range is smaller. Encoded responses are kept in an
+LRU cache, and responses are gzipped when the client accepts it.
+
+Endpoints (times are ISO 8601 local timestamps or epoch seconds; bbox is
+minLon,minLat,maxLon,maxLat):
+    GET /intervals?start=&end=&bbox=&user=&fields=&format=&limit=
+    GET /at?time=&bbox=&user=&fields=&format=      intervals containing one instant
+    GET /stats
+The default format is columnar: {"count", "fields", "columns": {name: [...]}}. Times are
+epoch seconds, and categorical columns are {"dictionary": [...], "codes": [...]}.
+format=records returns interval dicts in the intervals.json schema instead.
+"""
+import argparse
+import gzip
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from interval_columns import (FIELD_ORDER, MISSING_INT, SENTIMENT_DECIMALS, TIME_COLUMNS, IntervalColumns,
+                              from_epoch_seconds, open_intervals, to_epoch_seconds)
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+
+DEFAULT_CELL_SIZE = 0.01         # degrees (~1 km)
+DEFAULT_CACHE_ENTRIES = 256
+DEFAULT_CACHE_BYTES = 64 << 20   # Encoded bodies, all entries together
+DEFAULT_LIMIT = 200_000
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+
+
+class QueryError(ValueError):
+    """Bad query parameters (answered with 400)"""
+
+
+def parse_time(value: str) -> float:
+    """ISO 8601 (naive, local) or epoch seconds -> epoch seconds, as stored in intervals.bin"""
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            return to_epoch_seconds(value)
+        except ValueError as e:
+            raise QueryError(f"Invalid time '{value}': {e}") from None
+    if not math.isfinite(seconds):
+        raise QueryError(f"Invalid time '{value}': must be finite")
+    return seconds
+
+def parse_bbox(value: str) -> Tuple[float, float, float, float]:
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(','))
+    except ValueError:
+        raise QueryError(f"bbox must be minLon,minLat,maxLon,maxLat, got '{value}'") from None
+    if not all(math.isfinite(v) for v in (min_lon, min_lat, max_lon, max_lat)):
+        raise QueryError(f"bbox values must be finite: '{value}'")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise QueryError(f"bbox minimums exceed maximums: '{value}'")
+    return min_lon, min_lat, max_lon, max_lat
+
+def parse_limit(value: str) -> int:
+    try:
+        limit = int(value)
+    except ValueError:
+        raise QueryError(f"limit must be an integer, got '{value}'") from None
+    if limit < 0:
+        raise QueryError(f"limit must not be negative, got {limit}")
+    return limit
+
+
+class IntervalIndex:
+    """Time and grid indexes over interval columns; all row numbers are in start_time order"""
+    def __init__(self, cols: IntervalColumns, cell_size: float = DEFAULT_CELL_SIZE):
+        self.cols = cols
+        self.count = len(cols)
+        self.cell_size = cell_size
+        self.fields = [name for name in FIELD_ORDER if name in cols]
+
+        start = cols['start_time']
+        if self.count and not np.all(start[1:] >= start[:-1]):
+            # Unsorted input: keep a sorted copy (generated files are sorted and stay mapped)
+            order = np.argsort(start, kind='stable')
+            self.data = {name: cols[name][order] for name in self.fields}
+        else:
+            self.data = {name: cols[name] for name in self.fields}
+        self.dictionaries = {name: cols.column_info[name]['dictionary'] for name in self.fields
+                             if cols.column_info[name]['encoding'] == 'dictionary'}
+
+        self.start = self.data['start_time']
+        self.end = self.data['end_time']
+        self.lon = self.data['longitude']
+        self.lat = self.data['latitude']
+        self.max_duration = float((self.end - self.start).max()) if self.count else 0.0
+
+        # Grid: rows grouped by cell, each cell's rows in start order (rows without a position sort first)
+        valid = np.isfinite(self.lon) & np.isfinite(self.lat)
+        cx = np.floor(np.where(valid, self.lon, 0) / cell_size).astype(np.int64)
+        cy = np.floor(np.where(valid, self.lat, 0) / cell_size).astype(np.int64)
+        x_min = int(cx.min()) if self.count else 0
+        y_min = int(cy.min()) if self.count else 0
+        rows_y = int(cy.max()) - y_min + 1 if self.count else 1
+        keys = np.where(valid, (cx - x_min) * rows_y + (cy - y_min), -1)
+        self.grid_rows = np.argsort(keys, kind='stable')
+        self.grid_starts = self.start[self.grid_rows]
+        unique, first, counts = np.unique(keys[self.grid_rows], return_index=True, return_counts=True)
+        self.cells: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        for key, lo, n in zip(unique.tolist(), first.tolist(), counts.tolist()):
+            if key >= 0:
+                gx, gy = divmod(key, rows_y)
+                self.cells[(x_min + gx, y_min + gy)] = (lo, lo + n)
+
+    def _time_bounds(self, starts: np.ndarray, t0: float, t1: float, point: bool) -> Tuple[int, int]:
+        """Slice of a start-sorted array that can overlap [t0, t1) (or contain t0 if point)"""
+        lo = 0 if t0 == -math.inf else int(np.searchsorted(starts, t0 - self.max_duration, 'left'))
+        hi = int(np.searchsorted(starts, t1, 'right' if point else 'left'))
+        return lo, max(lo, hi)
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              bbox: Optional[Sequence[float]] = None, user: Optional[int] = None,
+              at: Optional[float] = None) -> np.ndarray:
+        """
+        Row numbers (ascending, i.e. by start_time) of matching intervals
+
+        Args:
+            start, end: Keep intervals overlapping [start, end); either may be None (open)
+            bbox: (min_lon, min_lat, max_lon, max_lat), inclusive
+            user: Only this user_id
+            at: Keep intervals with start_time <= at < end_time (overrides start/end)
+        """
+        point = at is not None
+        t0 = at if point else (-math.inf if start is None else start)
+        t1 = at if point else (math.inf if end is None else end)
+        lo, hi = self._time_bounds(self.start, t0, t1, point)
+
+        rows = None
+        if bbox is not None:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            x0, x1 = math.floor(min_lon / self.cell_size), math.floor(max_lon / self.cell_size)
+            y0, y1 = math.floor(min_lat / self.cell_size), math.floor(max_lat / self.cell_size)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(self.cells):
+                cells = [self.cells.get((x, y)) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+            else:
+                cells = [span for (x, y), span in self.cells.items() if x0 <= x <= x1 and y0 <= y <= y1]
+            slices = []
+            for span in cells:
+                if span is None:
+                    continue
+                c_lo, c_hi = span
+                s_lo, s_hi = self._time_bounds(self.grid_starts[c_lo:c_hi], t0, t1, point)
+                if s_hi > s_lo:
+                    slices.append((c_lo + s_lo, c_lo + s_hi))
+            # Use the grid only when it narrows things down more than the time index
+            if sum(b - a for a, b in slices) < hi - lo:
+                rows = np.sort(np.concatenate([self.grid_rows[a:b] for a, b in slices])) if slices \
+                    else np.empty(0, dtype=np.int64)
+        if rows is None:
+            rows = np.arange(lo, hi)
+
+        if t0 != -math.inf:
+            rows = rows[self.end[rows] > t0]
+        if bbox is not None:
+            lon, lat = self.lon[rows], self.lat[rows]
+            rows = rows[(lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat) & (lat <= max_lat)]
+        if user is not None:
+            if 'user_id' not in self.data:
+                raise QueryError("This dataset has no user_id column")
+            rows = rows[self.data['user_id'][rows] == user]
+        return rows
+
+    def columnar(self, rows: np.ndarray, fields: Sequence[str]) -> Dict:
+        columns = {}
+        for name in fields:
+            values = self.data[name][rows]
+            if name in self.dictionaries:
+                dictionary = self.dictionaries[name]
+                codes, inverse = np.unique(values, return_inverse=True)
+                columns[name] = {'dictionary': [dictionary[c] for c in codes.tolist()],
+                                 'codes': inverse.tolist()}
+                continue
+            if name == 'sentiment_score':
+                values = np.round(values.astype(np.float64), SENTIMENT_DECIMALS)
+            elif name in TIME_COLUMNS and np.all(values == np.floor(values)):
+                values = values.astype(np.int64)
+            elif name == 'user_id':
+                values = np.where(values == MISSING_INT, None, values)  # Object array -> null
+            elif values.dtype.kind == 'f' and np.isnan(values).any():
+                values = np.where(np.isnan(values), None, values)
+            columns[name] = values.tolist()
+        return {'count': len(rows), 'fields': list(fields), 'time_unit': 's', 'columns': columns}
+
+    def records(self, rows: np.ndarray, fields: Sequence[str]) -> List[Dict]:
+        """Interval dicts in the intervals.json schema"""
+        columns = self.columnar(rows, fields)['columns']
+        decoded = {}
+        for name in fields:
+            values = columns[name]
+            if isinstance(values, dict):
+                dictionary = values['dictionary']
+                values = [dictionary[c] for c in values['codes']]
+            elif name in TIME_COLUMNS:
+                values = [from_epoch_seconds(v) for v in values]
+            decoded[name] = values
+        result = []
+        for i in range(len(rows)):
+            record = {}
+            for name in fields:
+                value = decoded[name][i]
+                if value is not None:
+                    record[name] = value
+            result.append(record)
+        return result
+
+    def stats(self) -> Dict:
+        return {
+            'count': self.count,
+            'fields': self.fields,
+            'start': from_epoch_seconds(float(self.start[0])) if self.count else None,
+            'end': from_epoch_seconds(float(self.end.max())) if self.count else None,
+            'max_duration_minutes': self.max_duration / 60,
+            'cell_size': self.cell_size,
+            'cells': len(self.cells)
+        }
+
+
+class LRUCache:
+    """Thread-safe LRU of encoded response bodies, bounded by entry count and total bytes"""
+    def __init__(self, max_entries: int = DEFAULT_CACHE_ENTRIES, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries: 'OrderedDict[tuple, bytes]' = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        with self.lock:
+            body = self.entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: tuple, body: bytes):
+        if self.max_entries <= 0 or len(body) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = body
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle on, keep-alive clients wait
+    # for a delayed ACK (~40 ms) on every response
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        accepts_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if url.path == '/stats':
+            self._send(200, self._encode(dict(self.server.index.stats(), cache=self.server.cache.stats())), False)
+            return
+        if url.path not in ('/intervals', '/at'):
+            self._send(404, self._encode({'message': 'Not Found'}), False)
+            return
+
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        # Equivalent queries share an entry regardless of parameter order
+        key = (url.path, tuple(sorted(params.items())), accepts_gzip)
+        cache = self.server.cache
+        body = cache.get(key)
+        if body is None:
+            try:
+                with metrics.span('query'):
+                    body = self._encode(self._answer(url.path, params))
+            except QueryError as e:
+                self._send(400, self._encode({'message': str(e)}), False)
+                return
+            if accepts_gzip and len(body) >= GZIP_MIN_BYTES:
+                body = gzip.compress(body, GZIP_LEVEL)
+            cache.put(key, body)
+        metrics.count('queries')
+        self._send(200, body, accepts_gzip and body[:2] == b'\x1f\x8b')
+
+    def _answer(self, path: str, params: Dict[str, str]) -> Dict:
+        index = self.server.index
+        unknown = set(params) - {'start', 'end', 'time', 'bbox', 'user', 'fields', 'format', 'limit'}
+        if unknown:
+            raise QueryError(f"Unknown parameter(s): {', '.join(sorted(unknown))}")
+        bbox = parse_bbox(params['bbox']) if 'bbox' in params else None
+        try:
+            user = int(params['user']) if 'user' in params else None
+        except ValueError:
+            raise QueryError("user must be an integer") from None
+        limit = parse_limit(params['limit']) if 'limit' in params else self.server.limit
+        fields = params['fields'].split(',') if 'fields' in params else index.fields
+        missing = [name for name in fields if name not in index.data]
+        if missing:
+            raise QueryError(f"Unknown field(s): {', '.join(missing)}")
+        fmt = params.get('format', 'columnar')
+        if fmt not in ('columnar', 'records'):
+            raise QueryError("format must be columnar or records")
+
+        if path == '/at':
+            if 'time' not in params:
+                raise QueryError("/at needs a time parameter")
+            rows = index.query(bbox=bbox, user=user, at=parse_time(params['time']))
+        else:
+            start = parse_time(params['start']) if 'start' in params else None
+            end = parse_time(params['end']) if 'end' in params else None
+            rows = index.query(start, end, bbox=bbox, user=user)
+        metrics.count('rows_returned', min(len(rows), limit))
+
+        truncated = len(rows) > limit
+        rows = rows[:limit]
+        if fmt == 'records':
+            return {'count': len(rows), 'truncated': truncated, 'intervals': index.records(rows, fields)}
+        result = index.columnar(rows, fields)
+        result['truncated'] = truncated
+        return result
+
+    @staticmethod
+    def _encode(body: Dict) -> bytes:
+        return json.dumps(body, separators=(',', ':')).encode('utf-8')
+
+    def _send(self, status: int, payload: bytes, gzipped: bool):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('Access-Control-Allow-Origin', '*')  # Vite dev server runs on another port
+        self.send_header('Vary', 'Accept-Encoding')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output readable
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], index: IntervalIndex, cache_entries: int = DEFAULT_CACHE_ENTRIES,
+                 cache_bytes: int = DEFAULT_CACHE_BYTES, limit: int = DEFAULT_LIMIT):
+        super().__init__(address, QueryHandler)
+        self.index = index
+        self.cache = LRUCache(cache_entries, cache_bytes)
+        self.limit = limit
+
+def start_query_server(index: IntervalIndex, host: str = '127.0.0.1', port: int = 0, **options):
+    """
+    Start a query server on a background thread
+    Returns (server, base_url); call server.shutdown() when done
+    """
+    server = QueryServer((host, port), index, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def _benchmark(index: IntervalIndex, base_url: str, queries: int, seed: int = 0):
+    """Random day windows, bbox windows and point lookups; prints latency percentiles"""
+    import requests
+
+    rng = random.Random(seed)
+    t0, t1 = float(index.start[0]), float(index.end.max())
+    lon0, lon1 = float(np.nanmin(index.lon)), float(np.nanmax(index.lon))
+    lat0, lat1 = float(np.nanmin(index.lat)), float(np.nanmax(index.lat))
+    kinds = {
+        'day window': lambda t: {'start': t, 'end': t + 86400},
+        'hour + bbox': lambda t: {'start': t, 'end': t + 3600,
+                                  'bbox': f"{lon0},{lat0},{(lon0 + lon1) / 2},{(lat0 + lat1) / 2}"},
+        'point (/at)': lambda t: {'time': t}
+    }
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = 'gzip'
+    print(f"{'query':16s}{'p50 ms':>10s}{'p95 ms':>10s}{'rows/query':>12s}")
+    for kind, make in kinds.items():
+        latencies, rows = [], 0
+        for _ in range(queries):
+            params = make(round(rng.uniform(t0, t1)))
+            path = '/at' if 'time' in params else '/intervals'
+            start = time.perf_counter()
+            response = session.get(base_url + path, params=params)
+            latencies.append((time.perf_counter() - start) * 1000)
+            response.raise_for_status()
+            rows += response.json()['count']
+        latencies.sort()
+        print(f"{kind:16s}{latencies[len(latencies) // 2]:>10.2f}{latencies[int(len(latencies) * 0.95)]:>10.2f}"
+              f"{rows / queries:>12,.0f}")
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Serve time-window, bbox and point-in-time interval queries')
+    parser.add_argument('--intervals', default=os.path.join(script_dir, 'intervals.json'),
+                        help='intervals.json-style file or intervals.bin')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--cell-size', type=float, default=DEFAULT_CELL_SIZE, help='Grid cell size in degrees')
+    parser.add_argument('--cache-entries', type=int, default=DEFAULT_CACHE_ENTRIES)
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_CACHE_BYTES / (1 << 20))
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help='Default maximum rows per response')
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help='Run N random queries of each kind against the server, print latencies and exit')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args):
+        with metrics.span('load'):
+            start = time.perf_counter()
+            index = IntervalIndex(open_intervals(args.intervals), args.cell_size)
+        print(f"Indexed {index.count:,} intervals into {len(index.cells):,} grid cells "
+              f"in {time.perf_counter() - start:.2f}s")
+        options = dict(cache_entries=args.cache_entries, cache_bytes=int(args.cache_mb * (1 << 20)),
+                       limit=args.limit)
+        if args.benchmark:
+            server, base_url = start_query_server(index, args.host, 0, **options)
+            _benchmark(index, base_url, args.benchmark)
+            server.shutdown()
+        else:
+            server = QueryServer((args.host, args.port), index, **options)
+            print(f"Interval query server listening on http://{args.host}:{args.port}")
+            print(f"Try: http://{args.host}:{args.port}/intervals?start=2024-11-19T08:00:00&end=2024-11-19T12:00:00")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
@@ -0,0 +1,193 @@
+"""
+Precompute a duration-weighted sentiment cube over (location, day, hour-bucket)
+Runs after interval generation and makes one streaming pass over the intervals.
+Lifetime and daily views can then read these aggregates instead of rescanning raw
+intervals (aggregateByTimeBuckets, aggregateIntervalsByLocation, getBuildingSentiment).
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from artifacts import ArtifactFile, publish_artifacts
+from json_stream import JsonArrayWriter, iter_json_array
+from pipeline_metrics import add_metrics_arguments, instrumented, metrics
+
+DEFAULT_BUCKET_SIZES = (1, 3, 6)
+
+# All travel points roll up into one pseudo-location instead of one per route point
+TRAVEL_KEY = 'traveling'
+
+def location_key(interval: Dict) -> str:
+    """Stay locations are grouped at 5 decimals (~1 m), like aggregateIntervalsByLocation"""
+    if interval.get('location_name') == 'Traveling' or interval.get('location_type') == 'traveling':
+        return TRAVEL_KEY
+    return f"{interval['latitude']:.5f},{interval['longitude']:.5f}"
+
+
+class _Accumulator:
+    """Running totals for one cube cell"""
+    __slots__ = ('weighted_sum', 'total_duration', 'count')
+
+    def __init__(self):
+        self.weighted_sum = 0.0
+        self.total_duration = 0.0
+        self.count = 0
+
+    def add(self, sentiment: float, duration: float):
+        self.weighted_sum += sentiment * duration
+        self.total_duration += duration
+        self.count += 1
+
+    def row(self) -> List:
+        # Same weighting as the bucket tooltips: sum(sentiment * duration) / sum(duration)
+        avg = self.weighted_sum / self.total_duration if self.total_duration > 0 else 0
+        return [round(avg, 6), self.count, round(self.total_duration, 4)]
+
+def bucket_parts(start_time: datetime, duration: float, size: int) -> Iterable[Tuple[int, int, float]]:
+    """
+    Split [start_time, start_time + duration minutes) at size-hour bucket edges
+
+    Yields (day offset from start_time's date, bucket start hour, minutes inside the bucket).
+    A zero-length interval yields its start bucket with 0 minutes.
+    """
+    per_day = 24 // size
+    length = size * 60
+    begin = start_time.hour * 60 + start_time.minute + (start_time.second + start_time.microsecond / 1e6) / 60
+    end = begin + duration
+    k = int(begin // length)
+    while True:
+        part = min(end, (k + 1) * length) - max(begin, k * length)
+        yield k // per_day, (k % per_day) * size, part
+        k += 1
+        if k * length >= end:
+            break
+
+def rollup_intervals(intervals: Iterable[Dict], output_file: str,
+                     bucket_sizes: Sequence[int] = DEFAULT_BUCKET_SIZES) -> Dict:
+    """
+    Aggregate intervals into per-day and lifetime cubes at several bucket sizes
+
+    Intervals must be sorted by start_time (as the generators write them). Each interval is
+    split at bucket and midnight boundaries, and every part is weighted by the minutes it
+    covers; count is the number of intervals overlapping a cell. A day's cells are written out
+    once intervals start on a later day, so memory is bounded by the days an interval can
+    reach plus the lifetime totals, regardless of how many years or users the input covers.
+
+    Output rows:
+        rows:     [bucket_size, location_id, day, bucket_start_hour, avg_sentiment, count, total_duration]
+        lifetime: [bucket_size, location_id, bucket_start_hour, avg_sentiment, count, total_duration]
+    location_id indexes the 'locations' list.
+
+    Returns:
+        Dict with input count, output row counts and elapsed seconds
+    """
+    for size in bucket_sizes:
+        if size <= 0 or 24 % size:
+            raise ValueError(f"Bucket size must divide 24 hours, got {size}")
+
+    locations: Dict[str, int] = {}
+    location_info: List[Dict] = []
+    lifetime: Dict[Tuple[int, int, int], _Accumulator] = {}
+    # day -> cells; an interval can run past midnight, so days after the current one may be open
+    day_cells: Dict[str, Dict[Tuple[int, int, int], _Accumulator]] = {}
+    current_day = None
+    interval_count = 0
+    start = time.perf_counter()
+
+    with ArtifactFile(output_file) as f:
+        f.write('{"bucket_sizes":' + json.dumps(list(bucket_sizes)))
+        f.write(',"columns":["bucket_size","location","day","bucket","avg_sentiment","count","total_duration"]')
+        f.write(',"rows":')
+        rows = JsonArrayWriter(f, indent=None)
+
+        def flush_days(before=None):
+            for day in sorted(day_cells):
+                if before is not None and day >= before:
+                    break
+                for (size, loc_id, bucket), acc in sorted(day_cells.pop(day).items()):
+                    rows.write([size, loc_id, day, bucket] + acc.row())
+
+        for interval in intervals:
+            interval_count += 1
+            start_time = datetime.fromisoformat(interval['start_time'])
+            day = start_time.date().isoformat()
+            if day != current_day:
+                if current_day is not None and day < current_day:
+                    raise ValueError(f"Intervals must be sorted by start_time ({day} after {current_day})")
+                flush_days(before=day)
+                current_day = day
+
+            key = location_key(interval)
+            loc_id = locations.get(key)
+            if loc_id is None:
+                loc_id = locations[key] = len(location_info)
+                location_info.append({
+                    'key': key,
+                    'name': 'Traveling' if key == TRAVEL_KEY else interval.get('location_name'),
+                    'type': TRAVEL_KEY if key == TRAVEL_KEY else interval.get('location_type'),
+                    'latitude': None if key == TRAVEL_KEY else interval['latitude'],
+                    'longitude': None if key == TRAVEL_KEY else interval['longitude']
+                })
+
+            sentiment = interval['sentiment_score']
+            duration = interval.get('duration_minutes') or 0
+            for size in bucket_sizes:
+                for day_offset, bucket, minutes in bucket_parts(start_time, duration, size):
+                    cell_day = day
+                    if day_offset:
+                        cell_day = (start_time.date() + timedelta(days=day_offset)).isoformat()
+                    cells = day_cells.get(cell_day)
+                    if cells is None:
+                        cells = day_cells[cell_day] = {}
+                    cell = (size, loc_id, bucket)
+                    acc = cells.get(cell)
+                    if acc is None:
+                        acc = cells[cell] = _Accumulator()
+                    acc.add(sentiment, minutes)
+                    acc = lifetime.get(cell)
+                    if acc is None:
+                        acc = lifetime[cell] = _Accumulator()
+                    acc.add(sentiment, minutes)
+
+        flush_days()
+        rows.close()
+
+        f.write(',"lifetime_columns":["bucket_size","location","bucket","avg_sentiment","count","total_duration"]')
+        f.write(',"lifetime":')
+        json.dump([[size, loc_id, bucket] + acc.row() for (size, loc_id, bucket), acc in sorted(lifetime.items())],
+                  f, separators=(',', ':'))
+        f.write(',"locations":')
+        json.dump(location_info, f, separators=(',', ':'))
+        f.write('}')
+
+    elapsed = time.perf_counter() - start
+    metrics.add_time('rollup', elapsed)
+    metrics.count('intervals_read', interval_count)
+    metrics.count('rollup_rows', rows.count + len(lifetime))
+    print(f"Rolled up {interval_count} intervals into {rows.count} daily cells and "
+          f"{len(lifetime)} lifetime cells over {len(location_info)} locations ({elapsed:.2f}s)")
+    return {'intervals': interval_count, 'daily_rows': rows.count, 'lifetime_rows': len(lifetime),
+            'locations': len(location_info), 'seconds': elapsed}
+
+if __name__ == '__main__':
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Build a time-bucket sentiment rollup cube from intervals')
+    parser.add_argument('--intervals', default=os.path.join(script_dir, 'intervals.json'))
+    parser.add_argument('--output', default=os.path.join(script_dir, 'rollup.json'))
+    parser.add_argument('--bucket-sizes', default=','.join(str(s) for s in DEFAULT_BUCKET_SIZES),
+                        help='Comma-separated bucket sizes in hours (each must divide 24)')
+    parser.add_argument('--publish', nargs='?', const=os.path.join(os.path.dirname(script_dir), 'public'),
+                        metavar='PUBLIC_DIR', help='Also publish the output to PUBLIC_DIR (with .gz/.br variants)')
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    with instrumented(args):
+        sizes = [int(s) for s in args.bucket_sizes.split(',')]
+        rollup_intervals(iter_json_array(args.intervals), args.output, sizes)
+        print(f"\nSaved to: {args.output}")
+        if args.publish:
+            publish_artifacts([(args.output, os.path.basename(args.output))], args.publish)
@@ -0,0 +1,207 @@
+"""
+Persistent on-disk cache for Mapbox route geometries
+SQLite-backed so repeated generation runs (and offline CI) reuse routes instead of
+calling the Directions API again
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from typing import Dict, List, Optional
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(script_dir, 'route_cache.sqlite')
+
+# Coordinates are rounded before keying so float noise does not cause misses
+KEY_PRECISION = 6
+
+def route_key(start_lat: float, start_lon: float, end_lat: float, end_lon: float, profile: str) -> str:
+    """Cache key for a route: rounded origin/destination plus routing profile"""
+    p = KEY_PRECISION
+    return (f"{round(start_lat, p)},{round(start_lon, p)}_"
+            f"{round(end_lat, p)},{round(end_lon, p)}_{profile}")
+
+def encode_geometry(coords: List[List[float]]) -> bytes:
+    """Pack [lon, lat] pairs as zlib-compressed little-endian float64 (lossless)"""
+    flat = array('d', (value for point in coords for value in point[:2]))
+    if flat.itemsize != 8:
+        raise RuntimeError("float64 array support required")
+    return zlib.compress(flat.tobytes())
+
+def decode_geometry(blob: bytes) -> List[List[float]]:
+    flat = array('d')
+    flat.frombytes(zlib.decompress(blob))
+    return [[flat[i], flat[i + 1]] for i in range(0, len(flat), 2)]
+
+
+class RouteCache:
+    """
+    Route geometry cache stored in a SQLite database
+
+    Entries expire after ttl_seconds (if set) and the least recently used entries are
+    evicted once the cache exceeds max_entries or max_bytes of geometry. WAL mode and
+    immediate write transactions make it safe for several processes/threads to share
+    one cache file.
+    """
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[float] = None,
+                 max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.writes = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS routes (
+                key TEXT PRIMARY KEY,
+                profile TEXT NOT NULL,
+                geometry BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )''')
+        conn.execute('CREATE INDEX IF NOT EXISTS routes_last_access ON routes (last_access)')
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections must not be shared across threads"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def _count(self, attr: str, n: int = 1):
+        with self._stats_lock:
+            setattr(self, attr, getattr(self, attr) + n)
+
+    def get(self, key: str) -> Optional[List[List[float]]]:
+        """Return the cached route for key, or None on a miss or expired entry"""
+        conn = self._conn()
+        row = conn.execute('SELECT geometry, created_at FROM routes WHERE key = ?', (key,)).fetchone()
+        now = time.time()
+        if row is None:
+            self._count('misses')
+            return None
+        geometry, created_at = row
+        if self.ttl_seconds is not None and now - created_at > self.ttl_seconds:
+            conn.execute('DELETE FROM routes WHERE key = ?', (key,))
+            self._count('expired')
+            self._count('misses')
+            return None
+        conn.execute('UPDATE routes SET last_access = ? WHERE key = ?', (now, key))
+        self._count('hits')
+        return decode_geometry(geometry)
+
+    def put(self, key: str, coords: List[List[float]], profile: str = ''):
+        """Store a route and evict least recently used entries if over the size limits"""
+        blob = encode_geometry(coords)
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO routes (key, profile, geometry, size, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, profile, blob, len(blob), now, now))
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._count('writes')
+
+    def _evict(self, conn: sqlite3.Connection):
+        evicted = 0
+        if self.max_entries is not None:
+            evicted += conn.execute(
+                'DELETE FROM routes WHERE key IN '
+                '(SELECT key FROM routes ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)).rowcount
+        if self.max_bytes is not None:
+            evicted += conn.execute(
+                'DELETE FROM routes WHERE key IN (SELECT key FROM '
+                '(SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS running FROM routes) '
+                'WHERE running > ?)',
+                (self.max_bytes,)).rowcount
+        if evicted:
+            self._count('evictions', evicted)
+
+    def purge_expired(self) -> int:
+        """Delete all entries older than the TTL; returns the number removed"""
+        if self.ttl_seconds is None:
+            return 0
+        removed = self._conn().execute('DELETE FROM routes WHERE created_at < ?',
+                                       (time.time() - self.ttl_seconds,)).rowcount
+        self._count('expired', removed)
+        return removed
+
+    def stats(self) -> Dict:
+        entries, total_bytes = self._conn().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM routes').fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'geometry_bytes': total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'writes': self.writes
+        }
+
+    def export_json(self, output_file: str) -> int:
+        """Dump all routes to a JSON fixture (for seeding caches in CI)"""
+        rows = self._conn().execute('SELECT key, profile, geometry FROM routes ORDER BY key').fetchall()
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump([{'key': key, 'profile': profile, 'coordinates': decode_geometry(geometry)}
+                       for key, profile, geometry in rows], f)
+        return len(rows)
+
+    def import_json(self, input_file: str) -> int:
+        """Load routes from a JSON fixture written by export_json"""
+        with open(input_file, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        for entry in entries:
+            self.put(entry['key'], entry['coordinates'], entry.get('profile', ''))
+        return len(entries)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspect and manage the persistent route cache')
+    parser.add_argument('command', choices=['stats', 'export', 'import', 'purge'])
+    parser.add_argument('file', nargs='?', help='JSON fixture for export/import')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH)
+    parser.add_argument('--ttl-days', type=float, default=None)
+    args = parser.parse_args()
+
+    ttl = args.ttl_days * 86400 if args.ttl_days is not None else None
+    cache = RouteCache(args.cache, ttl_seconds=ttl)
+    if args.command in ('export', 'import') and not args.file:
+        parser.error(f"{args.command} requires a JSON file path")
+
+    if args.command == 'export':
+        print(f"Exported {cache.export_json(args.file)} routes to {args.file}")
+    elif args.command == 'import':
+        print(f"Imported {cache.import_json(args.file)} routes into {args.cache}")
+    elif args.command == 'purge':
+        print(f"Removed {cache.purge_expired()} expired routes")
+    print(json.dumps(cache.stats(), indent=2))
@@ -0,0 +1,243 @@
+"""
+Batch route fetching for the interval generator
+Fetches every unique (from, to, profile) route concurrently over pooled keep-alive
+connections, with a request-rate cap and retries with exponential backoff
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from pipeline_metrics import metrics
+from route_cache import RouteCache, route_key
+
+DEFAULT_API_URL = os.environ.get('MAPBOX_API_URL', 'https://api.mapbox.com')
+
+# (start_lat, start_lon, end_lat, end_lon, profile)
+RouteRequest = Tuple[float, float, float, float, str]
+
+# Status codes worth retrying: rate limited or transient server errors
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def directions_url(api_url: str, start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+                   profile: str) -> str:
+    return f"{api_url.rstrip('/')}/directions/v5/mapbox/{profile}/{start_lon},{start_lat};{end_lon},{end_lat}"
+
+def parse_route(data: Dict) -> Optional[List[List[float]]]:
+    """Extract [lon, lat] coordinates of the first route in a Directions response"""
+    if data.get('routes') and len(data['routes']) > 0:
+        return data['routes'][0]['geometry']['coordinates']
+    return None
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all worker threads
+    Allows bursts of up to `burst` requests, refilling at `rate` requests per second
+    """
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RouteFetcher:
+    """
+    Concurrent Directions API client
+    Each worker thread keeps its own requests.Session, so connections are reused
+    (keep-alive) without sharing a session across threads.
+    """
+    def __init__(self, token: str, api_url: str = DEFAULT_API_URL, max_workers: int = 8,
+                 rate_limit: Optional[float] = 10.0, retries: int = 3, backoff: float = 0.5,
+                 timeout: float = 10.0):
+        self.token = token
+        self.api_url = api_url
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(rate_limit, burst=max_workers)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._jitter = random.Random()  # Private stream so retries don't disturb generator sampling
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0, 'fetched': 0}
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._local.session = session
+        return session
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def fetch(self, start_lat: float, start_lon: float, end_lat: float, end_lon: float,
+              profile: str = 'walking') -> Optional[List[List[float]]]:
+        """
+        Fetch one route, retrying transient failures with exponential backoff
+        Returns None if the route could not be fetched (network errors after all retries,
+        non-retryable status codes or malformed responses), so callers fall back to
+        linear interpolation
+        """
+        url = directions_url(self.api_url, start_lat, start_lon, end_lat, end_lon, profile)
+        params = {
+            'access_token': self.token,
+            'geometries': 'geojson',
+            'steps': 'true'
+        }
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._count('retries')
+            self.limiter.acquire()
+            self._count('requests')
+            retry_after = None
+            try:
+                response = self._session().get(url, params=params, timeout=self.timeout)
+                if response.status_code == 200:
+                    route = parse_route(response.json())
+                    self._count('fetched')
+                    return route
+                if response.status_code not in RETRY_STATUS:
+                    print(f"API error {response.status_code}: {response.text[:200]}")
+                    break
+                retry_after = response.headers.get('Retry-After')
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                # A 200 with a body that is not JSON or has no route geometry; retrying won't help
+                print(f"Malformed route response: {e!r}")
+                break
+            except requests.RequestException as e:
+                print(f"Error getting route (attempt {attempt + 1}): {e}")
+            if attempt < self.retries:
+                delay = self.backoff * (2 ** attempt) * (1 + self._jitter.random() * 0.25)
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                time.sleep(delay)
+        self._count('failures')
+        return None
+
+    def fetch_many(self, route_requests: Iterable[RouteRequest]) -> Dict[str, Optional[List[List[float]]]]:
+        """Fetch all requests concurrently; returns {route_key: coordinates or None}"""
+        unique = {route_key(*req): req for req in route_requests}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(lambda req: self.fetch(*req), unique.values())
+            return dict(zip(unique.keys(), results))
+
+@metrics.timed('route_fetch')
+def fetch_routes(route_requests: Iterable[RouteRequest], token: str,
+                 route_cache: Optional[RouteCache] = None, offline: bool = False,
+                 **fetcher_options) -> Dict[str, Optional[List[List[float]]]]:
+    """
+    Resolve every unique route, from the cache where possible and concurrently otherwise
+
+    Args:
+        route_requests: (start_lat, start_lon, end_lat, end_lon, profile) tuples; duplicates are fine
+        token: Mapbox access token
+        route_cache: Persistent cache consulted first and updated with fetched routes
+        offline: Never call the API; uncached routes resolve to None
+        **fetcher_options: Passed to RouteFetcher (api_url, max_workers, rate_limit, retries, ...)
+
+    Returns:
+        {route_key: [lon, lat] coordinates, or None when unavailable (callers fall back
+        to linear interpolation)}
+    """
+    unique = {route_key(*req): req for req in route_requests}
+    routes: Dict[str, Optional[List[List[float]]]] = {}
+    missing = []
+    for key, req in unique.items():
+        route = route_cache.get(key) if route_cache is not None else None
+        routes[key] = route
+        if route is None:
+            missing.append(req)
+    metrics.count('route_cache_hits', len(unique) - len(missing))
+    metrics.count('route_cache_misses', len(missing))
+
+    if not missing:
+        return routes
+    if offline:
+        print(f"Offline: {len(missing)} routes not cached, using linear interpolation for them")
+        return routes
+
+    fetcher = RouteFetcher(token, **fetcher_options)
+    print(f"Fetching {len(missing)} routes with {fetcher.max_workers} workers...")
+    start = time.perf_counter()
+    fetched = fetcher.fetch_many(missing)
+    elapsed = time.perf_counter() - start
+    for key, route in fetched.items():
+        routes[key] = route
+        if route and route_cache is not None:
+            route_cache.put(key, route, unique[key][4])
+    stats = fetcher.stats
+    metrics.count('api_calls', stats['requests'])
+    metrics.count('api_retries', stats['retries'])
+    metrics.count('api_failures', stats['failures'])
+    print(f"Fetched {stats['fetched']}/{len(missing)} routes in {elapsed:.2f}s "
+          f"({stats['requests']} requests, {stats['retries']} retries, {stats['failures']} failures)")
+    return routes
+
+def _benchmark(num_pairs: int, workers: List[int], rate_limit: Optional[float], latency_ms: float,
+               failure_rate: float, seed: int):
+    """Fetch random pairs from a local stand-in server with varying worker counts"""
+    from directions_stub_server import start_stub_server
+
+    rng = random.Random(seed)
+    pairs = [(34.02 + rng.uniform(-0.02, 0.02), -118.28 + rng.uniform(-0.02, 0.02),
+              34.02 + rng.uniform(-0.02, 0.02), -118.28 + rng.uniform(-0.02, 0.02),
+              rng.choice(['walking', 'driving'])) for _ in range(num_pairs)]
+
+    server, api_url = start_stub_server(latency_ms=latency_ms, failure_rate=failure_rate, seed=seed)
+    try:
+        for count in workers:
+            fetcher = RouteFetcher('stub-token', api_url=api_url, max_workers=count,
+                                   rate_limit=rate_limit, retries=3, backoff=0.05)
+            start = time.perf_counter()
+            results = fetcher.fetch_many(pairs)
+            elapsed = time.perf_counter() - start
+            ok = sum(1 for route in results.values() if route)
+            print(f"workers={count:3d}: {ok}/{len(results)} routes in {elapsed:.2f}s "
+                  f"({len(results) / elapsed:,.1f} routes/s, {fetcher.stats['retries']} retries, "
+                  f"{fetcher.stats['failures']} failures)")
+    finally:
+        server.shutdown()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark concurrent route fetching against a local stand-in server')
+    parser.add_argument('--pairs', type=int, default=200)
+    parser.add_argument('--workers', default='1,4,16', help='Comma-separated worker counts to compare')
+    parser.add_argument('--rate', type=float, default=None, help='Request-rate cap (requests/s)')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Simulated server latency')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests answered with 503')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    _benchmark(args.pairs, [int(w) for w in args.workers.split(',')], args.rate,
+               args.latency_ms, args.failure_rate, args.seed)
@@ -0,0 +1,168 @@
+"""
+Vectorized route interpolation
+Resamples many routes to evenly spaced points in one NumPy pass using cumulative
+distances and searchsorted, instead of rescanning segments for every output point
+"""
+import argparse
+import random
+import time
+from typing import List, Sequence, Union
+
+import numpy as np
+
+def interpolate_routes(routes: Sequence[Sequence[Sequence[float]]],
+                       num_points: Union[int, Sequence[int]]) -> List[np.ndarray]:
+    """
+    Interpolate evenly spaced points along each route
+
+    Args:
+        routes: Routes as sequences of [lon, lat] coordinates
+        num_points: Points to generate per route (one value for all routes, or one per route)
+
+    Returns:
+        One float64 array of shape (n, 2) holding [lon, lat] rows per route. Routes with
+        fewer than 2 coordinates give an empty array; zero-length routes give their first point
+    """
+    if isinstance(num_points, (int, np.integer)):
+        num_points = [num_points] * len(routes)
+    if len(num_points) != len(routes):
+        raise ValueError("num_points must match the number of routes")
+
+    results: List[np.ndarray] = [np.empty((0, 2))] * len(routes)
+    arrays, counts, slots = [], [], []
+    for k, route in enumerate(routes):
+        if route is None or len(route) < 2:
+            continue
+        arrays.append(np.asarray(route, dtype=np.float64)[:, :2])
+        counts.append(max(int(num_points[k]), 0))
+        slots.append(k)
+    if not arrays:
+        return results
+
+    coords = np.concatenate(arrays)
+    lengths = np.array([len(a) for a in arrays])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    ends = starts + lengths - 1  # Index of each route's last coordinate
+
+    # Segment lengths along the concatenated coordinates; the joins between routes get 0
+    # so cumulative distance stays monotonic and each route occupies its own range
+    delta = np.diff(coords, axis=0)
+    seg = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
+    seg[ends[:-1]] = 0.0
+    cum = np.concatenate([[0.0], np.cumsum(seg)])
+
+    base = cum[starts]
+    totals = cum[ends] - base
+    zero_length = totals == 0
+    counts = np.array(counts)
+    counts[zero_length] = 1
+
+    # Target distance for every output point, as a fraction of its route's length
+    route_of_point = np.repeat(np.arange(len(arrays)), counts)
+    first_point = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    step = np.arange(counts.sum()) - first_point[route_of_point]
+    denom = np.maximum(counts - 1, 1)[route_of_point]
+    fraction = np.where(counts[route_of_point] > 1, step / denom, 0.0)
+    targets = base[route_of_point] + fraction * totals[route_of_point]
+
+    # First coordinate whose cumulative distance reaches the target ends the segment
+    point_start = starts[route_of_point]
+    point_end = ends[route_of_point]
+    hit = np.searchsorted(cum, targets, side='left')
+    hit = np.clip(hit, point_start + 1, point_end)
+    j = hit - 1
+    seg_len = seg[j]
+    safe_len = np.where(seg_len > 0, seg_len, 1.0)
+    progress = np.where(seg_len > 0, (targets - cum[j]) / safe_len, 0.0)
+    points = coords[j] + (coords[j + 1] - coords[j]) * progress[:, None]
+
+    # Floating point overshoot past the end of a route snaps to its last coordinate
+    overshoot = targets > cum[point_end]
+    points[overshoot] = coords[point_end[overshoot]]
+
+    for k, chunk in zip(slots, np.split(points, np.cumsum(counts)[:-1])):
+        results[k] = chunk
+    return results
+
+def _interpolate_route_points_loop(route_coords, num_points):
+    """
+    Original pure-Python implementation, kept as the reference for equality checks
+    """
+    if not route_coords or len(route_coords) < 2:
+        return []
+
+    points = []
+    total_distance = 0
+    segment_distances = []
+
+    for i in range(len(route_coords) - 1):
+        lon1, lat1 = route_coords[i]
+        lon2, lat2 = route_coords[i + 1]
+        dist = ((lat2 - lat1)**2 + (lon2 - lon1)**2)**0.5
+        total_distance += dist
+        segment_distances.append(dist)
+
+    if total_distance == 0:
+        return [{'lat': route_coords[0][1], 'lon': route_coords[0][0]}]
+
+    for i in range(num_points):
+        target_dist = (i / (num_points - 1)) * total_distance if num_points > 1 else 0
+        cumulative = 0
+        for j, seg_dist in enumerate(segment_distances):
+            if cumulative + seg_dist >= target_dist:
+                progress = (target_dist - cumulative) / seg_dist if seg_dist > 0 else 0
+                lon1, lat1 = route_coords[j]
+                lon2, lat2 = route_coords[j + 1]
+                points.append({
+                    'lat': lat1 + (lat2 - lat1) * progress,
+                    'lon': lon1 + (lon2 - lon1) * progress
+                })
+                break
+            cumulative += seg_dist
+        else:
+            lon, lat = route_coords[-1]
+            points.append({'lat': lat, 'lon': lon})
+
+    return points
+
+def check_against_loop(num_routes: int = 2000, seed: int = 0, atol: float = 1e-12) -> int:
+    """
+    Compare interpolate_routes with the original loop on random routes
+    Includes repeated points, single points and zero-length routes
+    Returns the number of points compared; raises AssertionError on mismatch
+    """
+    rng = random.Random(seed)
+    routes, counts = [], []
+    for _ in range(num_routes):
+        length = rng.choice([0, 1, 2, 3, 5, 20, 80])
+        lon, lat = -118.28 + rng.uniform(-0.01, 0.01), 34.02 + rng.uniform(-0.01, 0.01)
+        route = []
+        for _ in range(length):
+            if not route or rng.random() > 0.1:  # Occasionally repeat a point
+                lon += rng.uniform(-0.001, 0.001)
+                lat += rng.uniform(-0.001, 0.001)
+            route.append([lon, lat])
+        if length and rng.random() < 0.05:
+            route = [route[0]] * length  # Zero-length route
+        routes.append(route)
+        counts.append(rng.choice([1, 2, 3, 10, 47]))
+
+    compared = 0
+    for route, count, result in zip(routes, counts, interpolate_routes(routes, counts)):
+        expected = _interpolate_route_points_loop(route, count)
+        assert len(expected) == len(result), f"length mismatch: {len(expected)} != {len(result)}"
+        if expected:
+            expected_arr = np.array([[p['lon'], p['lat']] for p in expected])
+            assert np.allclose(result, expected_arr, rtol=0, atol=atol), "coordinate mismatch"
+        compared += len(expected)
+    return compared
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check vectorized route interpolation against the loop version')
+    parser.add_argument('--routes', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    compared = check_against_loop(args.routes, args.seed)
+    print(f"OK: {compared} points across {args.routes} routes match ({time.perf_counter() - start:.2f}s)")
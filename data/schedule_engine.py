@@ -0,0 +1,198 @@
+"""
+Declarative day schedules compiled into flat timelines
+
+A schedule spec lists the stays of a typical day, each with its arrival time ('at'), and
+rules that change those stays on weekends, given weekdays or specific dates. Travel is never
+written by hand. The compiler inserts it between consecutive stays at different locations,
+ending at the next arrival, so moving a stay moves its travel with it. A stay with an
+'until' time sets its own departure instead, and the next stay's arrival follows from it.
+
+Spec format (times are (hour, minute) tuples or 'HH:MM' strings):
+
+    {
+        'travel_minutes': {'walking': 20, 'driving': 5},
+        'stays': [
+            {'at': (0, 0), 'location': 'home', 'stress': 'low'},
+            {'at': (8, 50), 'location': 'gym', 'stress': 'high',
+             'travel_mode': 'walking', 'travel_stress': 'medium'},
+            ...
+        ],
+        'rules': [
+            {'when': {'weekend': True},
+             'changes': [{'match': {'location': 'gym'}, 'set': {'location': 'home', 'stress': 'low'}}]},
+            {'when': {'weekdays': [2]}, 'changes': [...]},        # 0=Monday .. 6=Sunday
+            {'when': {'dates': ['2024-11-28']}, 'changes': [...]}
+        ]
+    }
+
+A change either sets fields on every stay whose fields equal 'match', removes them
+('remove': True), or inserts a new stay ('insert': {...}, placed by its 'at' time).
+Stay fields: at, until, location, stress, travel_mode, travel_minutes, travel_stress.
+
+Compiled timelines are cached per day type (the set of rules that apply), so a year of
+days costs one rule check per day plus one compile per distinct day type.
+"""
+import copy
+import json
+from datetime import date, datetime
+from typing import Dict, List, Sequence, Tuple, Union
+
+DAY_MINUTES = 24 * 60
+STAY_FIELDS = {'at', 'until', 'location', 'stress', 'travel_mode', 'travel_minutes', 'travel_stress'}
+DEFAULT_TRAVEL_MODE = 'walking'
+DEFAULT_TRAVEL_STRESS = 'low'
+
+
+class ScheduleError(ValueError):
+    """Invalid schedule spec or a compiled timeline that does not fit in one day"""
+
+
+def parse_time(value: Union[str, Sequence[int]]) -> int:
+    """(hour, minute) or 'HH:MM' -> minutes since midnight"""
+    if isinstance(value, str):
+        hour, minute = value.split(':')
+        value = (int(hour), int(minute))
+    hour, minute = value
+    minutes = hour * 60 + minute
+    if not 0 <= minute < 60 or not 0 <= minutes <= DAY_MINUTES:
+        raise ScheduleError(f"Invalid time {value}")
+    return minutes
+
+def format_time(minutes: int) -> Tuple[int, int]:
+    return divmod(minutes, 60)
+
+def _rule_applies(when: Dict, day: date) -> bool:
+    weekday = day.weekday()
+    if 'weekend' in when and when['weekend'] != (weekday >= 5):
+        return False
+    if 'weekdays' in when and weekday not in when['weekdays']:
+        return False
+    if 'dates' in when and day.isoformat() not in when['dates']:
+        return False
+    return True
+
+
+class ScheduleEngine:
+    """
+    Compiles a schedule spec into per-day timelines
+
+    Timelines are lists of segments in the shape generate_day_intervals reads:
+        stay:   {'start': (h, m), 'end': (h, m), 'location': key, 'stress': ...}
+        travel: {'start': (h, m), 'end': (h, m), 'from': key, 'to': key, 'stress': ..., 'mode': ...}
+    They are shared between days of the same type and must not be modified.
+    """
+    def __init__(self, spec: Dict):
+        self.spec = spec
+        self.travel_minutes = spec.get('travel_minutes', {'walking': 20, 'driving': 5})
+        self.rules = spec.get('rules', [])
+        for rule in self.rules:
+            unknown = set(rule.get('when', {})) - {'weekend', 'weekdays', 'dates'}
+            if unknown:
+                raise ScheduleError(f"Unknown rule condition(s): {', '.join(sorted(unknown))}")
+        self._cache: Dict[Tuple[int, ...], List[Dict]] = {}
+        self._cache[()] = self.compile(())  # Fail fast on an invalid base day
+
+    @classmethod
+    def from_json(cls, path: str) -> 'ScheduleEngine':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def day_type(self, day: Union[date, datetime]) -> Tuple[int, ...]:
+        """Indices of the rules that apply to a day; days with equal types share a timeline"""
+        if isinstance(day, datetime):
+            day = day.date()
+        return tuple(i for i, rule in enumerate(self.rules) if _rule_applies(rule.get('when', {}), day))
+
+    def for_date(self, day: Union[date, datetime]) -> List[Dict]:
+        """Compiled timeline for a day (cached per day type)"""
+        key = self.day_type(day)
+        timeline = self._cache.get(key)
+        if timeline is None:
+            timeline = self._cache[key] = self.compile(key)
+        return timeline
+
+    def _stays(self, rule_indices: Sequence[int]) -> List[Dict]:
+        stays = []
+        for stay in self.spec['stays']:
+            stays.append(self._normalize(stay))
+        for i in rule_indices:
+            for change in self.rules[i].get('changes', []):
+                if 'insert' in change:
+                    new = self._normalize(change['insert'])
+                    position = next((j for j, s in enumerate(stays) if s['at'] > new['at']), len(stays))
+                    stays.insert(position, new)
+                    continue
+                match = self._normalize(change.get('match', {}), partial=True)
+                selected = [s for s in stays if all(s.get(k) == v for k, v in match.items())]
+                if not selected:
+                    raise ScheduleError(f"Rule {i} matches no stay: {change.get('match')}")
+                if change.get('remove'):
+                    removed = {id(s) for s in selected}
+                    stays = [s for s in stays if id(s) not in removed]
+                else:
+                    updates = self._normalize(change.get('set', {}), partial=True)
+                    for stay in selected:
+                        stay.update(updates)
+        return stays
+
+    def _normalize(self, stay: Dict, partial: bool = False) -> Dict:
+        unknown = set(stay) - STAY_FIELDS
+        if unknown:
+            raise ScheduleError(f"Unknown stay field(s): {', '.join(sorted(unknown))}")
+        stay = copy.deepcopy(stay)
+        for field in ('at', 'until'):
+            if stay.get(field) is not None:
+                stay[field] = parse_time(stay[field])
+        if not partial:
+            if 'at' not in stay or 'location' not in stay or 'stress' not in stay:
+                raise ScheduleError(f"Stay needs 'at', 'location' and 'stress': {stay}")
+            stay.setdefault('until', None)
+            stay.setdefault('travel_mode', DEFAULT_TRAVEL_MODE)
+            stay.setdefault('travel_minutes', None)
+            stay.setdefault('travel_stress', DEFAULT_TRAVEL_STRESS)
+        return stay
+
+    def _travel_minutes(self, stay: Dict) -> int:
+        if stay['travel_minutes'] is not None:
+            return stay['travel_minutes']
+        if stay['travel_mode'] not in self.travel_minutes:
+            raise ScheduleError(f"No travel time configured for mode '{stay['travel_mode']}'")
+        return self.travel_minutes[stay['travel_mode']]
+
+    def compile(self, rule_indices: Sequence[int]) -> List[Dict]:
+        """Apply the given rules to the base stays and lay out a validated timeline"""
+        stays = self._stays(rule_indices)
+        if not stays or stays[0]['at'] != 0:
+            raise ScheduleError("The first stay must start at 00:00")
+
+        # Arrival: the stay's own time, unless the previous stay fixes its departure
+        arrivals = []
+        for i, stay in enumerate(stays):
+            previous = stays[i - 1] if i else None
+            if previous is not None and previous['until'] is not None:
+                travel = self._travel_minutes(stay) if stay['location'] != previous['location'] else 0
+                arrivals.append(previous['until'] + travel)
+            else:
+                arrivals.append(stay['at'])
+
+        timeline = []
+        for i, stay in enumerate(stays):
+            following = stays[i + 1] if i + 1 < len(stays) else None
+            if following is None:
+                departure = stay['until'] if stay['until'] is not None else DAY_MINUTES
+                travel = 0
+            else:
+                travel = self._travel_minutes(following) if following['location'] != stay['location'] else 0
+                departure = stay['until'] if stay['until'] is not None else arrivals[i + 1] - travel
+            if departure <= arrivals[i]:
+                raise ScheduleError(f"Stay at {stay['location']} from {format_time(arrivals[i])} "
+                                    f"has no time left (departs {format_time(departure)})")
+            timeline.append({'start': format_time(arrivals[i]), 'end': format_time(departure),
+                             'location': stay['location'], 'stress': stay['stress']})
+            if travel:
+                timeline.append({'start': format_time(departure), 'end': format_time(departure + travel),
+                                 'from': stay['location'], 'to': following['location'],
+                                 'stress': following['travel_stress'], 'mode': following['travel_mode']})
+        if timeline[-1]['end'] != format_time(DAY_MINUTES):
+            raise ScheduleError(f"Timeline ends at {timeline[-1]['end']} instead of 24:00")
+        return timeline
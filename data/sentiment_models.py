@@ -0,0 +1,309 @@
+"""
+Sentiment models for the interval generators
+
+A model draws the sentiment scores for one schedule segment in a single batched NumPy call
+(sample(n, rng) -> n scores in time order). For stays it also decides how the segment is
+split into intervals (pieces(duration_minutes) -> interval start offsets in minutes).
+
+Models:
+  UniformModel      independent draws from one range (the original behavior)
+  AlternatingModel  cycles through several ranges, one per fixed-length piece
+  TransitionModel   moves through ranges as the segment progresses
+  AR1Model          mean-reverting AR(1) process, clipped to a range
+  RandomWalkModel   Gaussian random walk, reflected at the edges of a range
+
+Randomness comes from an explicit np.random.Generator. stream_rng(seed, *keys) derives an
+independent stream per (seed, keys) tuple, e.g. one per (user, day), so results do not depend
+on how work is split between processes or on the order in which units are generated.
+
+Run directly to time the models (--samples 100000000 by default).
+"""
+import argparse
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Range = Tuple[float, float]
+
+# Rows per block when solving the AR(1) recurrence; the block count grows instead beyond this
+MAX_BLOCK_LENGTH = 4096
+
+def stream_rng(seed: int, *keys: int) -> np.random.Generator:
+    """
+    Independent random stream for (seed, keys)
+
+    Keys are non-negative integers (a user id, a date ordinal, ...). Streams for different
+    keys are statistically independent, the same way SeedSequence.spawn children are.
+    """
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed, spawn_key=tuple(keys))))
+
+
+class SentimentModel:
+    """Base class: one interval per stay, subclasses implement sample()"""
+    kind = 'base'
+
+    def sample(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        raise NotImplementedError
+
+    def pieces(self, duration_minutes: float) -> List[float]:
+        """Start offsets (minutes) of the intervals a stay of this length is split into"""
+        return [0.0]
+
+    def config(self) -> Dict:
+        """JSON-serializable description (model_from_config(config()) rebuilds the model)"""
+        return {'model': self.kind}
+
+    def __repr__(self) -> str:
+        params = ', '.join(f"{key}={value!r}" for key, value in self.config().items() if key != 'model')
+        return f"{type(self).__name__}({params})"
+
+
+def fixed_pieces(duration_minutes: float, step_minutes: float) -> List[float]:
+    """Pieces of step_minutes each, plus a shorter remainder if the duration is not a multiple"""
+    count = int(duration_minutes / step_minutes)
+    offsets = [i * step_minutes for i in range(count)]
+    if count * step_minutes < duration_minutes or not offsets:
+        offsets.append(count * step_minutes)
+    return offsets
+
+def even_pieces(duration_minutes: float, step_minutes: float, min_pieces: int = 1) -> List[float]:
+    """About step_minutes-long pieces (at least min_pieces) of equal length"""
+    count = max(min_pieces, int(duration_minutes / step_minutes))
+    return [i * duration_minutes / count for i in range(count)]
+
+
+class UniformModel(SentimentModel):
+    kind = 'uniform'
+
+    def __init__(self, low: float, high: float):
+        self.low, self.high = low, high
+
+    def sample(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        return rng.uniform(self.low, self.high, n)
+
+    def config(self) -> Dict:
+        return {'model': self.kind, 'low': self.low, 'high': self.high}
+
+
+class AlternatingModel(SentimentModel):
+    """Piece i draws uniformly from ranges[i % len(ranges)]; pieces are step_minutes long"""
+    kind = 'alternating'
+
+    def __init__(self, ranges: Sequence[Range], step_minutes: float = 20):
+        self.ranges = [tuple(r) for r in ranges]
+        self.step_minutes = step_minutes
+
+    def sample(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        values = rng.random(n)
+        period = len(self.ranges)
+        for phase, (low, high) in enumerate(self.ranges):
+            part = values[phase::period]
+            part *= high - low
+            part += low
+        return values
+
+    def pieces(self, duration_minutes: float) -> List[float]:
+        return fixed_pieces(duration_minutes, self.step_minutes)
+
+    def config(self) -> Dict:
+        return {'model': self.kind, 'ranges': [list(r) for r in self.ranges], 'step_minutes': self.step_minutes}
+
+
+class TransitionModel(SentimentModel):
+    """
+    Ranges change with progress through the segment (0 at the first piece, 1 at the last)
+
+    stages: [(progress where the stage ends, range), ...]; the last stage's end is ignored
+    """
+    kind = 'transition'
+
+    def __init__(self, stages: Sequence[Tuple[float, Range]], step_minutes: float = 30, min_pieces: int = 3):
+        self.stages = [(until, tuple(r)) for until, r in stages]
+        self.step_minutes = step_minutes
+        self.min_pieces = min_pieces
+
+    def stage_starts(self, n: int) -> List[int]:
+        """Index of the first piece in each stage (piece i has progress i / (n - 1))"""
+        starts = [0]
+        for until, _ in self.stages[:-1]:
+            if n <= 1:
+                starts.append(0 if until <= 0 else n)
+                continue
+            i = max(starts[-1], min(n, math.ceil(until * (n - 1))))
+            # Settle float rounding in until * (n - 1) against the exact comparison
+            while i > starts[-1] and (i - 1) / (n - 1) >= until:
+                i -= 1
+            while i < n and i / (n - 1) < until:
+                i += 1
+            starts.append(i)
+        return starts
+
+    def sample(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        values = rng.random(n)
+        starts = self.stage_starts(n) + [n]
+        for (_, (low, high)), a, b in zip(self.stages, starts, starts[1:]):
+            part = values[a:b]
+            part *= high - low
+            part += low
+        return values
+
+    def pieces(self, duration_minutes: float) -> List[float]:
+        return even_pieces(duration_minutes, self.step_minutes, self.min_pieces)
+
+    def config(self) -> Dict:
+        return {'model': self.kind, 'stages': [[until, list(r)] for until, r in self.stages],
+                'step_minutes': self.step_minutes, 'min_pieces': self.min_pieces}
+
+
+def ar1_filter(noise: np.ndarray, phi: float, initial: float = 0.0) -> np.ndarray:
+    """
+    x[t] = phi * x[t-1] + noise[t], with x[-1] = initial
+
+    The series is cut into B blocks of length L (B, L ~ sqrt(n)). Every block is filtered from
+    a zero start at once, one column per step, then the true start of each block (the previous
+    block's last value) is carried forward in a loop over blocks and added as phi^(j+1) * start.
+    That is O(n) work in about 2 * sqrt(n) NumPy calls instead of n Python steps.
+    """
+    n = len(noise)
+    if n == 0:
+        return np.empty(0)
+    length = min(MAX_BLOCK_LENGTH, max(1, math.isqrt(n)))
+    blocks = -(-n // length)
+    padded = np.zeros(blocks * length)
+    padded[:n] = noise
+    # (L, B): row j holds step j of every block, so each step is one contiguous vector operation
+    columns = np.ascontiguousarray(padded.reshape(blocks, length).T)
+    for j in range(1, length):
+        columns[j] += phi * columns[j - 1]
+
+    powers = phi ** np.arange(1, length + 1)
+    starts = np.empty(blocks)
+    start = initial
+    last = columns[-1]
+    decay = powers[-1]
+    for b in range(blocks):
+        starts[b] = start
+        start = last[b] + decay * start
+    columns += powers[:, None] * starts[None, :]
+    return columns.T.reshape(-1)[:n]
+
+
+class AR1Model(SentimentModel):
+    """
+    Mean-reverting AR(1): x[t] = mean + phi * (x[t-1] - mean) + sigma * e[t], clipped to [low, high]
+
+    phi close to 1 gives slow drifts, close to 0 nearly independent draws. The first value is
+    drawn from the stationary distribution, so there is no warm-up. Stays are split into
+    step_minutes pieces so the correlation is visible over time.
+    """
+    kind = 'ar1'
+
+    def __init__(self, low: float, high: float, mean: float, phi: float = 0.8, sigma: float = 0.05,
+                 step_minutes: float = 15):
+        if not -1 < phi < 1:
+            raise ValueError(f"AR(1) phi must be in (-1, 1), got {phi}")
+        self.low, self.high, self.mean = low, high, mean
+        self.phi, self.sigma = phi, sigma
+        self.step_minutes = step_minutes
+
+    def sample(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        noise = rng.normal(0.0, self.sigma, n)
+        if n:
+            noise[0] *= 1 / math.sqrt(1 - self.phi ** 2)
+        values = ar1_filter(noise, self.phi)
+        values += self.mean
+        return np.clip(values, self.low, self.high, out=values)
+
+    def pieces(self, duration_minutes: float) -> List[float]:
+        return fixed_pieces(duration_minutes, self.step_minutes)
+
+    def config(self) -> Dict:
+        return {'model': self.kind, 'low': self.low, 'high': self.high, 'mean': self.mean,
+                'phi': self.phi, 'sigma': self.sigma, 'step_minutes': self.step_minutes}
+
+
+class RandomWalkModel(SentimentModel):
+    """
+    Gaussian random walk with step size sigma, reflected at low and high
+
+    Starts at `start`, or uniformly within the range when start is None.
+    """
+    kind = 'random_walk'
+
+    def __init__(self, low: float, high: float, sigma: float = 0.05, start: Optional[float] = None,
+                 step_minutes: float = 15):
+        if not high > low:
+            raise ValueError(f"Random walk range is empty: ({low}, {high})")
+        self.low, self.high = low, high
+        self.sigma, self.start = sigma, start
+        self.step_minutes = step_minutes
+
+    def sample(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        start = rng.uniform(self.low, self.high) if self.start is None else self.start
+        steps = rng.normal(0.0, self.sigma, n)
+        if n:
+            steps[0] = 0.0
+        walk = np.cumsum(steps, out=steps)
+        # Reflection folds the unbounded walk into the range: a triangle wave of period 2 * width
+        width = self.high - self.low
+        walk += start - self.low
+        np.mod(walk, 2 * width, out=walk)
+        walk -= width
+        np.abs(walk, out=walk)
+        np.subtract(self.high, walk, out=walk)
+        return walk
+
+    def pieces(self, duration_minutes: float) -> List[float]:
+        return fixed_pieces(duration_minutes, self.step_minutes)
+
+    def config(self) -> Dict:
+        return {'model': self.kind, 'low': self.low, 'high': self.high, 'sigma': self.sigma,
+                'start': self.start, 'step_minutes': self.step_minutes}
+
+
+MODEL_TYPES = {cls.kind: cls for cls in (UniformModel, AlternatingModel, TransitionModel, AR1Model, RandomWalkModel)}
+
+def model_from_config(config: Dict) -> SentimentModel:
+    """Build a model from its config() dict, e.g. {'model': 'ar1', 'low': -0.3, ...}"""
+    params = dict(config)
+    kind = params.pop('model')
+    if kind not in MODEL_TYPES:
+        raise ValueError(f"Unknown sentiment model '{kind}' (expected one of {', '.join(MODEL_TYPES)})")
+    return MODEL_TYPES[kind](**params)
+
+def profile_configs(profiles: Dict[str, SentimentModel]) -> Dict[str, Dict]:
+    """{profile name: model config}, e.g. for hashing generator inputs"""
+    return {name: model.config() for name, model in sorted(profiles.items())}
+
+
+def _benchmark(samples: int, chunk: int = 10_000_000, seed: int = 0):
+    """Time every model type drawing `samples` scores, chunk scores per call"""
+    models = [
+        UniformModel(-0.05, 0.15),
+        AlternatingModel([(-0.05, 0.15), (-0.3, -0.1)]),
+        TransitionModel([(0.3, (-0.3, -0.1)), (0.6, (-0.1, 0.1)), (1.0, (0.2, 0.5))]),
+        AR1Model(-0.3, 0.5, mean=0.1, phi=0.9, sigma=0.05),
+        RandomWalkModel(-0.3, 0.5, sigma=0.03),
+    ]
+    for index, model in enumerate(models):
+        rng = stream_rng(seed, index)
+        start = time.perf_counter()
+        total = 0.0
+        remaining = samples
+        while remaining > 0:
+            values = model.sample(min(chunk, remaining), rng)
+            total += float(values.sum())
+            remaining -= len(values)
+        elapsed = time.perf_counter() - start
+        print(f"{model.kind:12s} {samples:,} samples in {elapsed:.2f}s "
+              f"({samples / elapsed / 1e6:,.1f}M/s, mean {total / samples:+.3f})")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the sentiment models')
+    parser.add_argument('--samples', type=int, default=100_000_000)
+    parser.add_argument('--chunk', type=int, default=10_000_000, help='Samples per sample() call')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    _benchmark(args.samples, args.chunk, args.seed)
@@ -0,0 +1,56 @@
+"""
+Uniform grid spatial index over points in lon/lat degrees
+Used to join intervals, buildings and locations without all-pairs scans
+"""
+import math
+from collections import defaultdict
+from typing import Dict, Hashable, Iterator, List, Tuple
+
+
+class GridIndex:
+    """
+    Bucket points into square cells of cell_size degrees
+    Radius queries only visit the cells overlapping the search circle, so lookups cost
+    O(points per cell) instead of O(total points)
+    """
+    def __init__(self, cell_size: float):
+        if cell_size <= 0:
+            raise ValueError("cell_size must be positive")
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Tuple[Hashable, float, float]]] = defaultdict(list)
+        self.size = 0
+
+    def _cell(self, lon: float, lat: float) -> Tuple[int, int]:
+        return math.floor(lon / self.cell_size), math.floor(lat / self.cell_size)
+
+    def insert(self, key: Hashable, lon: float, lat: float):
+        self.cells[self._cell(lon, lat)].append((key, lon, lat))
+        self.size += 1
+
+    def query_radius(self, lon: float, lat: float, radius: float) -> Iterator[Tuple[Hashable, float]]:
+        """
+        Yield (key, squared distance) for every point strictly within radius degrees
+        (Euclidean in lat/lon space, same as the web app's distance checks)
+        """
+        radius_sq = radius * radius
+        span = max(1, math.ceil(radius / self.cell_size))
+        cx, cy = self._cell(lon, lat)
+        for gx in range(cx - span, cx + span + 1):
+            for gy in range(cy - span, cy + span + 1):
+                bucket = self.cells.get((gx, gy))
+                if not bucket:
+                    continue
+                for key, px, py in bucket:
+                    d_lon = px - lon
+                    d_lat = py - lat
+                    dist_sq = d_lat * d_lat + d_lon * d_lon
+                    if dist_sq < radius_sq:
+                        yield key, dist_sq
+
+    def nearest(self, lon: float, lat: float, radius: float):
+        """Return the key of the closest point within radius, or None"""
+        best_key, best_dist = None, None
+        for key, dist_sq in self.query_radius(lon, lat, radius):
+            if best_dist is None or dist_sq < best_dist:
+                best_key, best_dist = key, dist_sq
+        return best_key
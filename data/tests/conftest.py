@@ -0,0 +1,9 @@
+"""
+Shared pytest setup: the pipeline scripts are flat modules in data/, imported by name
+"""
+import os
+import sys
+
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if DATA_DIR not in sys.path:
+    sys.path.insert(0, DATA_DIR)
@@ -0,0 +1,149 @@
+import gzip
+import hashlib
+import json
+import os
+
+import pytest
+
+import artifacts
+from artifacts import (ArtifactFile, available_encodings, directory_files, publish_artifacts, write_json,
+                       write_json_array)
+
+INTERVALS = [{'start_time': '2024-11-18T08:00:00', 'latitude': 34.0205123456, 'longitude': -118.28391234,
+              'sentiment_score': 0.123456, 'duration_minutes': 20}] * 3
+COLLECTION = {'type': 'FeatureCollection', 'features': [
+    {'type': 'Feature', 'properties': {'name': 'Doheny'},
+     'geometry': {'type': 'Polygon', 'coordinates': [[[-118.28391234, 34.0205123456], [-118.2838, 34.0206]]]}}]}
+
+
+def sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@pytest.fixture
+def sources(tmp_path):
+    source = tmp_path / 'data'
+    source.mkdir()
+    (source / 'intervals.json').write_text(json.dumps(INTERVALS, indent=2))
+    (source / 'buildings.geojson').write_text(json.dumps(COLLECTION, indent=2))
+    (source / 'settings.json').write_text(json.dumps({'zoom': [14, 18], 'center': [34.02051, -118.28391]}))
+    return [(str(source / 'intervals.json'), 'intervals.json'),
+            (str(source / 'buildings.geojson'), 'buildings_usc.geojson'),
+            (str(source / 'settings.json'), 'nested/settings.json')]
+
+
+def test_write_json_is_compact_and_rounded(tmp_path):
+    path = str(tmp_path / 'out.json')
+    info = write_json(path, {'a': [1.23456789, 2], 'b': {'c': 0.5}, 'd': 'x'}, precision=3)
+    text = open(path, encoding='utf-8').read()
+    assert text == '{"a":[1.235,2],"b":{"c":0.5},"d":"x"}'
+    assert info == {'bytes': len(text), 'sha256': sha256(path)}
+
+    info = write_json_array(path, INTERVALS, precision=4, key='items', header={'type': 'list'})
+    value = json.loads(open(path, encoding='utf-8').read())
+    assert value['type'] == 'list' and info['count'] == 3
+    assert value['items'][0]['latitude'] == 34.0205 and value['items'][0]['duration_minutes'] == 20
+    assert ' ' not in open(path, encoding='utf-8').read()
+
+
+@pytest.mark.parametrize('encoding', ['gz', 'br'])
+def test_compressed_variants_round_trip(tmp_path, encoding):
+    if encoding not in available_encodings():
+        pytest.skip('brotli is not installed')
+    path = str(tmp_path / 'out.json')
+    info = write_json(path, INTERVALS * 1000, encodings=[encoding])
+    with open(path + '.' + encoding, 'rb') as f:
+        compressed = f.read()
+    assert info[encoding] == len(compressed) < info['bytes']
+    if encoding == 'gz':
+        raw = gzip.decompress(compressed)
+    else:
+        raw = artifacts.brotli.decompress(compressed)
+    assert raw == open(path, 'rb').read()
+    # No timestamp in the gzip header: equal content gives equal bytes
+    write_json(path, INTERVALS * 1000, encodings=[encoding])
+    assert open(path + '.' + encoding, 'rb').read() == compressed
+
+
+def test_failed_write_leaves_no_partial_file(tmp_path):
+    path = str(tmp_path / 'out.json')
+    with pytest.raises(RuntimeError):
+        with ArtifactFile(path, ['gz']) as out:
+            out.write('[1,')
+            raise RuntimeError('stage failed')
+    assert os.listdir(tmp_path) == []
+
+
+def test_publish_writes_manifest(tmp_path, sources):
+    public = tmp_path / 'public'
+    result = publish_artifacts(sources, str(public), precision=5, encodings=['gz'])
+    assert sorted(result['published']) == sorted(name for _, name in sources) and result['skipped'] == []
+
+    manifest = json.loads((public / 'artifacts.json').read_text())
+    for source, name in sources:
+        entry = manifest['files'][name]
+        target = public / name
+        assert entry['bytes'] == target.stat().st_size
+        assert entry['sha256'] == sha256(target) and entry['source_sha256'] == sha256(source)
+        assert entry['url'] == f"{name}?v={entry['sha256'][:12]}"
+        assert entry['encodings'] == {'gz': os.path.getsize(str(target) + '.gz')}
+        assert gzip.decompress((public / (name + '.gz')).read_bytes()) == target.read_bytes()
+        assert json.loads(target.read_text()) == artifacts.round_floats(json.load(open(source)), 5)
+
+    assert (public / 'intervals.json').read_text().startswith('[{"start_time":"2024-11-18T08:00:00",')
+    features = json.loads((public / 'buildings_usc.geojson').read_text())
+    assert features['features'][0]['geometry']['coordinates'][0][0] == [-118.28391, 34.02051]
+
+
+def test_republish_skips_unchanged_files(tmp_path, sources):
+    public = tmp_path / 'public'
+    publish_artifacts(sources, str(public), encodings=['gz'])
+    before = {name: os.stat(public / name).st_mtime_ns for _, name in sources}
+    manifest = (public / 'artifacts.json').read_bytes()
+
+    result = publish_artifacts(sources, str(public), encodings=['gz'])
+    assert result['published'] == [] and result['bytes_written'] == 0
+    assert sorted(result['skipped']) == sorted(before)
+    assert {name: os.stat(public / name).st_mtime_ns for name in before} == before
+    assert (public / 'artifacts.json').read_bytes() == manifest
+
+    # Changed source, changed settings, and a damaged published file are each redone
+    source = sources[0][0]
+    with open(source, 'w', encoding='utf-8') as f:
+        json.dump(INTERVALS[:1], f)
+    result = publish_artifacts(sources, str(public), encodings=['gz'])
+    assert result['published'] == ['intervals.json']
+    entry = json.loads((public / 'artifacts.json').read_text())['files']['intervals.json']
+    assert entry['source_sha256'] == sha256(source) and entry['sha256'] == sha256(public / 'intervals.json')
+    assert json.loads((public / 'intervals.json').read_text()) == INTERVALS[:1]
+
+    assert len(publish_artifacts(sources, str(public), precision=2, encodings=['gz'])['published']) == 3
+    (public / 'nested' / 'settings.json.gz').write_bytes(b'')
+    assert publish_artifacts(sources, str(public), precision=2, encodings=['gz'])['published'] == \
+        ['nested/settings.json']
+
+
+def test_dropped_encoding_removes_stale_variant(tmp_path, sources):
+    public = tmp_path / 'public'
+    publish_artifacts(sources[:1], str(public), encodings=['gz'])
+    assert (public / 'intervals.json.gz').exists()
+    assert publish_artifacts(sources[:1], str(public), encodings=[])['published'] == ['intervals.json']
+    assert not (public / 'intervals.json.gz').exists()
+
+
+def test_copy_without_minify_keeps_bytes(tmp_path, sources):
+    public = tmp_path / 'public'
+    publish_artifacts(sources[:1], str(public), minify=False, encodings=[])
+    assert (public / 'intervals.json').read_bytes() == open(sources[0][0], 'rb').read()
+
+
+def test_directory_files(tmp_path):
+    tiles = tmp_path / 'tiles'
+    for rel in ('manifest.json', '15/5000/12000.json', '15/5000/12001.geojson', '15/notes.txt',
+                '.spill/0.json'):
+        path = tiles / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text('{}')
+    assert [name for _, name in directory_files(str(tiles), 'tiles')] == \
+        ['tiles/manifest.json', 'tiles/15/5000/12000.json', 'tiles/15/5000/12001.geojson']
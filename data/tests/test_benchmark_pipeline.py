@@ -0,0 +1,19 @@
+import copy
+
+from benchmark_pipeline import DEFAULT_SCALES, STAGES, compare_results, run_benchmarks
+
+
+def test_smallest_scale_runs_every_stage(tmp_path):
+    scale = min(DEFAULT_SCALES)
+    report = run_benchmarks([scale], list(STAGES), str(tmp_path / 'work'))
+    results = {r['stage']: r for r in report['results']}
+    assert list(results) == list(STAGES)
+    for result in results.values():
+        assert result['scale'] == scale and result['items'] > 0 and result['seconds'] > 0
+        assert result['peak_rss_mb'] > 0
+
+    assert compare_results(report, report) == []
+    baseline = copy.deepcopy(report)
+    baseline['results'][0]['seconds'] /= 2
+    regressions = compare_results(report, baseline)
+    assert [(r['stage'], r['time_ratio']) for r in regressions] == [(report['results'][0]['stage'], 2.0)]
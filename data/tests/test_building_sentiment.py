@@ -0,0 +1,130 @@
+import json
+import math
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import building_sentiment
+from building_sentiment import DEFAULT_THRESHOLD, join_intervals_to_buildings
+from filter_buildings import building_center
+from spatial_index import GridIndex
+
+# Start times on both sides of every 3-hour bucket edge, including midnight
+EDGE_TIMES = [datetime(2024, 11, 18, hour) + timedelta(seconds=offset)
+              for hour in range(0, 24, 3) for offset in (-1, 0, 1)]
+
+
+def brute_force(features, intervals, threshold, bucket_size=3):
+    """getBuildingSentiment(building, intervals, threshold, true) for every building"""
+    buildings = []
+    for i, feature in enumerate(features):
+        center = building_center(feature)
+        if center is None:
+            continue
+        nearby = [iv for iv in intervals
+                  if (iv['latitude'] - center[1]) ** 2 + (iv['longitude'] - center[0]) ** 2 < threshold ** 2]
+        if not nearby:
+            continue
+        groups = {}
+        for iv in nearby:
+            hour = datetime.fromisoformat(iv['start_time']).hour
+            groups.setdefault(hour // bucket_size * bucket_size, []).append(iv)
+        time_buckets = []
+        for bucket, members in sorted(groups.items()):
+            total = sum(iv['duration_minutes'] or 0 for iv in members)
+            if total <= 0:
+                continue
+            time_buckets.append({
+                'bucket': bucket,
+                'timeRange': f"{bucket:02d}:00 - {bucket + bucket_size:02d}:00",
+                'avgSentiment': sum(iv['sentiment_score'] * (iv['duration_minutes'] or 0) for iv in members) / total,
+                'count': len(members),
+                'totalDuration': total,
+            })
+        buildings.append({'index': i, 'id': feature['properties'].get('id'),
+                          'sentiment': sum(iv['sentiment_score'] for iv in nearby) / len(nearby),
+                          'count': len(nearby), 'timeBuckets': time_buckets,
+                          'hasMultipleBuckets': len(time_buckets) > 1})
+    return buildings
+
+
+def square(lon, lat, half=0.00005):
+    ring = [[lon - half, lat - half], [lon + half, lat - half], [lon + half, lat + half], [lon - half, lat + half],
+            [lon - half, lat - half]]
+    return {'type': 'Polygon', 'coordinates': [ring]}
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    rng = random.Random(11)
+    features = []
+    for i in range(60):
+        # Some centers sit exactly on grid cell edges (cell size == threshold)
+        if i % 5 == 0:
+            lon, lat = -118.29 + (i // 5) * DEFAULT_THRESHOLD, 34.02
+        else:
+            lon, lat = -118.29 + rng.random() * 0.004, 34.02 + rng.random() * 0.004
+        features.append({'type': 'Feature', 'properties': {'id': 1000 + i}, 'geometry': square(lon, lat)})
+    features.append({'type': 'Feature', 'properties': {'id': 'line'},
+                     'geometry': {'type': 'LineString', 'coordinates': [[-118.29, 34.02], [-118.289, 34.021]]}})
+    features.append({'type': 'Feature', 'properties': {}, 'geometry': square(-118.2885, 34.0215)})
+
+    intervals = []
+    centers = [building_center(f) for f in features if building_center(f) is not None]
+    for n in range(3000):
+        if n % 10 == 9:
+            lon, lat = -117.0, 33.0  # Nowhere near a building: empty cells only
+        else:
+            lon, lat = rng.choice(centers)
+            # Distances straddling the threshold, a few within rounding of it
+            angle = rng.random() * 2 * math.pi
+            distance = DEFAULT_THRESHOLD * rng.choice([0.3, 0.9999999, 1.0, 1.0000001, 1.5, rng.random() * 2])
+            lon, lat = lon + distance * math.cos(angle), lat + distance * math.sin(angle)
+        if n % 7 == 0 and intervals:
+            lon, lat = intervals[-1]['longitude'], intervals[-1]['latitude']  # Repeated stay coordinate
+        start = rng.choice(EDGE_TIMES)
+        intervals.append({'start_time': start.isoformat(), 'latitude': lat, 'longitude': lon,
+                          'sentiment_score': round(rng.uniform(-1, 1), 3),
+                          'duration_minutes': rng.choice([0, 2, 20, 90, None])})
+
+    buildings_file, intervals_file = tmp_path / 'buildings.geojson', tmp_path / 'intervals.json'
+    buildings_file.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+    intervals_file.write_text(json.dumps(intervals))
+    return str(buildings_file), str(intervals_file), features, intervals
+
+
+def strip_floats(building):
+    building = dict(building, sentiment=None)
+    building['timeBuckets'] = [dict(bucket, avgSentiment=None) for bucket in building['timeBuckets']]
+    return building
+
+
+@pytest.mark.parametrize('cache_size', [100_000, 2])
+@pytest.mark.parametrize('threshold', [DEFAULT_THRESHOLD, 0.0011])
+def test_grid_join_matches_brute_force(dataset, monkeypatch, cache_size, threshold):
+    buildings_file, intervals_file, features, intervals = dataset
+    monkeypatch.setattr(building_sentiment, 'MATCH_CACHE_SIZE', cache_size)
+    result = join_intervals_to_buildings(buildings_file, intervals_file, threshold=threshold)
+    expected = brute_force(features, intervals, threshold)
+    assert result['building_count'] == len(features)
+    assert len(expected) > 20
+    # Matches, counts and buckets exactly; averages up to float summation order
+    assert [strip_floats(b) for b in result['buildings']] == [strip_floats(b) for b in expected]
+    for got, want in zip(result['buildings'], expected):
+        assert got['sentiment'] == pytest.approx(want['sentiment'], abs=1e-12)
+        for a, b in zip(got['timeBuckets'], want['timeBuckets']):
+            assert a['avgSentiment'] == pytest.approx(b['avgSentiment'], abs=1e-12)
+
+
+def test_query_radius_is_strict_and_crosses_cells():
+    index = GridIndex(0.5)
+    index.insert('edge', 1.0, 0.0)
+    index.insert('inside', 0.0, 0.999)
+    index.insert('far', 3.0, 3.0)
+    assert sorted(key for key, _ in index.query_radius(0.0, 0.0, 1.0)) == ['inside']
+    assert sorted(key for key, _ in index.query_radius(0.0, 0.0, 1.0000001)) == ['edge', 'inside']
+    assert list(index.query_radius(-5.0, -5.0, 1.0)) == []
+    assert index.nearest(0.9, 0.0, 0.5) == 'edge' and index.nearest(-5.0, -5.0, 1.0) is None
+    with pytest.raises(ValueError):
+        GridIndex(0)
@@ -0,0 +1,93 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from compact_intervals import METERS_PER_DEGREE, compact_day, compact_intervals, compact_user_day
+from json_stream import iter_json_array
+
+DATA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+START = datetime(2024, 11, 18, 8, 0)
+
+
+def stay(minute, length, sentiment, name='Home', **extra):
+    start = START + timedelta(minutes=minute)
+    return dict({'start_time': start.isoformat(), 'end_time': (start + timedelta(minutes=length)).isoformat(),
+                 'duration_minutes': length, 'latitude': 34.025, 'longitude': -118.29, 'location_name': name,
+                 'location_type': 'home', 'sentiment_score': sentiment, 'activity': 'other'}, **extra)
+
+
+def travel(minute, lat, lon, sentiment=0.0, mode='walking', **extra):
+    return stay(minute, 2, sentiment, name='Traveling', location_type='traveling', latitude=lat, longitude=lon,
+                activity='traveling', travel_mode=mode, **extra)
+
+
+def test_merges_stays_within_tolerance():
+    intervals = [stay(0, 10, 0.10), stay(10, 20, 0.15), stay(30, 10, 0.12), stay(40, 10, 0.5)]
+    result = compact_user_day(intervals, sentiment_tolerance=0.1)
+    assert len(result) == 2
+    merged = result[0]
+    assert (merged['start_time'], merged['end_time'], merged['duration_minutes']) == \
+        (intervals[0]['start_time'], intervals[2]['end_time'], 40)
+    assert merged['sentiment_score'] == round((0.1 * 10 + 0.15 * 20 + 0.12 * 10) / 40, 2)
+    assert result[1] == intervals[3]
+
+
+def test_keeps_gaps_places_and_zero_tolerance():
+    gap = [stay(0, 10, 0.1), stay(15, 10, 0.1)]
+    assert compact_user_day(gap) == gap
+    places = [stay(0, 10, 0.1), stay(10, 10, 0.1, name='Gym')]
+    assert compact_user_day(places) == places
+    spread = [stay(0, 10, 0.1), stay(10, 10, 0.11)]
+    assert compact_user_day(spread, sentiment_tolerance=0) == spread
+
+
+def test_straight_travel_keeps_endpoints():
+    run = [travel(2 * i, 34.02 + i * 0.0001, -118.29, sentiment=0.1 * i) for i in range(5)]
+    result = compact_user_day(run, travel_tolerance_m=10)
+    assert [r['start_time'] for r in result] == [run[0]['start_time'], run[4]['start_time']]
+    assert result[0]['end_time'] == run[3]['end_time'] and result[0]['duration_minutes'] == 8
+    assert result[0]['sentiment_score'] == 0.15
+
+
+def test_travel_detour_is_kept():
+    offset = 30 / METERS_PER_DEGREE
+    run = [travel(0, 34.020, -118.29), travel(2, 34.021, -118.29 + offset), travel(4, 34.022, -118.29)]
+    assert len(compact_user_day(run, travel_tolerance_m=10)) == 3
+    assert len(compact_user_day(run, travel_tolerance_m=40)) == 2
+
+
+def test_travel_modes_are_not_joined():
+    run = [travel(2 * i, 34.020 + i * 0.0001, -118.29, mode='walking' if i < 3 else 'driving') for i in range(6)]
+    # Each mode is its own straight run, simplified to its two endpoints
+    assert [r['travel_mode'] for r in compact_user_day(run)] == ['walking', 'walking', 'driving', 'driving']
+    assert len(compact_user_day(run[:3] + [dict(r, travel_mode='walking') for r in run[3:]])) == 2
+
+
+def test_users_are_compacted_separately():
+    day = sorted([stay(0, 10, 0.1, user_id=0), stay(0, 10, 0.1, user_id=1), stay(10, 10, 0.1, user_id=0),
+                  stay(10, 10, 0.9, user_id=1)], key=lambda iv: (iv['start_time'], iv['user_id']))
+    result = compact_day(day)
+    assert [(r['user_id'], r['duration_minutes']) for r in result] == [(0, 20), (1, 10), (1, 10)]
+
+
+def test_generated_file_keeps_every_minute(tmp_path):
+    source = os.path.join(DATA_DIR, 'intervals.json')
+    output = str(tmp_path / 'compact.json')
+    stats = compact_intervals(iter_json_array(source), output)
+    before = list(iter_json_array(source))
+    with open(output, 'r', encoding='utf-8') as f:
+        after = json.load(f)
+    assert stats['intervals_in'] == len(before) and stats['intervals_out'] == len(after) < len(before)
+    assert [iv['start_time'] for iv in after] == sorted(iv['start_time'] for iv in after)
+    assert sum(iv['duration_minutes'] for iv in after) == pytest.approx(sum(iv['duration_minutes'] for iv in before))
+    # Merging only removes boundaries, it never moves them
+    assert {iv['start_time'] for iv in after} <= {iv['start_time'] for iv in before}
+    assert {iv['end_time'] for iv in after} <= {iv['end_time'] for iv in before}
+
+
+def test_unsorted_input_is_rejected(tmp_path):
+    intervals = [stay(24 * 60, 10, 0.1), stay(0, 10, 0.1)]
+    with pytest.raises(ValueError):
+        compact_intervals(intervals, str(tmp_path / 'out.json'))
@@ -0,0 +1,120 @@
+import json
+import os
+import random
+
+import pytest
+
+from filter_buildings import filter_buildings_by_radius, stream_filter_buildings_by_radius, tile_buildings
+
+
+@pytest.mark.parametrize('precision', [None, 5])
+@pytest.mark.parametrize('radius_km', [0.0, 1.0, 100.0])
+def test_streaming_filter_matches_in_memory_filter(tmp_path, precision, radius_km):
+    rng = random.Random(7)
+    features = []
+    for i in range(200):
+        lon, lat = -118.3 + rng.random() * 0.04, 34.0 + rng.random() * 0.04
+        ring = [[lon, lat], [lon + 0.0002, lat], [lon + 0.0002, lat + 0.0002], [lon, lat]]
+        features.append({'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+                         'properties': {'id': i, 'name': f"Hall \u00e9 {i}", 'levels': 2.5}})
+    features.append({'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-118.28, 34.02]},
+                     'properties': {}})
+    source = tmp_path / 'buildings.geojson'
+    source.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}, indent=2,
+                                 ensure_ascii=False), encoding='utf-8')
+
+    in_memory, streamed = tmp_path / 'memory.geojson', tmp_path / 'stream.geojson'
+    filter_buildings_by_radius(str(source), str(in_memory), 34.02, -118.28, radius_km, precision=precision)
+    stats = stream_filter_buildings_by_radius(str(source), str(streamed), 34.02, -118.28, radius_km,
+                                              precision=precision)
+    assert streamed.read_bytes() == in_memory.read_bytes()
+    kept = json.loads(streamed.read_text(encoding='utf-8'))['features']
+    assert (stats['total'], stats['kept']) == (len(features), len(kept))
+    assert 0 < len(kept) < 200 if radius_km == 1.0 else len(kept) in (0, 200)
+
+
+@pytest.fixture
+def buildings(tmp_path):
+    rng = random.Random(3)
+    features = []
+    for i in range(300):
+        lon, lat = -118.3 + rng.random() * 0.04, 34.0 + rng.random() * 0.04
+        size = 0.0001 + rng.random() * 0.0003
+        ring = [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+        features.append({'type': 'Feature', 'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+                         'properties': {'id': i}})
+    path = tmp_path / 'buildings.geojson'
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+    return str(path)
+
+
+def read_tree(root):
+    files = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+def test_tiles_cover_every_building(buildings, tmp_path):
+    manifest = tile_buildings(buildings, str(tmp_path / 'tiles'), 13, 15, workers=1)
+    assert manifest['buildings'] == 300
+    for zoom in (13, 14, 15):
+        level = [t for t in manifest['tiles'] if t['z'] == zoom]
+        assert sum(t['features'] + t['dropped'] for t in level) == 300
+    assert not os.path.exists(tmp_path / 'tiles' / '.spill')
+
+
+def test_spill_cap_does_not_change_tiles(buildings, tmp_path):
+    tile_buildings(buildings, str(tmp_path / 'a'), 13, 15, workers=1)
+    tile_buildings(buildings, str(tmp_path / 'b'), 13, 15, workers=1, buffer_bytes=2000)
+    assert read_tree(tmp_path / 'a') == read_tree(tmp_path / 'b')
+
+
+def test_leftovers_from_earlier_run_are_cleared(buildings, tmp_path):
+    tile_buildings(buildings, str(tmp_path / 'a'), 13, 15, workers=1)
+    out = tmp_path / 'b'
+    # A crashed run's spill file and a tile from a wider zoom range
+    (out / '.spill').mkdir(parents=True)
+    (out / '.spill' / '5618_13087.jsonl').write_text('{"type":"Feature"}\n')
+    (out / '12' / '1').mkdir(parents=True)
+    (out / '12' / '1' / '1.geojson').write_text('{}')
+    (out / 'README.txt').write_text('kept')
+    tile_buildings(buildings, str(out), 13, 15, workers=1)
+    tree = read_tree(out)
+    assert tree.pop('README.txt') == b'kept'
+    assert tree == read_tree(tmp_path / 'a')
+
+
+def test_multipolygons_are_tiled_and_other_geometry_counted(tmp_path):
+    big = [[-118.29, 34.02], [-118.288, 34.02], [-118.288, 34.022], [-118.29, 34.022], [-118.29, 34.02]]
+    tiny = [[-118.2875, 34.0205], [-118.28749, 34.0205], [-118.28749, 34.02051], [-118.2875, 34.0205]]
+    features = [
+        {'type': 'Feature', 'geometry': {'type': 'MultiPolygon', 'coordinates': [[big], [tiny]]},
+         'properties': {'id': 'relation/1'}},
+        {'type': 'Feature', 'geometry': {'type': 'MultiPolygon', 'coordinates': [[tiny]]},
+         'properties': {'id': 'relation/2'}},
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-118.29, 34.02]}, 'properties': {}},
+        {'type': 'Feature', 'geometry': {'type': 'LineString', 'coordinates': big}, 'properties': {}},
+    ]
+    path = tmp_path / 'buildings.geojson'
+    path.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+    out = tmp_path / 'tiles'
+    manifest = tile_buildings(str(path), str(out), 13, 17, workers=1)
+    assert (manifest['buildings'], manifest['skipped']) == (2, 2)
+
+    def tile_features(zoom):
+        level = [t for t in manifest['tiles'] if t['z'] == zoom]
+        found = []
+        for t in level:
+            with open(out / str(zoom) / str(t['x']) / f"{t['y']}.geojson", encoding='utf-8') as f:
+                found.extend(json.load(f)['features'])
+        return {f['properties']['id']: f['geometry'] for f in found}
+
+    assert tile_features(17) == {'relation/1': features[0]['geometry'], 'relation/2': features[1]['geometry']}
+    # Below max zoom the sub-pixel member is dropped; a MultiPolygon with nothing left is dropped entirely
+    low = tile_features(13)
+    assert list(low) == ['relation/1']
+    assert low['relation/1']['type'] == 'MultiPolygon' and len(low['relation/1']['coordinates']) == 1
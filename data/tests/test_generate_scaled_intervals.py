@@ -0,0 +1,88 @@
+import copy
+import json
+from datetime import datetime
+
+import pytest
+
+import generate_intervals_with_routes as gen
+from directions_stub_server import synthetic_route
+from generate_scaled_intervals import generate_scaled_intervals
+from route_cache import route_key
+from schedule_engine import ScheduleEngine
+
+START = datetime(2024, 11, 22)  # A Friday, so the range covers weekday and weekend timelines
+
+
+@pytest.fixture(scope='module')
+def routes():
+    return {route_key(*req): synthetic_route(req[1], req[0], req[3], req[2])
+            for req in gen.schedule_route_requests(START, 7, gen.location_map)}
+
+
+def generate(tmp_path, routes, name, **options):
+    path = tmp_path / name
+    generate_scaled_intervals(str(path), 5, START, 3, routes, gen.location_map, **options)
+    return path.read_bytes()
+
+
+def test_output_is_identical_for_any_worker_count(tmp_path, routes):
+    expected = generate(tmp_path, routes, 'w1.json', workers=1, users_per_task=50)
+    assert generate(tmp_path, routes, 'w2.json', workers=2, users_per_task=2) == expected
+    assert generate(tmp_path, routes, 'w3.json', workers=3, users_per_task=1) == expected
+
+
+def test_output_is_sorted_and_complete(tmp_path, routes):
+    intervals = json.loads(generate(tmp_path, routes, 'out.json', workers=1))
+    keys = [(iv['start_time'], iv['user_id']) for iv in intervals]
+    assert keys == sorted(keys)
+    assert {iv['user_id'] for iv in intervals} == set(range(5))
+    assert {iv['start_time'][:10] for iv in intervals} == {'2024-11-22', '2024-11-23', '2024-11-24'}
+
+
+def test_seed_changes_sentiment_only(tmp_path, routes):
+    a = json.loads(generate(tmp_path, routes, 'a.json', workers=1, seed=1))
+    b = json.loads(generate(tmp_path, routes, 'b.json', workers=1, seed=2))
+    strip = lambda ivs: [{k: v for k, v in iv.items() if k != 'sentiment_score'} for iv in ivs]
+    assert strip(a) == strip(b)
+    assert [iv['sentiment_score'] for iv in a] != [iv['sentiment_score'] for iv in b]
+
+
+def test_route_requests_cover_dated_rules_past_the_first_week(monkeypatch):
+    spec = copy.deepcopy(gen.SCHEDULE_SPEC)
+    spec['rules'].append({'when': {'dates': ['2024-12-25']}, 'changes': [
+        {'insert': {'at': (13, 0), 'until': (14, 0), 'location': 'ralphs', 'stress': 'low',
+                    'travel_mode': 'driving'}}]})
+    monkeypatch.setattr(gen, 'schedule_engine', ScheduleEngine(spec))
+    first_week = gen.schedule_route_requests(START, 7)
+    full_range = gen.schedule_route_requests(START, 40)
+    assert len(full_range) == len(set(full_range))
+    assert set(first_week) < set(full_range)
+
+
+def test_custom_location_set(tmp_path):
+    places = [('Flat', 'home', 'home'), ('Gym Two', 'gym', 'gym'), ('Lecture Hall', 'classroom', 'cpa'),
+              ('Corner Shop', 'grocery', 'ralphs'), ('Reading Room', 'library', 'doheny')]
+    locations = [{'name': name, 'type': kind, 'latitude': 40.0 + i * 0.002, 'longitude': -74.0 - i * 0.002,
+                  'schedule_key': key} for i, (name, kind, key) in enumerate(places)]
+    loc_map = gen.build_location_map(locations)
+    routes = {route_key(*req): synthetic_route(req[1], req[0], req[3], req[2])
+              for req in gen.schedule_route_requests(START, 2, loc_map)}
+    path = tmp_path / 'custom.json'
+    generate_scaled_intervals(str(path), 2, START, 2, routes, loc_map, workers=1)
+    stays = [iv for iv in json.loads(path.read_text()) if iv['location_type'] != 'traveling']
+    by_name = {loc['name']: loc for loc in locations}
+    assert {iv['location_name'] for iv in stays} == set(by_name)
+    for iv in stays:
+        loc = by_name[iv['location_name']]
+        assert (iv['latitude'], iv['longitude']) == (loc['latitude'], loc['longitude'])
+
+
+def test_location_set_missing_schedule_places():
+    locations = [{'name': 'Flat', 'type': 'home', 'latitude': 40.0, 'longitude': -74.0},
+                 {'name': 'Gym Two', 'type': 'gym', 'latitude': 40.0, 'longitude': -74.0, 'schedule_key': 'gym'}]
+    with pytest.raises(ValueError, match='cpa, ralphs, doheny'):
+        gen.build_location_map(locations)
+    with pytest.raises(ValueError, match='schedule_key'):
+        gen.build_location_map([dict(locations[1], schedule_key='pool')])
+    # The bundled set needs no schedule_key fields
+    assert gen.build_location_map(gen.locations) == gen.location_map
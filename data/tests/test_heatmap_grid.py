@@ -0,0 +1,134 @@
+import json
+import math
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+import heatmap_grid
+from heatmap_grid import (HEX_SIZE_PX, SQRT3, TILE_SIZE_PX, aggregate_arrays, build_heatmap, cell_rows, hex_cells,
+                          mercator)
+from interval_columns import write_interval_columns
+
+
+@pytest.fixture(scope='module')
+def columns():
+    rng = np.random.default_rng(5)
+    n = 3000
+    lon = -118.30 + rng.random(n) * 0.05
+    lat = 34.00 + rng.random(n) * 0.05
+    sentiment = np.round(rng.uniform(-1, 1, n), 3)
+    duration = rng.choice([0.0, 2.0, 30.0, 120.0], n)
+    return lon, lat, sentiment, duration
+
+
+def as_dict(table):
+    x, y, sums, durations, counts = table
+    return {(a, b): (s, d, c) for a, b, s, d, c in zip(x.tolist(), y.tolist(), sums.tolist(),
+                                                       durations.tolist(), counts.tolist())}
+
+
+def assert_tables_equal(a, b):
+    a, b = as_dict(a), as_dict(b)
+    assert a.keys() == b.keys()
+    for key in a:
+        np.testing.assert_allclose(a[key], b[key], rtol=1e-12, atol=1e-9)
+
+
+def test_square_cells_match_tile_formula(columns):
+    lon, lat, sentiment, duration = columns
+    level = 16
+    expected = defaultdict(lambda: [0.0, 0.0, 0])
+    for lo, la, s, d in zip(lon, lat, sentiment, duration):
+        # Standard slippy-map tile numbering
+        n = 2 ** level
+        x = int((lo + 180) / 360 * n)
+        y = int((1 - math.asinh(math.tan(math.radians(la))) / math.pi) / 2 * n)
+        cell = expected[(x, y)]
+        cell[0] += s * d
+        cell[1] += d
+        cell[2] += 1
+    table = aggregate_arrays(lon, lat, sentiment, duration, [level])[level]
+    got = as_dict(table)
+    assert got.keys() == expected.keys()
+    for key, (s, d, c) in expected.items():
+        np.testing.assert_allclose(got[key], (s, d, c), atol=1e-9)
+
+
+def test_duration_weighted_sentiment():
+    lon = np.full(3, -118.285)
+    lat = np.full(3, 34.02)
+    table = aggregate_arrays(lon, lat, np.array([1.0, -1.0, 0.5]), np.array([30.0, 10.0, 0.0]), [15])[15]
+    rows = cell_rows(table, 15, 'square')
+    assert rows['columns'][4:] == ['sentiment', 'duration_minutes', 'count']
+    assert [row[4:] for row in rows['cells']] == [[0.5, 40.0, 3]]
+    # No duration at all: sentiment falls back to 0
+    table = aggregate_arrays(lon[:1], lat[:1], np.array([0.9]), np.array([0.0]), [15])[15]
+    assert cell_rows(table, 15, 'square')['cells'][0][4:] == [0.0, 0.0, 1]
+
+
+def test_coarse_square_levels_equal_direct_binning(columns):
+    tables = aggregate_arrays(*columns, levels=[13, 14, 15, 16, 17, 18])
+    for level in (13, 14, 15, 16, 17):
+        assert_tables_equal(tables[level], aggregate_arrays(*columns, levels=[level])[level])
+
+
+@pytest.mark.parametrize('grid', ['square', 'hex'])
+def test_chunking_and_sparse_binning_do_not_change_cells(columns, grid, monkeypatch):
+    expected = aggregate_arrays(*columns, levels=[14, 17], grid=grid)
+    chunked = aggregate_arrays(*columns, levels=[14, 17], grid=grid, chunk_rows=257)
+    monkeypatch.setattr(heatmap_grid, 'DENSE_CELL_LIMIT', 0)
+    sparse = aggregate_arrays(*columns, levels=[14, 17], grid=grid)
+    for level in (14, 17):
+        assert_tables_equal(chunked[level], expected[level])
+        assert_tables_equal(sparse[level], expected[level])
+
+
+def test_hex_cell_is_nearest_center(columns):
+    lon, lat = columns[0], columns[1]
+    level = 17
+    mx, my = mercator(lon, lat)
+    q, r = hex_cells(mx, my, level)
+    world = TILE_SIZE_PX * 2.0 ** level
+    px, py = mx * world, my * world
+
+    def center(q, r):
+        return HEX_SIZE_PX * (SQRT3 * q + SQRT3 / 2 * r), HEX_SIZE_PX * 1.5 * r
+
+    cx, cy = center(q, r)
+    own = np.hypot(px - cx, py - cy)
+    assert own.max() <= HEX_SIZE_PX + 1e-6
+    for dq, dr in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, -1), (-1, 1)):
+        nx, ny = center(q + dq, r + dr)
+        assert np.all(own <= np.hypot(px - nx, py - ny) + 1e-6)
+
+
+def test_hex_cells_have_square_area():
+    assert 3 * SQRT3 / 2 * HEX_SIZE_PX ** 2 == pytest.approx(TILE_SIZE_PX ** 2)
+
+
+def test_build_heatmap_skips_travel_and_missing_positions(tmp_path):
+    base = {'start_time': '2024-11-18T07:00:00', 'end_time': '2024-11-18T08:00:00', 'duration_minutes': 60.0,
+            'latitude': 34.02, 'longitude': -118.285, 'location_name': 'Home', 'location_type': 'home',
+            'sentiment_score': 0.4, 'activity': 'other'}
+    intervals = [base, dict(base, location_type='traveling', location_name='Traveling', sentiment_score=-1.0),
+                 dict(base, latitude=None, longitude=None)]
+    path = str(tmp_path / 'intervals.bin')
+    write_interval_columns(intervals, path)
+
+    out = tmp_path / 'heatmap'
+    manifest = build_heatmap(path, str(out), levels=[15, 16], stays_only=True)
+    assert [level['cells'] for level in manifest['levels']] == [1, 1]
+    level = json.loads((out / 'square_16.json').read_text())
+    assert [row[4:] for row in level['cells']] == [[0.4, 60.0, 1]]
+
+    manifest = build_heatmap(path, str(out), levels=[16], grid='hex')
+    level = json.loads((out / 'hex_16.json').read_text())
+    assert manifest['hex_size_px'] == HEX_SIZE_PX
+    assert [row[4:] for row in level['cells']] == [[-0.3, 120.0, 2]]
+    assert json.loads((out / 'manifest.json').read_text()) == manifest
+
+
+def test_unknown_grid(columns):
+    with pytest.raises(ValueError):
+        aggregate_arrays(*columns, grid='triangle')
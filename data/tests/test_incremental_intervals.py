@@ -0,0 +1,69 @@
+import copy
+from datetime import datetime, timedelta
+
+import pytest
+
+import generate_intervals_with_routes as gen
+from directions_stub_server import synthetic_route
+from generate_scaled_intervals import generate_scaled_intervals
+from incremental_intervals import update_scaled_intervals
+from route_cache import route_key
+
+START = datetime(2024, 11, 21)
+
+
+@pytest.fixture(scope='module')
+def routes():
+    return {route_key(*req): synthetic_route(req[1], req[0], req[3], req[2])
+            for req in gen.schedule_route_requests(START - timedelta(days=7), 30, gen.location_map)}
+
+
+@pytest.fixture
+def build(tmp_path, routes):
+    output, manifest = str(tmp_path / 'inc.json'), str(tmp_path / 'inc.json.manifest.json')
+
+    def run(users, days, start=START, seed=0, loc_map=None):
+        loc_map = loc_map or gen.location_map
+        stats = update_scaled_intervals(output, manifest, users, start, days, routes, loc_map,
+                                        workers=1, seed=seed, users_per_task=3)
+        full = str(tmp_path / 'full.json')
+        generate_scaled_intervals(full, users, start, days, routes, loc_map, workers=1, seed=seed)
+        with open(output, 'rb') as a, open(full, 'rb') as b:
+            assert a.read() == b.read()
+        return stats
+
+    return run
+
+
+def test_sequence_matches_full_rebuilds(build):
+    stats = build(4, 3)
+    assert (stats['mode'], stats['regenerated']) == ('rewrite', 3)
+    stats = build(4, 3)
+    assert (stats['mode'], stats['reused']) == ('unchanged', 3)
+    stats = build(4, 5)
+    assert (stats['mode'], stats['reused'], stats['regenerated']) == ('append', 3, 2)
+    stats = build(6, 5)
+    assert (stats['patched'], stats['regenerated']) == (5, 0)
+    stats = build(2, 5)
+    assert (stats['patched'], stats['regenerated']) == (5, 0)
+    stats = build(2, 5, start=START + timedelta(days=2))
+    assert (stats['reused'], stats['regenerated'], stats['dropped']) == (3, 2, 2)
+    stats = build(2, 5, start=START + timedelta(days=2), seed=7)
+    assert stats['regenerated'] == 5
+
+
+def test_changed_location_regenerates_only_days_that_use_it(build):
+    build(3, 7)
+    loc_map = copy.deepcopy(gen.location_map)
+    loc_map['cpa']['latitude'] += 0.001
+    stats = build(3, 7, loc_map=loc_map)
+    # Tuesdays skip class (cpa); every other day changes
+    assert (stats['regenerated'], stats['reused']) == (6, 1)
+
+
+def test_stale_manifest_forces_full_rebuild(build, tmp_path):
+    build(3, 2)
+    with open(tmp_path / 'inc.json', 'ab') as f:
+        f.write(b'\n')
+    stats = build(3, 2)
+    assert (stats['mode'], stats['regenerated']) == ('rewrite', 2)
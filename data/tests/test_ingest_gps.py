@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from ingest_gps import format_timestamp, ingest_gps, parse_timestamp, read_points
+
+HOME = {'name': 'Home', 'type': 'home', 'latitude': 34.0250, 'longitude': -118.2900}
+LIBRARY = {'name': 'Leavey Library', 'type': 'library', 'latitude': 34.0220, 'longitude': -118.2830}
+START = parse_timestamp('2024-11-18T09:00:00')
+
+
+def trace():
+    """10 minutes at home, a 5 minute walk, 10 minutes in the library; a fix every 30 s"""
+    points = []
+    t = START
+    for _ in range(21):
+        points.append((t, HOME['latitude'], HOME['longitude'], 0.2))
+        t += 30
+    for i in range(1, 10):
+        f = i / 10
+        points.append((t, HOME['latitude'] + f * (LIBRARY['latitude'] - HOME['latitude']),
+                       HOME['longitude'] + f * (LIBRARY['longitude'] - HOME['longitude']), None))
+        t += 30
+    for _ in range(21):
+        points.append((t, LIBRARY['latitude'], LIBRARY['longitude'], -0.4))
+        t += 30
+    return points
+
+
+def write_csv(path, points, bad_rows=()):
+    lines = ['time,lat,lng,sentiment']
+    for t, lat, lon, sentiment in points:
+        lines.append(f"{format_timestamp(t)},{lat},{lon},{'' if sentiment is None else sentiment}")
+    lines[2:2] = bad_rows
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def write_gpx(path, points):
+    parts = ['<?xml version="1.0"?>\n<gpx xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>']
+    for t, lat, lon, sentiment in points:
+        extra = '' if sentiment is None else f'<extensions><sentiment>{sentiment}</sentiment></extensions>'
+        parts.append(f'<trkpt lat="{lat}" lon="{lon}"><time>{format_timestamp(t)}Z</time>{extra}</trkpt>')
+    parts.append('</trkseg></trk></gpx>')
+    path.write_text('\n'.join(parts))
+
+
+def ingest(tmp_path, input_file, **options):
+    output = tmp_path / 'out.json'
+    stats = ingest_gps(str(input_file), str(output), [HOME, LIBRARY], **options)
+    return stats, json.loads(output.read_text())
+
+
+def test_csv_and_gpx_read_the_same_points(tmp_path):
+    points = trace()
+    write_csv(tmp_path / 'trace.csv', points)
+    write_gpx(tmp_path / 'trace.gpx', points)
+    assert list(read_points(str(tmp_path / 'trace.csv'))) == points
+    assert list(read_points(str(tmp_path / 'trace.gpx'))) == points
+
+
+def test_stays_and_travel(tmp_path):
+    write_gpx(tmp_path / 'trace.gpx', trace())
+    stats, intervals = ingest(tmp_path, tmp_path / 'trace.gpx')
+    assert stats['points'] == 51
+    stays = [iv for iv in intervals if iv['location_type'] != 'traveling']
+    assert [(iv['location_name'], iv['activity'], iv['sentiment_score']) for iv in stays] == \
+        [('Home', 'other', 0.2), ('Leavey Library', 'studying', -0.4)]
+    assert stats['stays'] == 2
+    assert all(iv['travel_mode'] == 'walking' for iv in intervals if iv['location_type'] == 'traveling')
+    # Intervals tile the trace without gaps or overlaps
+    assert intervals[0]['start_time'] == '2024-11-18T09:00:00'
+    for before, after in zip(intervals, intervals[1:]):
+        assert before['end_time'] == after['start_time']
+    total = sum(iv['duration_minutes'] for iv in intervals)
+    assert total == pytest.approx((len(trace()) - 1) * 0.5)
+
+
+def test_csv_skips_malformed_rows(tmp_path):
+    write_csv(tmp_path / 'trace.csv', trace(), bad_rows=['not a time,34.0,-118.0,', '2024-11-18T09:00:10,,,'])
+    write_gpx(tmp_path / 'trace.gpx', trace())
+    csv_stats, from_csv = ingest(tmp_path, tmp_path / 'trace.csv')
+    _, from_gpx = ingest(tmp_path, tmp_path / 'trace.gpx')
+    assert csv_stats['points'] == 51
+    assert from_csv == from_gpx
+
+
+def test_gpx_skips_points_without_time(tmp_path):
+    path = tmp_path / 'trace.gpx'
+    path.write_text('<gpx><wpt lat="34.0" lon="-118.0"/><rte><rtept lat="34.0" lon="-118.0">'
+                    '<time>2024-11-18T09:00:00Z</time></rtept><rtept lat="x" lon="-118.0">'
+                    '<time>2024-11-18T09:01:00Z</time></rtept></rte></gpx>')
+    assert list(read_points(str(path))) == [(START, 34.0, -118.0, None)]
+
+
+def test_utc_offset_applies_to_zoned_times_only():
+    assert parse_timestamp('2024-11-18T17:00:00Z', utc_offset=-8) == START
+    assert parse_timestamp(str(START + 8 * 3600), utc_offset=-8) == START
+    assert parse_timestamp('2024-11-18T09:00:00', utc_offset=-8) == START
@@ -0,0 +1,74 @@
+import json
+
+import numpy as np
+import pytest
+
+from artifacts import round_floats, write_json
+from interval_columns import (MAGIC, IntervalColumns, binary_to_json, json_to_binary, open_intervals,
+                              write_interval_columns)
+
+INTERVALS = [
+    {'start_time': '2024-11-18T07:00:00', 'end_time': '2024-11-18T08:30:00', 'duration_minutes': 90.0,
+     'latitude': 34.025, 'longitude': -118.29, 'location_name': 'Home', 'location_type': 'home',
+     'sentiment_score': 0.08, 'activity': 'morning_routine'},
+    {'start_time': '2024-11-18T08:30:00', 'end_time': '2024-11-18T08:32:00', 'duration_minutes': 2.0,
+     'latitude': 34.0241234, 'longitude': -118.2871234, 'location_name': 'Traveling',
+     'location_type': 'traveling', 'sentiment_score': -0.123456, 'activity': 'traveling',
+     'travel_mode': 'walking', 'user_id': 3},
+    {'start_time': '2024-11-18T08:32:00.500000', 'end_time': '2024-11-18T09:00:00', 'duration_minutes': 27.5,
+     'latitude': 34.0205, 'longitude': -118.2856, 'location_name': 'Lyon Center', 'location_type': 'gym',
+     'sentiment_score': -0.2, 'activity': 'other', 'user_id': 3},
+]
+
+
+def test_round_trip_is_byte_identical(tmp_path):
+    json_file, bin_file, back = tmp_path / 'in.json', tmp_path / 'in.bin', tmp_path / 'back.json'
+    write_json(str(json_file), round_floats(INTERVALS, 6))
+    json_to_binary(str(json_file), str(bin_file))
+    info = binary_to_json(str(bin_file), str(back))
+    assert info['count'] == len(INTERVALS)
+    assert back.read_bytes() == json_file.read_bytes()
+
+
+def test_missing_fields_stay_missing(tmp_path):
+    path = str(tmp_path / 'in.bin')
+    write_interval_columns(INTERVALS, path)
+    with IntervalColumns(path) as cols:
+        assert list(cols.records()) == INTERVALS
+        assert cols['user_id'].tolist()[1:] == [3, 3]
+        codes, dictionary = cols.categorical('travel_mode')
+        assert [dictionary[c] for c in codes] == [None, 'walking', None]
+
+
+def test_columns_are_aligned_views(tmp_path):
+    path = str(tmp_path / 'in.bin')
+    header = write_interval_columns(INTERVALS, path)
+    assert all(column['offset'] % 8 == 0 for column in header['columns'])
+    with IntervalColumns(path) as cols:
+        assert len(cols) == 3
+        np.testing.assert_allclose(cols['sentiment_score'], [0.08, -0.123456, -0.2])
+        assert 'travel_mode' in cols and 'extra' not in cols
+
+
+def test_unknown_field_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        write_interval_columns([dict(INTERVALS[0], colour='red')], str(tmp_path / 'x.bin'))
+
+
+@pytest.mark.parametrize('prefix', [b'', b'\n  ', b'\xef\xbb\xbf', b'\xef\xbb\xbf\r\n'])
+def test_open_intervals_detects_json(tmp_path, prefix):
+    path = tmp_path / 'intervals.json'
+    path.write_bytes(prefix + json.dumps(INTERVALS, indent=2).encode('utf-8'))
+    cols = open_intervals(str(path))
+    assert list(cols.records()) == INTERVALS
+    cols.close()
+
+
+def test_open_intervals_maps_binary(tmp_path):
+    path = str(tmp_path / 'intervals.bin')
+    write_interval_columns(INTERVALS, path)
+    with open(path, 'rb') as f:
+        assert f.read(len(MAGIC)) == MAGIC
+    with open_intervals(path) as cols:
+        assert cols._file.name == path  # Mapped in place, not converted
+        assert len(cols) == len(INTERVALS)
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+
+from osm_to_geojson import NodeStore, assemble_rings, osm_to_geojson, point_in_ring
+
+# Grid of nodes: id 100 + 10 * row + col at (lon, lat) = (col, row) / 1000
+NODES = [{'type': 'node', 'id': 100 + 10 * row + col, 'lon': col / 1000, 'lat': row / 1000}
+         for row in range(6) for col in range(6)]
+
+
+def node(row, col):
+    return 100 + 10 * row + col
+
+
+def coord(row, col):
+    return [col / 1000, row / 1000]
+
+
+def square(row, col, size):
+    corners = [(row, col), (row, col + size), (row + size, col + size), (row + size, col), (row, col)]
+    return [node(*c) for c in corners], [coord(*c) for c in corners]
+
+
+ELEMENTS = NODES + [
+    # Plain building way
+    {'type': 'way', 'id': 1, 'nodes': square(0, 0, 1)[0], 'tags': {'building': 'yes', 'name': 'A'}},
+    # building=no and untagged ways are skipped
+    {'type': 'way', 'id': 2, 'nodes': square(0, 2, 1)[0], 'tags': {'building': 'no'}},
+    {'type': 'way', 'id': 3, 'nodes': square(0, 4, 1)[0]},
+    # Unclosed and incomplete building ways
+    {'type': 'way', 'id': 4, 'nodes': square(2, 0, 1)[0][:-1], 'tags': {'building': 'yes'}},
+    {'type': 'way', 'id': 5, 'nodes': [node(2, 2), 9999, node(3, 3), node(2, 2)], 'tags': {'building': 'yes'}},
+    # Inline geometry (Overpass 'out geom')
+    {'type': 'way', 'id': 6, 'geometry': [{'lon': c[0], 'lat': c[1]} for c in square(4, 4, 1)[1]],
+     'tags': {'building': 'house'}},
+    # Multipolygon: outer ring split into two ways (one reversed), plus an inner courtyard
+    {'type': 'way', 'id': 10, 'nodes': [node(2, 2), node(2, 5), node(5, 5)]},
+    {'type': 'way', 'id': 11, 'nodes': [node(2, 2), node(5, 2), node(5, 5)]},
+    {'type': 'way', 'id': 12, 'nodes': square(3, 3, 1)[0]},
+    {'type': 'relation', 'id': 20, 'tags': {'type': 'multipolygon', 'building': 'university'}, 'members': [
+        {'type': 'way', 'ref': 10, 'role': 'outer'}, {'type': 'way', 'ref': 11, 'role': 'outer'},
+        {'type': 'way', 'ref': 12, 'role': 'inner'}, {'type': 'node', 'ref': node(0, 0), 'role': ''}]},
+    # Relations that are not buildings are ignored
+    {'type': 'relation', 'id': 21, 'tags': {'type': 'multipolygon', 'landuse': 'grass'},
+     'members': [{'type': 'way', 'ref': 3, 'role': 'outer'}]},
+]
+
+
+@pytest.fixture
+def osm_file(tmp_path):
+    path = tmp_path / 'osm.json'
+    path.write_text(json.dumps({'version': 0.6, 'elements': ELEMENTS}))
+    return str(path)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('spill', [False, True])
+def test_converts_ways_and_relations(osm_file, tmp_path, compact, spill):
+    output = str(tmp_path / 'out.geojson')
+    stats = osm_to_geojson(osm_file, output, node_store_dir=str(tmp_path / 'nodes') if spill else None,
+                           compact=compact)
+    with open(output, 'r', encoding='utf-8') as f:
+        features = json.load(f)['features']
+    by_id = {f['properties']['id']: f for f in features}
+    assert sorted(by_id) == [1, 6, 20]
+    assert (stats['incomplete_ways'], stats['unclosed_ways'], stats['relation_features']) == (1, 1, 1)
+
+    assert by_id[1]['geometry'] == {'type': 'Polygon', 'coordinates': [square(0, 0, 1)[1]]}
+    assert by_id[1]['properties']['tags'] == {'building': 'yes', 'name': 'A'}
+    assert by_id[6]['geometry']['coordinates'] == [square(4, 4, 1)[1]]
+
+    outer, inner = by_id[20]['geometry']['coordinates']
+    assert outer[0] == outer[-1] and len(outer) == 5
+    assert {tuple(c) for c in outer} == {tuple(coord(r, c)) for r in (2, 5) for c in (2, 5)}
+    assert inner == square(3, 3, 1)[1]
+
+
+def test_assemble_rings_joins_and_reverses_segments():
+    a, b, c, d = [0, 0], [1, 0], [1, 1], [0, 1]
+    rings, unclosed = assemble_rings([[a, b], [c, b], [c, d, a]])
+    assert unclosed == 0 and len(rings) == 1
+    assert rings[0][0] == rings[0][-1] and len(rings[0]) == 5
+    rings, unclosed = assemble_rings([[a, b, c]])
+    assert (rings, unclosed) == ([], 1)
+
+
+def test_relation_with_two_outers_gives_two_polygons(tmp_path):
+    elements = NODES + [
+        {'type': 'way', 'id': 1, 'nodes': square(0, 0, 1)[0]},
+        {'type': 'way', 'id': 2, 'nodes': square(3, 3, 2)[0]},
+        {'type': 'way', 'id': 3, 'nodes': square(3, 3, 1)[0]},
+        {'type': 'relation', 'id': 9, 'tags': {'type': 'multipolygon', 'building': 'yes'}, 'members': [
+            {'type': 'way', 'ref': 1, 'role': 'outer'}, {'type': 'way', 'ref': 2, 'role': 'outer'},
+            {'type': 'way', 'ref': 3, 'role': 'inner'}]},
+    ]
+    path = tmp_path / 'osm.json'
+    path.write_text(json.dumps({'elements': elements}))
+    osm_to_geojson(str(path), str(tmp_path / 'out.geojson'), compact=True)
+    features = json.loads((tmp_path / 'out.geojson').read_text())['features']
+    assert sorted(len(f['geometry']['coordinates']) for f in features) == [1, 2]
+
+
+def test_node_store_sorts_and_reports_missing():
+    store = NodeStore()
+    for node_id, lon in ((30, 3.0), (10, 1.0), (20, 2.0)):
+        store.add(node_id, lon, 0.5)
+    store.finalize()
+    assert store.lookup([20, 10]).tolist() == [[2.0, 0.5], [1.0, 0.5]]
+    assert store.lookup([10, 15]) is None and store.lookup([99]) is None
+
+
+def test_point_in_ring():
+    ring = square(0, 0, 2)[1]
+    assert point_in_ring(0.001, 0.001, ring)
+    assert not point_in_ring(0.003, 0.001, ring)
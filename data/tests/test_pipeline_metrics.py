@@ -0,0 +1,101 @@
+import argparse
+import json
+import pstats
+import time
+
+import pytest
+
+import pipeline_metrics
+from pipeline_metrics import Metrics, add_metrics_arguments, instrumented, metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def parse(*argv):
+    parser = argparse.ArgumentParser()
+    add_metrics_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def test_nested_spans_and_counters():
+    m = Metrics()
+    with m.span('outer'):
+        for _ in range(3):
+            with m.span('inner'):
+                time.sleep(0.002)
+        m.count('rows', 5)
+    with m.span('outer'):
+        pass
+    m.count('rows')
+
+    @m.timed('work')
+    def work(x):
+        return x * 2
+
+    assert work(4) == 8
+    snapshot = m.snapshot()
+    spans = snapshot['spans']
+    assert (spans['outer']['calls'], spans['inner']['calls'], spans['work']['calls']) == (2, 3, 1)
+    # Spans are flat: the outer span's time includes the inner one's
+    assert spans['outer']['seconds'] >= spans['inner']['seconds'] >= 0.006
+    assert snapshot['counters'] == {'rows': 6}
+
+
+def test_drain_and_merge():
+    worker = Metrics()
+    with worker.span('generate'):
+        pass
+    worker.count('intervals', 10)
+    shipped = worker.drain()
+    assert worker.spans == {} and worker.counters == {}
+
+    parent = Metrics()
+    parent.count('intervals', 1)
+    parent.merge(shipped)
+    parent.merge(shipped)
+    snapshot = parent.snapshot()
+    assert snapshot['counters'] == {'intervals': 21}
+    assert snapshot['spans']['generate']['calls'] == 2
+    assert snapshot['worker_peak_rss_mb'] == shipped['peak_rss_mb']
+
+
+def test_instrumented_writes_metrics_and_profile(tmp_path, capsys):
+    out, prof = tmp_path / 'metrics.json', tmp_path / 'run.prof'
+    with instrumented(parse('--metrics-out', str(out), '--profile-out', str(prof)), script='stage.py') as m:
+        with m.span('load'):
+            sum(range(1000))
+        m.count('items', 3)
+    report = json.loads(out.read_text())
+    assert report['script'] == 'stage.py'
+    assert report['spans']['load']['calls'] == 1 and report['counters'] == {'items': 3}
+    assert report['wall_seconds'] >= report['spans']['load']['seconds']
+    assert report['peak_rss_mb'] > 0
+    assert pstats.Stats(str(prof)).total_calls > 0
+    assert 'load' in capsys.readouterr().out
+
+
+def test_no_output_unless_requested(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with instrumented(parse()):
+        metrics.count('items')
+    assert list(tmp_path.iterdir()) == []
+
+
+def no_proc(*args, **kwargs):
+    raise OSError('no /proc')
+
+
+def test_peak_rss_without_resource_module(monkeypatch):
+    # Windows: neither /proc nor the resource module
+    monkeypatch.setattr(pipeline_metrics, 'resource', None)
+    monkeypatch.setattr(pipeline_metrics, 'open', no_proc, raising=False)
+    assert pipeline_metrics.peak_rss_mb() is None
+    m = Metrics()
+    assert m.snapshot()['peak_rss_mb'] is None
+    assert 'peak RSS' not in m.summary()
+    m.merge(m.snapshot())
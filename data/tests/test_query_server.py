@@ -0,0 +1,147 @@
+import random
+
+import pytest
+import requests
+
+from interval_columns import from_epoch_seconds, open_intervals, write_interval_columns
+from query_server import (IntervalIndex, LRUCache, QueryError, parse_bbox, parse_limit, parse_time,
+                          start_query_server)
+
+BASE = 1731913200  # 2024-11-18T07:00:00
+
+
+def make_intervals(n=400, seed=1):
+    rng = random.Random(seed)
+    intervals = []
+    t = BASE
+    for i in range(n):
+        duration = rng.choice([5, 30, 90, 600])
+        start, t = t, t + rng.randint(0, 3) * 600
+        intervals.append({
+            'start_time': from_epoch_seconds(start),
+            'end_time': from_epoch_seconds(start + duration * 60),
+            'location_name': rng.choice(['Home', 'Library', 'Gym']),
+            'location_type': 'home',
+            'latitude': round(34.0 + rng.random() * 0.05, 6),
+            'longitude': round(-118.3 + rng.random() * 0.05, 6),
+            'sentiment_score': round(rng.uniform(-1, 1), 3),
+            'duration_minutes': duration,
+            'user_id': i % 3
+        })
+    return intervals
+
+
+@pytest.fixture(scope='module')
+def dataset(tmp_path_factory):
+    intervals = make_intervals()
+    path = str(tmp_path_factory.mktemp('query') / 'intervals.bin')
+    write_interval_columns(intervals, path)
+    return intervals, IntervalIndex(open_intervals(path), cell_size=0.01)
+
+
+def brute_force(intervals, start=None, end=None, bbox=None, user=None, at=None):
+    keys = []
+    for iv in sorted(intervals, key=lambda iv: iv['start_time']):
+        s, e = parse_time(iv['start_time']), parse_time(iv['end_time'])
+        if at is not None:
+            if not s <= at < e:
+                continue
+        elif (end is not None and s >= end) or (start is not None and e <= start):
+            continue
+        if bbox is not None and not (bbox[0] <= iv['longitude'] <= bbox[2] and bbox[1] <= iv['latitude'] <= bbox[3]):
+            continue
+        if user is not None and iv['user_id'] != user:
+            continue
+        keys.append((iv['start_time'], iv['end_time'], iv['latitude'], iv['longitude']))
+    return sorted(keys)
+
+
+def result_keys(index, rows):
+    return sorted((r['start_time'], r['end_time'], r['latitude'], r['longitude'])
+                  for r in index.records(rows, ['start_time', 'end_time', 'latitude', 'longitude']))
+
+
+@pytest.mark.parametrize('query', [
+    {},
+    {'start': BASE + 3600, 'end': BASE + 4 * 3600},
+    {'bbox': (-118.3, 34.0, -118.28, 34.02)},
+    {'start': BASE, 'end': BASE + 86400, 'bbox': (-118.29, 34.01, -118.26, 34.04), 'user': 1},
+    {'at': BASE + 5 * 3600},
+    {'at': BASE + 5 * 3600, 'bbox': (-118.3, 34.0, -118.25, 34.03)},
+])
+def test_query_matches_brute_force(dataset, query):
+    intervals, index = dataset
+    rows = index.query(**query)
+    assert list(rows) == sorted(rows)
+    assert result_keys(index, rows) == brute_force(intervals, **query)
+
+
+def test_records_round_trip(dataset):
+    intervals, index = dataset
+    records = index.records(index.query(), index.fields)
+    assert sorted(records, key=lambda r: (r['start_time'], r['latitude'])) == \
+        sorted(intervals, key=lambda r: (r['start_time'], r['latitude']))
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', '1e400', 'tomorrow'])
+def test_parse_time_rejects_invalid(value):
+    with pytest.raises(QueryError):
+        parse_time(value)
+
+
+@pytest.mark.parametrize('value', ['1,2,3', '0,0,nan,1', '-inf,0,1,1', '1,0,0,1', 'a,b,c,d'])
+def test_parse_bbox_rejects_invalid(value):
+    with pytest.raises(QueryError):
+        parse_bbox(value)
+
+
+@pytest.mark.parametrize('value', ['-1', '1.5', 'all'])
+def test_parse_limit_rejects_invalid(value):
+    with pytest.raises(QueryError):
+        parse_limit(value)
+
+
+def test_parsing_accepts_valid_values():
+    assert parse_time('2024-11-18T07:00:00') == parse_time(str(BASE)) == BASE
+    assert parse_bbox('-118.3,34,-118.2,34.1') == (-118.3, 34.0, -118.2, 34.1)
+    assert parse_limit('0') == 0
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, max_bytes=10)
+    cache.put(('a',), b'1234')
+    cache.put(('b',), b'1234')
+    assert cache.get(('a',)) == b'1234'
+    cache.put(('c',), b'1234')  # over max_entries: 'b' is the oldest
+    assert cache.get(('b',)) is None
+    cache.put(('d',), b'1234567')  # over max_bytes: both older entries go
+    assert cache.stats() == {'entries': 1, 'bytes': 7, 'hits': 1, 'misses': 1}
+    assert cache.get(('d',)) == b'1234567'
+    cache.put(('e',), b'x' * 11)  # larger than the whole cache: not stored
+    assert cache.get(('e',)) is None
+
+
+def test_http_queries(dataset):
+    intervals, index = dataset
+    server, url = start_query_server(index, limit=5)
+    try:
+        response = requests.get(url + '/intervals', params={'start': BASE, 'end': BASE + 86400})
+        body = response.json()
+        assert response.status_code == 200
+        assert body['count'] == 5 and body['truncated']
+
+        params = {'time': from_epoch_seconds(BASE + 5 * 3600), 'format': 'records', 'limit': 1000}
+        body = requests.get(url + '/at', params=params).json()
+        assert body['count'] == len(brute_force(intervals, at=BASE + 5 * 3600))
+        assert not body['truncated']
+
+        for params in ({'start': 'nan'}, {'bbox': '0,0,inf,1'}, {'limit': -1}, {'format': 'csv'},
+                       {'fields': 'nope'}, {'colour': 'red'}):
+            response = requests.get(url + '/intervals', params=params)
+            assert response.status_code == 400, params
+            assert 'message' in response.json()
+        assert requests.get(url + '/other').status_code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
@@ -0,0 +1,113 @@
+import json
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytest
+
+from rollup_intervals import bucket_parts, location_key, rollup_intervals
+
+START = datetime(2024, 11, 18)
+PLACES = [('Home', 'home', 34.025, -118.29), ('Doheny Library', 'library', 34.0205, -118.2839),
+          ('Traveling', 'traveling', 34.022, -118.286)]
+
+
+def interval(start, minutes, sentiment, place=0):
+    name, kind, lat, lon = PLACES[place]
+    return {'start_time': start.isoformat(), 'end_time': (start + timedelta(minutes=minutes)).isoformat(),
+            'duration_minutes': minutes, 'latitude': lat, 'longitude': lon, 'location_name': name,
+            'location_type': kind, 'sentiment_score': sentiment}
+
+
+@pytest.fixture(scope='module')
+def intervals():
+    rng = random.Random(3)
+    result = [
+        interval(START + timedelta(hours=23, minutes=30), 90, 0.4),  # Crosses midnight
+        interval(START + timedelta(days=1, hours=5, minutes=59), 2, -0.2, 1),  # Crosses an hour and 6h edge
+        interval(START + timedelta(days=1, hours=8), 0, 0.9, 1),  # No duration
+        interval(START + timedelta(days=1, hours=20), 30 * 60, 0.1),  # Runs through the next day
+    ]
+    for _ in range(400):
+        start = START + timedelta(days=rng.randrange(4), minutes=rng.randrange(24 * 60))
+        result.append(interval(start, rng.choice([1, 2, 20, 45, 100, 200, 500]), round(rng.uniform(-1, 1), 2),
+                               rng.randrange(len(PLACES))))
+    return sorted(result, key=lambda iv: iv['start_time'])
+
+
+def brute_force(intervals, size):
+    """Walk every interval minute by minute"""
+    cells = defaultdict(lambda: [0.0, 0.0, set()])
+    for n, iv in enumerate(intervals):
+        start = datetime.fromisoformat(iv['start_time'])
+        minutes = [start + timedelta(minutes=m) for m in range(iv['duration_minutes'])] or [start]
+        for t in minutes:
+            cell = cells[(location_key(iv), t.date().isoformat(), t.hour // size * size)]
+            weight = 1 if iv['duration_minutes'] else 0
+            cell[0] += iv['sentiment_score'] * weight
+            cell[1] += weight
+            cell[2].add(n)
+    return cells
+
+
+def read_cube(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        cube = json.load(f)
+    keys = [loc['key'] for loc in cube['locations']]
+    daily = {(size, keys[loc], day, bucket): (avg, count, total)
+             for size, loc, day, bucket, avg, count, total in cube['rows']}
+    lifetime = {(size, keys[loc], bucket): (avg, count, total)
+                for size, loc, bucket, avg, count, total in cube['lifetime']}
+    return cube, daily, lifetime
+
+
+def test_cube_matches_minute_by_minute_split(tmp_path, intervals):
+    path = str(tmp_path / 'rollup.json')
+    stats = rollup_intervals(intervals, path, bucket_sizes=(1, 3, 6))
+    cube, daily, lifetime = read_cube(path)
+    assert stats['intervals'] == len(intervals)
+    assert [row[2] for row in cube['rows']] == sorted(row[2] for row in cube['rows'])
+
+    for size in (1, 3, 6):
+        expected = brute_force(intervals, size)
+        got = {key[1:]: value for key, value in daily.items() if key[0] == size}
+        assert got.keys() == expected.keys()
+        for key, (weighted, total, members) in expected.items():
+            avg = weighted / total if total else 0
+            assert got[key] == pytest.approx((avg, len(members), total), abs=1e-6)
+
+        totals = defaultdict(lambda: [0.0, 0.0, 0])
+        for (location, _, bucket), (weighted, total, members) in expected.items():
+            entry = totals[(location, bucket)]
+            entry[0] += weighted
+            entry[1] += total
+            entry[2] += len(members)
+        for (location, bucket), (weighted, total, count) in totals.items():
+            avg = weighted / total if total else 0
+            assert lifetime[(size, location, bucket)] == pytest.approx((avg, count, total), abs=1e-6)
+
+
+def test_midnight_crossing_is_split_between_days(tmp_path):
+    path = str(tmp_path / 'rollup.json')
+    late = interval(START + timedelta(hours=23, minutes=30), 90, 0.4)
+    rollup_intervals([late], path, bucket_sizes=(1, 6))
+    _, daily, _ = read_cube(path)
+    key = location_key(late)
+    assert daily == {(1, key, '2024-11-18', 23): (0.4, 1, 30), (1, key, '2024-11-19', 0): (0.4, 1, 60),
+                     (6, key, '2024-11-18', 18): (0.4, 1, 30), (6, key, '2024-11-19', 0): (0.4, 1, 60)}
+
+
+def test_bucket_parts():
+    assert list(bucket_parts(datetime(2024, 1, 1, 2, 30), 90, 3)) == [(0, 0, 30), (0, 3, 60)]
+    assert list(bucket_parts(datetime(2024, 1, 1, 2, 30, 30), 1, 1)) == [(0, 2, 1)]
+    assert list(bucket_parts(datetime(2024, 1, 1, 23), 60, 6)) == [(0, 18, 60)]
+    assert list(bucket_parts(datetime(2024, 1, 1, 23), 0, 6)) == [(0, 18, 0)]
+    assert [part[:2] for part in bucket_parts(datetime(2024, 1, 1, 12), 48 * 60, 24)] == [(0, 0), (1, 0), (2, 0)]
+
+
+def test_invalid_input(tmp_path, intervals):
+    with pytest.raises(ValueError):
+        rollup_intervals(intervals, str(tmp_path / 'out.json'), bucket_sizes=(5,))
+    with pytest.raises(ValueError):
+        rollup_intervals(list(reversed(intervals)), str(tmp_path / 'out.json'))
+    assert not (tmp_path / 'out.json').exists()
@@ -0,0 +1,113 @@
+import pytest
+
+import route_cache
+from route_cache import RouteCache, decode_geometry, encode_geometry, route_key
+from route_fetcher import fetch_routes
+
+ROUTE = [[-118.29, 34.025], [-118.2881234567891, 34.0249], [-118.283, 34.022]]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake time.time() for the cache: advances one second per call unless set"""
+    state = {'now': 1_000_000.0}
+
+    def now():
+        state['now'] += 1
+        return state['now']
+
+    monkeypatch.setattr(route_cache.time, 'time', now)
+    return state
+
+
+@pytest.fixture
+def make_cache(tmp_path):
+    caches = []
+
+    def make(**options):
+        cache = RouteCache(str(tmp_path / 'routes.sqlite'), **options)
+        caches.append(cache)
+        return cache
+
+    yield make
+    for cache in caches:
+        cache.close()
+
+
+def test_geometry_round_trip_is_lossless():
+    assert decode_geometry(encode_geometry(ROUTE)) == ROUTE
+
+
+def test_key_ignores_float_noise():
+    assert route_key(34.0250000001, -118.29, 34.022, -118.283, 'walking') == \
+        route_key(34.025, -118.29, 34.022, -118.283, 'walking')
+    assert route_key(34.025, -118.29, 34.022, -118.283, 'walking') != \
+        route_key(34.025, -118.29, 34.022, -118.283, 'driving')
+
+
+def test_get_and_persist(make_cache):
+    cache = make_cache()
+    assert cache.get('a') is None
+    cache.put('a', ROUTE, 'walking')
+    assert cache.get('a') == ROUTE
+    cache.close()
+    reopened = make_cache()
+    assert reopened.get('a') == ROUTE
+    assert reopened.stats()['entries'] == 1
+
+
+def test_ttl_expires_entries(make_cache, clock):
+    cache = make_cache(ttl_seconds=100)
+    cache.put('old', ROUTE)
+    clock['now'] += 50
+    cache.put('new', ROUTE)
+    assert cache.get('old') == ROUTE
+    clock['now'] += 60  # 'old' is now 111+ seconds old, 'new' about 61
+    assert cache.get('old') is None
+    assert cache.get('new') == ROUTE
+    stats = cache.stats()
+    assert (stats['entries'], stats['expired'], stats['hits'], stats['misses']) == (1, 1, 2, 1)
+
+    clock['now'] += 100
+    assert cache.purge_expired() == 1
+    assert cache.stats()['entries'] == 0
+
+
+def test_lru_eviction_by_entries(make_cache, clock):
+    cache = make_cache(max_entries=2)
+    cache.put('a', ROUTE)
+    cache.put('b', ROUTE)
+    assert cache.get('a') == ROUTE  # 'b' is now least recently used
+    cache.put('c', ROUTE)
+    assert cache.get('b') is None
+    assert cache.get('a') == ROUTE and cache.get('c') == ROUTE
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_eviction_by_bytes(make_cache, clock):
+    size = len(encode_geometry(ROUTE))
+    cache = make_cache(max_bytes=2 * size)
+    for key in 'abc':
+        cache.put(key, ROUTE)
+    assert cache.stats()['geometry_bytes'] <= 2 * size
+    assert cache.get('a') is None and cache.get('c') == ROUTE
+
+
+def test_export_import(make_cache, tmp_path):
+    cache = make_cache()
+    cache.put('a', ROUTE, 'walking')
+    fixture = str(tmp_path / 'routes.json')
+    assert cache.export_json(fixture) == 1
+    other = RouteCache(str(tmp_path / 'other.sqlite'))
+    assert other.import_json(fixture) == 1
+    assert other.get('a') == ROUTE
+    other.close()
+
+
+def test_fetch_routes_offline_uses_cache(make_cache):
+    cache = make_cache()
+    cached = (34.025, -118.29, 34.022, -118.283, 'walking')
+    uncached = (34.02, -118.28, 34.03, -118.29, 'driving')
+    cache.put(route_key(*cached), ROUTE, 'walking')
+    routes = fetch_routes([cached, uncached, cached], 'token', route_cache=cache, offline=True)
+    assert routes == {route_key(*cached): ROUTE, route_key(*uncached): None}
@@ -0,0 +1,75 @@
+import pytest
+
+from directions_stub_server import start_stub_server, synthetic_route
+from route_cache import route_key
+from route_fetcher import RouteFetcher, fetch_routes
+
+REQUESTS = [(34.02, -118.28, 34.03, -118.29, 'walking'),
+            (34.01, -118.27, 34.02, -118.26, 'driving')]
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**options):
+        server, url = start_stub_server(**options)
+        servers.append(server)
+        return server, url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetches_routes(stub):
+    _, url = stub()
+    routes = fetch_routes(REQUESTS, 'token', api_url=url, max_workers=2, rate_limit=None)
+    lat1, lon1, lat2, lon2, _ = REQUESTS[0]
+    assert routes[route_key(*REQUESTS[0])] == synthetic_route(lon1, lat1, lon2, lat2)
+    assert all(routes.values())
+
+
+def test_retries_transient_errors_then_gives_up(stub):
+    server, url = stub(failure_rate=1.0)
+    fetcher = RouteFetcher('token', api_url=url, max_workers=1, rate_limit=None, retries=2, backoff=0.001)
+    assert fetcher.fetch(*REQUESTS[0]) is None
+    assert fetcher.stats == {'requests': 3, 'retries': 2, 'failures': 1, 'fetched': 0}
+    assert server.served == {503: 3}
+
+
+def test_rate_limited_requests_are_retried(stub):
+    _, url = stub(rate_limit=1)
+    fetcher = RouteFetcher('token', api_url=url, max_workers=2, rate_limit=None, retries=5, backoff=0.2)
+    routes = fetcher.fetch_many(REQUESTS)
+    assert all(routes.values())
+    assert fetcher.stats['retries'] >= 1
+
+
+def test_malformed_responses_fall_back_to_none(stub):
+    _, url = stub(malformed_rate=1.0)
+    fetcher = RouteFetcher('token', api_url=url, max_workers=2, rate_limit=None, retries=2, backoff=0.001)
+    routes = fetcher.fetch_many(REQUESTS * 3)
+    assert routes == {route_key(*req): None for req in REQUESTS}
+    # Malformed bodies are failures, not retried
+    assert fetcher.stats['failures'] == len(REQUESTS)
+    assert fetcher.stats['retries'] == 0
+
+
+@pytest.mark.parametrize('body_index', [0, 1, 2])
+def test_each_malformed_body_is_a_failure(stub, body_index, monkeypatch):
+    import directions_stub_server
+    monkeypatch.setattr(directions_stub_server, 'MALFORMED_BODIES',
+                        [directions_stub_server.MALFORMED_BODIES[body_index]])
+    _, url = stub(malformed_rate=1.0)
+    routes = fetch_routes(REQUESTS[:1], 'token', api_url=url, max_workers=1, rate_limit=None, retries=0)
+    assert routes == {route_key(*REQUESTS[0]): None}
+
+
+def test_connection_errors_fall_back_to_none():
+    # Nothing listens on port 9 (discard) locally, so every attempt is refused
+    fetcher = RouteFetcher('token', api_url='http://127.0.0.1:9', max_workers=1, rate_limit=None,
+                           retries=1, backoff=0.001, timeout=1.0)
+    assert fetcher.fetch(*REQUESTS[0]) is None
+    assert fetcher.stats['failures'] == 1
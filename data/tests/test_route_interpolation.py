@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from generate_intervals_with_routes import interpolate_route_points
+from route_interpolation import _interpolate_route_points_loop, check_against_loop, interpolate_routes
+
+ROUTE = [[-118.290, 34.025], [-118.288, 34.025], [-118.288, 34.025], [-118.288, 34.022], [-118.283, 34.022]]
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_matches_loop_on_random_routes(seed):
+    assert check_against_loop(num_routes=500, seed=seed) > 0
+
+
+@pytest.mark.parametrize('num_points', [1, 2, 3, 7, 50])
+def test_wrapper_matches_loop(num_points):
+    expected = _interpolate_route_points_loop(ROUTE, num_points)
+    result = interpolate_route_points(ROUTE, num_points)
+    assert len(result) == len(expected) == num_points
+    for got, want in zip(result, expected):
+        assert got['lat'] == pytest.approx(want['lat'], abs=1e-12)
+        assert got['lon'] == pytest.approx(want['lon'], abs=1e-12)
+
+
+def test_endpoints_and_spacing():
+    points = interpolate_routes([ROUTE], 11)[0]
+    np.testing.assert_allclose(points[0], ROUTE[0])
+    np.testing.assert_allclose(points[-1], ROUTE[-1])
+    steps = np.hypot(*np.diff(points, axis=0).T)
+    # Corners cut the straight-line step short, so only check no step exceeds the arc step
+    assert steps.max() <= 0.001 + 1e-12
+
+
+def test_degenerate_routes():
+    results = interpolate_routes([None, [], [[1.0, 2.0]], [[1.0, 2.0], [1.0, 2.0]], ROUTE], [5, 5, 5, 5, 0])
+    assert [r.shape for r in results] == [(0, 2), (0, 2), (0, 2), (1, 2), (0, 2)]
+    np.testing.assert_array_equal(results[3], [[1.0, 2.0]])
+    with pytest.raises(ValueError):
+        interpolate_routes([ROUTE, ROUTE], [3])
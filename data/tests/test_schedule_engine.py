@@ -0,0 +1,85 @@
+import copy
+from datetime import date, timedelta
+
+import pytest
+
+import generate_intervals_with_routes as gen
+from schedule_engine import ScheduleEngine, ScheduleError, parse_time
+
+# The hand-written weekday timeline the spec replaced (Mondays had no overrides)
+ORIGINAL_WEEKDAY = [
+    {'start': (0, 0), 'end': (7, 30), 'location': 'home', 'stress': 'low'},
+    {'start': (7, 30), 'end': (8, 30), 'location': 'home', 'stress': 'low_medium'},
+    {'start': (8, 30), 'end': (8, 50), 'from': 'home', 'to': 'gym', 'stress': 'medium', 'mode': 'walking'},
+    {'start': (8, 50), 'end': (9, 50), 'location': 'gym', 'stress': 'high'},
+    {'start': (9, 50), 'end': (10, 0), 'location': 'gym', 'stress': 'low'},
+    {'start': (10, 0), 'end': (10, 20), 'from': 'gym', 'to': 'home', 'stress': 'low', 'mode': 'walking'},
+    {'start': (10, 20), 'end': (12, 0), 'location': 'home', 'stress': 'low'},
+    {'start': (12, 0), 'end': (12, 20), 'from': 'home', 'to': 'cpa', 'stress': 'low', 'mode': 'walking'},
+    {'start': (12, 20), 'end': (14, 0), 'location': 'cpa', 'stress': 'medium'},
+    {'start': (14, 0), 'end': (14, 20), 'from': 'cpa', 'to': 'home', 'stress': 'medium', 'mode': 'walking'},
+    {'start': (14, 20), 'end': (15, 0), 'location': 'home', 'stress': 'low'},
+    {'start': (15, 0), 'end': (15, 5), 'from': 'home', 'to': 'ralphs', 'stress': 'low', 'mode': 'driving'},
+    {'start': (15, 5), 'end': (15, 40), 'location': 'ralphs', 'stress': 'low'},
+    {'start': (15, 40), 'end': (15, 45), 'from': 'ralphs', 'to': 'home', 'stress': 'low', 'mode': 'driving'},
+    {'start': (15, 45), 'end': (19, 0), 'location': 'home', 'stress': 'medium'},
+    {'start': (19, 0), 'end': (19, 20), 'from': 'home', 'to': 'doheny', 'stress': 'low', 'mode': 'walking'},
+    {'start': (19, 20), 'end': (22, 0), 'location': 'doheny', 'stress': 'fluctuate_medium_high'},
+    {'start': (22, 0), 'end': (22, 20), 'from': 'doheny', 'to': 'home', 'stress': 'high', 'mode': 'walking'},
+    {'start': (22, 20), 'end': (24, 0), 'location': 'home', 'stress': 'high_to_low'},
+]
+MONDAY = date(2024, 11, 18)
+
+
+def test_monday_compiles_to_original_weekday():
+    assert gen.get_schedule_for_date(MONDAY) == ORIGINAL_WEEKDAY
+
+
+@pytest.mark.parametrize('offset', range(7))
+def test_every_day_tiles_midnight_to_midnight(offset):
+    timeline = gen.get_schedule_for_date(MONDAY + timedelta(days=offset))
+    assert timeline[0]['start'] == (0, 0) and timeline[-1]['end'] == (24, 0)
+    for before, after in zip(timeline, timeline[1:]):
+        assert before['end'] == after['start']
+        assert before['start'] < before['end']
+    travel = [seg for seg in timeline if 'from' in seg]
+    stays = [seg for seg in timeline if 'location' in seg]
+    for seg in travel:
+        previous = stays[max(i for i, s in enumerate(stays) if s['end'] <= seg['start'])]
+        assert previous['location'] == seg['from']
+
+
+def test_day_overrides():
+    weekend = gen.get_schedule_for_date(MONDAY + timedelta(days=5))
+    assert 'gym' not in {seg.get('location') for seg in weekend}
+    doheny = next(seg for seg in weekend if seg.get('location') == 'doheny')
+    assert doheny['end'] == (21, 0)
+    friday = gen.get_schedule_for_date(MONDAY + timedelta(days=4))
+    assert next(seg for seg in friday if seg.get('from') == 'doheny')['start'] == (20, 0)
+
+
+def test_timelines_are_cached_per_day_type():
+    assert gen.get_schedule_for_date(MONDAY) is gen.get_schedule_for_date(MONDAY + timedelta(days=7))
+    assert gen.get_schedule_for_date(MONDAY + timedelta(days=5)) is \
+        gen.get_schedule_for_date(MONDAY + timedelta(days=6))
+
+
+def test_date_rule_applies_to_that_date_only():
+    spec = copy.deepcopy(gen.SCHEDULE_SPEC)
+    spec['rules'].append({'when': {'dates': ['2024-11-25']},
+                          'changes': [{'match': {'location': 'doheny'}, 'remove': True}]})
+    engine = ScheduleEngine(spec)
+    assert 'doheny' not in {seg.get('location') for seg in engine.for_date(date(2024, 11, 25))}
+    assert engine.for_date(MONDAY) == ORIGINAL_WEEKDAY
+
+
+def test_invalid_specs():
+    assert parse_time('08:50') == parse_time((8, 50)) == 530
+    spec = copy.deepcopy(gen.SCHEDULE_SPEC)
+    spec['stays'][3]['at'] = (8, 40)  # Before the previous stay's arrival: no time left for it
+    with pytest.raises(ScheduleError):
+        ScheduleEngine(spec).for_date(MONDAY)
+    spec = copy.deepcopy(gen.SCHEDULE_SPEC)
+    spec['stays'][0]['colour'] = 'red'
+    with pytest.raises(ScheduleError):
+        ScheduleEngine(spec).for_date(MONDAY)
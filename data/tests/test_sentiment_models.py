@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+import sentiment_models
+from sentiment_models import (AlternatingModel, AR1Model, RandomWalkModel, TransitionModel, UniformModel,
+                              ar1_filter, fixed_pieces, model_from_config, stream_rng)
+
+MODELS = [
+    UniformModel(-0.2, 0.3),
+    AlternatingModel([(0.3, 0.6), (-0.1, 0.1)], step_minutes=10),
+    TransitionModel([(0.5, (-0.6, -0.3)), (1.0, (0.2, 0.5))]),
+    AR1Model(-0.3, 0.4, 0.1, phi=0.9, sigma=0.1),
+    RandomWalkModel(-0.5, 0.5, sigma=0.2, start=0.0),
+]
+
+
+def naive_ar1(noise, phi, initial=0.0):
+    values, x = [], initial
+    for e in noise:
+        x = phi * x + e
+        values.append(x)
+    return np.array(values)
+
+
+@pytest.mark.parametrize('n', [0, 1, 2, 3, 17, 100, 1000, 4097])
+@pytest.mark.parametrize('phi', [0.0, 0.5, 0.97, -0.8])
+def test_ar1_filter_matches_recurrence(n, phi):
+    noise = stream_rng(1, n).normal(0, 1, n)
+    np.testing.assert_allclose(ar1_filter(noise, phi, initial=0.7), naive_ar1(noise, phi, 0.7),
+                               rtol=1e-9, atol=1e-9)
+
+
+def test_ar1_filter_beyond_max_block_length(monkeypatch):
+    monkeypatch.setattr(sentiment_models, 'MAX_BLOCK_LENGTH', 8)
+    noise = stream_rng(2).normal(0, 1, 1000)
+    np.testing.assert_allclose(ar1_filter(noise, 0.9), naive_ar1(noise, 0.9), rtol=1e-9, atol=1e-9)
+
+
+def test_stream_rng_is_keyed():
+    assert stream_rng(3, 1, 2).random(4).tolist() == stream_rng(3, 1, 2).random(4).tolist()
+    draws = {tuple(stream_rng(*key).random(4)) for key in [(3, 1, 2), (3, 2, 1), (3, 1), (4, 1, 2)]}
+    assert len(draws) == 4
+
+
+@pytest.mark.parametrize('model', MODELS, ids=lambda m: m.kind)
+def test_models_stay_in_range_and_roundtrip(model):
+    values = model.sample(5000, stream_rng(0))
+    assert len(values) == 5000 and len(model.sample(0, stream_rng(0))) == 0
+    if hasattr(model, 'low'):
+        assert values.min() >= model.low and values.max() <= model.high
+    rebuilt = model_from_config(model.config())
+    assert type(rebuilt) is type(model) and rebuilt.config() == model.config()
+    assert rebuilt.sample(50, stream_rng(9)).tolist() == model.sample(50, stream_rng(9)).tolist()
+
+
+def test_ar1_model_is_autocorrelated():
+    model = AR1Model(-10, 10, 0.0, phi=0.8, sigma=1.0)
+    values = model.sample(200_000, stream_rng(5))
+    # Stationary from the first value: variance sigma^2 / (1 - phi^2), lag-1 correlation phi
+    assert values.var() == pytest.approx(1 / (1 - 0.8 ** 2), rel=0.03)
+    assert np.corrcoef(values[:-1], values[1:])[0, 1] == pytest.approx(0.8, abs=0.01)
+
+
+def test_alternating_and_transition_ranges():
+    values = MODELS[1].sample(6, stream_rng(0))
+    assert all(0.3 <= v <= 0.6 for v in values[::2]) and all(-0.1 <= v <= 0.1 for v in values[1::2])
+    values = MODELS[2].sample(5, stream_rng(0))
+    # Progress 0, 0.25, 0.5, 0.75, 1: only the pieces before 0.5 belong to the first stage
+    assert all(v < 0 for v in values[:2]) and all(v > 0 for v in values[2:])
+
+
+def test_pieces():
+    assert fixed_pieces(50, 15) == [0, 15, 30, 45]
+    assert fixed_pieces(45, 15) == [0, 15, 30]
+    assert fixed_pieces(5, 15) == [0]
+    assert UniformModel(0, 1).pieces(300) == [0.0]
+    assert MODELS[2].pieces(30) == [0, 10, 20]
+
+
+def test_invalid_configs():
+    with pytest.raises(ValueError):
+        AR1Model(-1, 1, 0, phi=1.0)
+    with pytest.raises(ValueError):
+        RandomWalkModel(0.5, 0.5)
+    with pytest.raises(ValueError):
+        model_from_config({'model': 'sine'})